@@ -0,0 +1,175 @@
+"""
+Journal des changements pour Ma GED Perso
+Suite numérotée des événements (création, renommage, déplacement, suppression, étiquettes, favoris, OCR)
+que les clients rejouent pour se synchroniser sans tout recharger
+"""
+
+from collections import deque
+from contextlib import contextmanager
+from datetime import datetime
+from pathlib import Path
+from typing import Deque, List, Optional, Tuple
+import fcntl
+import json
+import logging
+import os
+import tempfile
+import threading
+
+# Configuration
+CHANGES_FILE = ".ged_store/changes.log"  # Relatif à GED_ROOT
+RETAIN_EVENTS = 10_000  # Événements consultables ; au-delà, le client doit tout recharger
+CHANGE_KINDS = (
+    "create", "rename", "move", "delete", "tag", "untag", "tags", "favorite", "unfavorite", "ocr",
+)
+
+logger = logging.getLogger(__name__)
+
+
+class ChangeFeed:
+    """
+    Journal des changements partagé entre workers.
+
+    Même principe que le journal des métadonnées : une ligne JSON par
+    événement, ajoutée sous verrou exclusif (flock), relue incrémentalement
+    par chaque worker. Le numéro de séquence sert de jeton de reprise
+    (`since`) ; il croît strictement, y compris après une compaction qui ne
+    garde que les RETAIN_EVENTS derniers événements.
+    """
+
+    def __init__(self, path: Path, retain: int = RETAIN_EVENTS):
+        self.path = path
+        self.lock_path = path.with_name(path.name + ".lock")
+        self.retain = retain
+        self._events: Deque[dict] = deque(maxlen=retain)
+        self._seq = 0
+        self._key = None  # (inode, taille) déjà lus
+        self._offset = 0
+        self._lines = 0  # Lignes du fichier, pour décider de la compaction
+        self._mutex = threading.Lock()
+
+    @property
+    def seq(self) -> int:
+        """Jeton du dernier événement connu"""
+        with self._mutex:
+            self._refresh()
+            return self._seq
+
+    def record(self, kind: str, item_id: Optional[str], **data) -> int:
+        """
+        Ajoute un événement.
+
+        Args:
+            kind: Type d'événement (voir CHANGE_KINDS)
+            item_id: Élément concerné (None pour un changement global)
+            data: Détails (path, parent, tags, status...)
+
+        Returns:
+            Numéro de séquence attribué
+        """
+        with self._mutex, self._file_lock(fcntl.LOCK_EX):
+            self._catch_up()
+            event = {"seq": self._seq + 1, "at": datetime.now().isoformat(), "kind": kind, "id": item_id, **data}
+            line = json.dumps(event, ensure_ascii=False) + "\n"
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            fd = os.open(self.path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+            try:
+                os.write(fd, line.encode("utf-8"))
+                st = os.fstat(fd)
+            finally:
+                os.close(fd)
+            self._events.append(event)
+            self._seq = event["seq"]
+            self._offset = st.st_size
+            self._key = (st.st_ino, st.st_size)
+            self._lines += 1
+            if self._lines >= 2 * self.retain:
+                self._compact()
+            return self._seq
+
+    def since(self, token: int, limit: int = 1000) -> Tuple[List[dict], int, bool]:
+        """
+        Événements postérieurs à un jeton.
+
+        Returns:
+            (événements, jeton à utiliser ensuite, reset) ; reset vaut True si
+            le jeton est trop ancien ou inconnu (le client doit tout recharger)
+        """
+        with self._mutex:
+            self._refresh()
+            # Jeton d'un autre journal, ou événements suivants déjà compactés
+            if token > self._seq or (self._events and token < self._events[0]["seq"] - 1):
+                return [], self._seq, True
+            events = [e for e in self._events if e["seq"] > token][:limit]
+            next_token = events[-1]["seq"] if events else self._seq
+            return events, next_token, False
+
+    # ---------- Interne ----------
+
+    @contextmanager
+    def _file_lock(self, mode: int):
+        self.lock_path.parent.mkdir(parents=True, exist_ok=True)
+        fd = os.open(self.lock_path, os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            fcntl.flock(fd, mode)
+            yield
+        finally:
+            os.close(fd)  # Libère aussi le verrou
+
+    def _refresh(self) -> None:
+        try:
+            st = os.stat(self.path)
+            key = (st.st_ino, st.st_size)
+        except FileNotFoundError:
+            key = None
+        if key == self._key:
+            return  # Chemin rapide : rien de nouveau
+        with self._file_lock(fcntl.LOCK_SH):
+            self._catch_up()
+
+    def _catch_up(self) -> None:
+        try:
+            with open(self.path, "rb") as f:
+                st = os.fstat(f.fileno())
+                if self._key is None or st.st_ino != self._key[0] or st.st_size < self._offset:
+                    # Premier chargement ou fichier compacté par un autre worker
+                    self._events.clear()
+                    self._offset = 0
+                    self._lines = 0
+                f.seek(self._offset)
+                chunk = f.read()
+        except FileNotFoundError:
+            self._key = None
+            self._offset = 0
+            return
+
+        end = chunk.rfind(b"\n") + 1
+        for line in chunk[:end].splitlines():
+            try:
+                event = json.loads(line)
+            except json.JSONDecodeError:
+                logger.error("Événement illisible ignoré")
+                continue
+            self._lines += 1
+            if not self._events or event["seq"] > self._events[-1]["seq"]:
+                self._events.append(event)
+                self._seq = max(self._seq, event["seq"])
+        self._offset += end
+        self._key = (st.st_ino, self._offset)
+
+    def _compact(self) -> None:
+        """Réécrit le fichier avec les derniers événements seulement (nouvel inode)"""
+        content = "".join(json.dumps(e, ensure_ascii=False) + "\n" for e in self._events)
+        fd, tmp_name = tempfile.mkstemp(dir=self.path.parent, prefix=f".{self.path.name}.tmp-")
+        try:
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                f.write(content)
+            os.replace(tmp_name, self.path)
+        except Exception:
+            Path(tmp_name).unlink(missing_ok=True)
+            raise
+        st = os.stat(self.path)
+        self._offset = st.st_size
+        self._key = (st.st_ino, st.st_size)
+        self._lines = len(self._events)
+
@@ -0,0 +1,413 @@
+"""
+Suggestions de classement pour Ma GED Perso
+Bayésien naïf multinomial vectorisé (NumPy), entraîné sur les documents déjà classés
+"""
+
+from typing import Callable, Dict, List, Optional, Set, Tuple
+import logging
+import threading
+
+import numpy as np
+
+from .metadata_store import MetadataStore
+from .text_features import Vocabulary
+
+# Configuration
+ALPHA = 0.1  # Lissage de Laplace
+MIN_CLASS_DOCS = 1  # Documents minimum pour proposer un dossier
+BATCH_CELLS = 4_000_000  # Taille max (termes × classes) d'un lot de scoring
+INITIAL_CAPACITY = 1024  # Taille initiale du vecteur de fond (termes)
+PROGRESS_EVERY = 500  # Documents entre deux rapports de progression
+
+logger = logging.getLogger(__name__)
+
+LoadText = Callable[[dict], str]
+IsExcluded = Callable[[str], bool]
+Progress = Callable[[int, int], None]
+
+
+class _CountMatrix:
+    """
+    Comptages classes × termes, creux : pour chaque classe, indices de termes
+    triés et comptages. La mémoire suit le nombre de couples (classe, terme)
+    observés, pas classes × vocabulaire.
+    """
+
+    def __init__(self):
+        self.labels: Dict[str, int] = {}
+        self.names: List[str] = []
+        self.indices: List[np.ndarray] = []  # Par classe, int32 triés
+        self.values: List[np.ndarray] = []  # Par classe, float64
+        self.totals = np.zeros(8, dtype=np.float64)  # Somme des comptages par classe
+        self.docs = np.zeros(8, dtype=np.float64)
+
+    def row(self, label: str) -> int:
+        index = self.labels.get(label)
+        if index is None:
+            index = len(self.names)
+            self.labels[label] = index
+            self.names.append(label)
+            self.indices.append(np.zeros(0, dtype=np.int32))
+            self.values.append(np.zeros(0, dtype=np.float64))
+            if index >= self.docs.shape[0]:
+                self.totals = _grown(self.totals, index * 2)
+                self.docs = _grown(self.docs, index * 2)
+        return index
+
+    def add(self, label: str, indices: np.ndarray, values: np.ndarray, sign: float) -> None:
+        """Ajoute (sign=1) ou retire (sign=-1) un vecteur creux aux indices triés"""
+        row = self.row(label)
+        current, counts = self.indices[row], self.values[row]
+        pos = np.searchsorted(current, indices)
+        found = pos < current.size
+        found[found] = current[pos[found]] == indices[found]
+        if not counts.flags.writeable:
+            counts = counts.copy()  # Vue sur l'instantané projeté en mémoire
+        counts[pos[found]] += sign * values[found]
+        new = ~found
+        if new.any():
+            current = np.insert(current, pos[new], indices[new])
+            counts = np.insert(counts, pos[new], sign * values[new].astype(np.float64))
+        if sign < 0:
+            # Termes retombés à zéro (document retiré) : la classe ne grossit pas indéfiniment
+            keep = np.abs(counts) > 1e-6
+            if not keep.all():
+                current, counts = current[keep], counts[keep]
+        self.indices[row], self.values[row] = current, counts
+        self.totals[row] += sign * float(values.sum())
+        self.docs[row] += sign
+
+    def weights(self, rows: np.ndarray, terms: np.ndarray, vocab_size: int) -> np.ndarray:
+        """log P(terme | classe) lissé pour les seuls termes demandés (triés), shape (termes, classes)"""
+        counts = np.zeros((terms.size, rows.size))
+        for col, row in enumerate(rows.tolist()):
+            current = self.indices[row]
+            if current.size == 0:
+                continue
+            pos = np.minimum(np.searchsorted(current, terms), current.size - 1)
+            hit = current[pos] == terms
+            counts[hit, col] = self.values[row][pos[hit]]
+        denominators = np.log(self.totals[rows] + ALPHA * vocab_size)
+        return np.log(counts + ALPHA) - denominators[None, :]
+
+    def snapshot(self) -> Dict[str, np.ndarray]:
+        """Format CSR (une ligne par classe)"""
+        sizes = np.array([i.size for i in self.indices], dtype=np.int64)
+        n = len(self.names)
+        return {
+            "ptr": np.concatenate(([0], np.cumsum(sizes))).astype(np.int64),
+            "indices": np.concatenate(self.indices) if n else np.zeros(0, np.int32),
+            "values": np.concatenate(self.values) if n else np.zeros(0, np.float64),
+            "totals": self.totals[:n].copy(),
+            "docs": self.docs[:n].copy(),
+        }
+
+    def restore(self, names: List[str], arrays: Dict[str, np.ndarray]) -> None:
+        ptr = arrays["ptr"]
+        if len(ptr) != len(names) + 1:
+            raise ValueError("Comptages de classement incohérents")
+        self.labels = {name: i for i, name in enumerate(names)}
+        self.names = list(names)
+        # Vues sur l'instantané, copiées à leur première modification
+        self.indices = [arrays["indices"][ptr[i]:ptr[i + 1]] for i in range(len(names))]
+        self.values = [arrays["values"][ptr[i]:ptr[i + 1]] for i in range(len(names))]
+        rows = max(8, len(names))
+        self.totals = _grown(arrays["totals"], rows)
+        self.docs = _grown(arrays["docs"], rows)
+
+
+def _grown(array: np.ndarray, size: int) -> np.ndarray:
+    """Copie agrandie (zéros) d'un vecteur"""
+    grown = np.zeros(max(size, array.shape[0]), dtype=np.float64)
+    grown[: array.shape[0]] = array
+    return grown
+
+
+class DocumentClassifier:
+    """
+    Propose un dossier de destination et des étiquettes pour un document OCRisé.
+
+    Dossiers : bayésien naïf multinomial, une classe par dossier parent des
+    documents déjà classés. Étiquettes : rapport de vraisemblance de chaque
+    étiquette face au corpus entier.
+
+    L'entraînement est incrémental : les modifications de métadonnées (OCR,
+    déplacement, étiquettes) marquent les documents à recompter, traités au
+    prochain `refresh()` en ajoutant/retirant leurs comptages.
+    """
+
+    SNAPSHOT_SCHEMA = 2
+
+    def __init__(self, store: MetadataStore, vocabulary: Vocabulary,
+                 load_text: LoadText, is_excluded: IsExcluded):
+        self.store = store
+        self.vocabulary = vocabulary
+        self.load_text = load_text
+        self.is_excluded = is_excluded
+
+        self._lock = threading.Lock()
+        self.refresh_lock = threading.Lock()
+        self._folders = _CountMatrix()
+        self._tags = _CountMatrix()
+        self._background = np.zeros(INITIAL_CAPACITY, dtype=np.float64)
+        # id → (dossier, étiquettes, text_ref, indices, comptages)
+        self._docs: Dict[str, Tuple[Optional[str], tuple, str, np.ndarray, np.ndarray]] = {}
+        self._pending: Set[str] = set()
+        self._full_rescan = True
+        self._cache = None  # (classes actives, log prior, noms) des dossiers et des étiquettes
+        store.add_listener(self._on_change)
+
+    # ---------- Entraînement ----------
+
+    def refresh(self, progress: Optional[Progress] = None) -> int:
+        """
+        Applique les mises à jour en attente.
+
+        Args:
+            progress: Appelé avec (traités, total) pendant les longues mises à jour
+
+        Returns:
+            Nombre de documents recomptés
+        """
+        with self.refresh_lock:
+            with self.store.mutex:
+                metadata = self.store.view()
+                if self._full_rescan:
+                    self._pending = set(metadata.get("ocr_text", {})) | set(self._docs)
+                    self._full_rescan = False
+                pending, self._pending = self._pending, set()
+                ocr_data = metadata.get("ocr_text", {})
+                records = metadata.get("ids", {})
+                item_tags = metadata.get("item_tags", {})
+                work = [
+                    (doc_id, ocr_data.get(doc_id), records.get(doc_id), tuple(item_tags.get(doc_id, ())))
+                    for doc_id in pending
+                ]
+
+            changed = 0
+            for done, (doc_id, entry, record, tags) in enumerate(work, 1):
+                if progress and done % PROGRESS_EVERY == 0:
+                    progress(done, len(work))
+                label = record["parent"] if record else None
+                if entry is None or record is None:
+                    changed += self._remove(doc_id)
+                    continue
+                if label and self.is_excluded(label):
+                    label = None  # Document à classer : pas d'exemple d'entraînement
+                ref = entry.get("text_ref")
+                current = self._docs.get(doc_id)
+                if current and current[:3] == (label, tags, ref):
+                    continue
+                if current and current[2] == ref:
+                    indices, values = current[3], current[4]  # Texte inchangé : pas de retokenisation
+                else:
+                    indices, values = self.vocabulary.vectorize(self.load_text(entry))
+                self._remove(doc_id)
+                self._add(doc_id, label, tags, ref, indices, values)
+                changed += 1
+            return changed
+
+    def _add(self, doc_id: str, label: Optional[str], tags: tuple, ref: str,
+             indices: np.ndarray, values: np.ndarray) -> None:
+        with self._lock:
+            self._ensure_columns(len(self.vocabulary))
+            if label:
+                self._folders.add(label, indices, values, 1.0)
+            for tag in tags:
+                self._tags.add(tag, indices, values, 1.0)
+            self._background[indices] += values
+            self._docs[doc_id] = (label, tags, ref, indices, values)
+            self._cache = None
+
+    def _ensure_columns(self, size: int) -> None:
+        if size > self._background.shape[0]:
+            background = np.zeros(max(size, self._background.shape[0] * 2))
+            background[: self._background.shape[0]] = self._background
+            self._background = background
+
+    def _remove(self, doc_id: str) -> bool:
+        with self._lock:
+            current = self._docs.pop(doc_id, None)
+            if current is None:
+                return False
+            label, tags, _, indices, values = current
+            if label:
+                self._folders.add(label, indices, values, -1.0)
+            for tag in tags:
+                self._tags.add(tag, indices, values, -1.0)
+            self._background[indices] -= values
+            self._cache = None
+            return True
+
+    def _on_change(self, op: Optional[dict]) -> None:
+        if op is None:
+            self._full_rescan = True
+        elif op["section"] in ("ocr_text", "ids", "item_tags"):
+            if op["op"] == "replace":
+                self._full_rescan = True
+            else:
+                self._pending.add(op["key"])
+
+    # ---------- Instantané ----------
+
+    def snapshot_state(self) -> Tuple[Dict[str, np.ndarray], dict]:
+        """Comptages par dossier/étiquette et vecteurs des documents (concaténés)"""
+        with self._lock:
+            size = len(self.vocabulary)
+            self._ensure_columns(size)
+            ids = list(self._docs)
+            entries = [self._docs[i] for i in ids]
+            lengths = np.array([e[3].size for e in entries], dtype=np.int64)
+            arrays = {
+                "doc_ptr": np.concatenate(([0], np.cumsum(lengths))).astype(np.int64),
+                "doc_indices": np.concatenate([e[3] for e in entries]) if entries else np.zeros(0, np.int32),
+                "doc_values": np.concatenate([e[4] for e in entries]) if entries else np.zeros(0, np.float32),
+                "background": self._background[:size].copy(),
+                **{f"folder_{k}": v for k, v in self._folders.snapshot().items()},
+                **{f"tag_{k}": v for k, v in self._tags.snapshot().items()},
+            }
+            state = {
+                "ids": ids,
+                "labels": [e[0] for e in entries],
+                "tags": [list(e[1]) for e in entries],
+                "refs": [e[2] for e in entries],
+                "folders": list(self._folders.names),
+                "tag_names": list(self._tags.names),
+            }
+            return arrays, state
+
+    def restore_state(self, arrays: Dict[str, np.ndarray], state: dict) -> None:
+        ptr = arrays["doc_ptr"]
+        if len(ptr) != len(state["ids"]) + 1:
+            raise ValueError("Modèle de classement incohérent")
+        indices, values = arrays["doc_indices"], arrays["doc_values"]
+        with self._lock:
+            self._folders.restore(state["folders"], _prefixed(arrays, "folder_"))
+            self._tags.restore(state["tag_names"], _prefixed(arrays, "tag_"))
+            self._background = np.zeros(max(INITIAL_CAPACITY, arrays["background"].shape[0]))
+            self._background[: arrays["background"].shape[0]] = arrays["background"]
+            # Vecteurs des documents : vues sur l'instantané, sans copie
+            self._docs = {
+                doc_id: (label, tuple(tags), ref, indices[ptr[i]:ptr[i + 1]], values[ptr[i]:ptr[i + 1]])
+                for i, (doc_id, label, tags, ref) in enumerate(
+                    zip(state["ids"], state["labels"], state["tags"], state["refs"])
+                )
+            }
+            self._cache = None
+            self._full_rescan = True  # Rapprochement avec les métadonnées au prochain refresh()
+
+    def reset(self) -> None:
+        with self._lock:
+            self._folders = _CountMatrix()
+            self._tags = _CountMatrix()
+            self._background = np.zeros(INITIAL_CAPACITY, dtype=np.float64)
+            self._docs = {}
+            self._cache = None
+            self._full_rescan = True
+
+    # ---------- Prédiction ----------
+
+    def suggest(self, texts: List[str], limit: int = 3) -> List[dict]:
+        """
+        Classe un lot de textes en une passe vectorisée, avec le dernier modèle
+        construit (tenu à jour en tâche de fond par `refresh()`, jamais ici).
+
+        Args:
+            texts: Textes OCR des documents à classer
+            limit: Nombre de dossiers et d'étiquettes proposés par document
+
+        Returns:
+            Pour chaque texte : {"folders": [(id, score)], "tags": [(nom, score)]}
+        """
+        vectors = [self.vocabulary.vectorize(t, grow=False) for t in texts]
+
+        with self._lock:
+            model = self._model()
+        if model is None:
+            return [{"folders": [], "tags": []} for _ in texts]
+        folder_rows, log_prior, folder_ids, tag_rows, tag_names, size, background_total = model
+
+        results = []
+        columns = max(folder_rows.size, tag_rows.size, 1)
+        batch = max(1, BATCH_CELLS // (columns * 300))  # ~300 termes distincts par document
+        for start in range(0, len(vectors), batch):
+            chunk = vectors[start:start + batch]
+            # Poids des seuls termes présents dans le lot, colonnes locales
+            terms = np.unique(np.concatenate([i for i, _ in chunk])).astype(np.int32)
+            local = [(np.searchsorted(terms, i), v) for i, v in chunk]
+            with self._lock:
+                self._ensure_columns(len(self.vocabulary))
+                folder_logp = self._folders.weights(folder_rows, terms, size)
+                log_background = np.log((self._background[terms] + ALPHA) / (background_total + ALPHA * size))
+                tag_ratio = self._tags.weights(tag_rows, terms, size) - log_background[:, None]
+            folder_scores = _sparse_dot(local, folder_logp)
+            tag_scores = _sparse_dot(local, tag_ratio)
+            lengths = np.array([max(v.sum(), 1.0) for _, v in chunk])
+
+            # Vraisemblance normalisée par la longueur : scores comparables entre documents
+            joint = folder_scores / lengths[:, None] + log_prior[None, :]
+            joint -= joint.max(axis=1, keepdims=True)
+            posterior = np.exp(joint)
+            posterior /= posterior.sum(axis=1, keepdims=True)
+            tag_scores /= lengths[:, None]
+
+            for row in range(len(chunk)):
+                empty = chunk[row][0].size == 0
+                results.append({
+                    "folders": [] if empty else _top(posterior[row], folder_ids, limit),
+                    "tags": [] if empty else _top(tag_scores[row], tag_names, limit, positive=True),
+                })
+        return results
+
+    def stats(self) -> dict:
+        """Taille du modèle"""
+        return {
+            "documents": len(self._docs),
+            "folders": int((self._folders.docs[: len(self._folders.names)] >= MIN_CLASS_DOCS).sum()),
+            "tags": int((self._tags.docs[: len(self._tags.names)] > 0).sum()),
+            "vocabulary": len(self.vocabulary),
+        }
+
+    def _model(self):
+        if self._cache is not None:
+            return self._cache
+        size = len(self.vocabulary)
+        self._ensure_columns(size)
+        active = np.flatnonzero(self._folders.docs[: len(self._folders.names)] >= MIN_CLASS_DOCS)
+        if size == 0 or active.size == 0:
+            return None
+        log_prior = np.log(self._folders.docs[active] / self._folders.docs[active].sum())
+        folder_ids = [self._folders.names[i] for i in active]
+        tag_active = np.flatnonzero(self._tags.docs[: len(self._tags.names)] > 0)
+        tag_names = [self._tags.names[i] for i in tag_active]
+        background_total = float(self._background[:size].sum())
+
+        # Les log-probabilités ne sont calculées qu'au scoring, pour les termes du lot
+        self._cache = (active, log_prior, folder_ids, tag_active, tag_names, size, background_total)
+        return self._cache
+
+
+def _prefixed(arrays: Dict[str, np.ndarray], prefix: str) -> Dict[str, np.ndarray]:
+    return {k[len(prefix):]: v for k, v in arrays.items() if k.startswith(prefix)}
+
+
+def _sparse_dot(vectors: List[Tuple[np.ndarray, np.ndarray]], weights: np.ndarray) -> np.ndarray:
+    """Produit (documents creux) × (termes, classes) sans densifier les documents"""
+    scores = np.zeros((len(vectors), weights.shape[1]))
+    sizes = np.array([v[0].size for v in vectors])
+    nonempty = np.flatnonzero(sizes)
+    if weights.shape[1] == 0 or nonempty.size == 0:
+        return scores
+    indices = np.concatenate([vectors[i][0] for i in nonempty])
+    values = np.concatenate([vectors[i][1] for i in nonempty])
+    offsets = np.concatenate(([0], np.cumsum(sizes[nonempty])[:-1]))
+    contributions = weights[indices] * values[:, None]
+    scores[nonempty] = np.add.reduceat(contributions, offsets, axis=0)
+    return scores
+
+
+def _top(scores: np.ndarray, names: List[str], limit: int, positive: bool = False) -> List[tuple]:
+    if scores.size == 0:
+        return []
+    order = np.argsort(-scores)[:limit]
+    return [(names[i], round(float(scores[i]), 4)) for i in order if not positive or scores[i] > 0]
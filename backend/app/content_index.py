@@ -0,0 +1,170 @@
+"""
+Index de recherche dans le contenu pour Ma GED Perso
+Signatures de trigrammes (filtre de Bloom par texte) : écarte sans décompression les textes ne pouvant pas contenir la requête
+"""
+
+from typing import Callable, Dict, List, Optional, Set, Tuple
+import logging
+import threading
+
+import numpy as np
+
+from .metadata_store import MetadataStore
+
+# Configuration
+SIGNATURE_BITS = 16384  # Bits par texte (2 Ko) : ~5 % de faux positifs par trigramme pour 2 000 trigrammes distincts
+MAX_DEAD_RATIO = 0.2  # Proportion de textes supprimés déclenchant un compactage
+PROGRESS_EVERY = 500  # Textes entre deux rapports de progression
+
+logger = logging.getLogger(__name__)
+
+LoadText = Callable[[dict], str]
+Progress = Callable[[int, int], None]
+
+# Multiplicateurs du hachage des trigrammes (constantes de xxHash)
+_PRIMES = (np.uint64(0x9E3779B185EBCA87), np.uint64(0xC2B2AE3D27D4EB4F), np.uint64(0x165667B19E3779F9))
+
+
+def trigram_bits(text: str) -> np.ndarray:
+    """
+    Positions (triées, uniques) des bits de signature des trigrammes d'un texte
+    déjà mis en minuscules. Deux bits par trigramme.
+    """
+    codes = np.frombuffer(text.encode("utf-32-le"), dtype=np.uint32).astype(np.uint64)
+    if codes.size < 3:
+        return np.zeros(0, dtype=np.int64)
+    h = codes[:-2] * _PRIMES[0] ^ codes[1:-1] * _PRIMES[1] ^ codes[2:] * _PRIMES[2]
+    h ^= h >> np.uint64(29)
+    bits = np.concatenate([h % np.uint64(SIGNATURE_BITS), (h >> np.uint64(32)) % np.uint64(SIGNATURE_BITS)])
+    return np.unique(bits.astype(np.int64))
+
+
+class ContentIndex:
+    """
+    Signatures de trigrammes des textes OCR, pour la recherche par sous-chaîne.
+
+    Chaque texte (identifié par sa référence dans le magasin de blobs, donc
+    immuable) a une signature de SIGNATURE_BITS bits où sont allumés les bits
+    de chacun de ses trigrammes. Un texte dont la signature n'a pas tous les
+    bits de la requête ne la contient pas : il est écarté sans être relu.
+    Les autres restent à vérifier (faux positifs possibles, jamais de faux
+    négatifs). Les requêtes de moins de 3 caractères ne sont pas filtrées.
+
+    Les signatures forment une matrice NumPy (une ligne par texte) ; un filtre
+    ne lit que les colonnes des octets concernés.
+    """
+
+    SNAPSHOT_SCHEMA = 1
+
+    def __init__(self, store: MetadataStore, load_text: LoadText):
+        self.store = store
+        self.load_text = load_text
+
+        self._lock = threading.RLock()
+        self.refresh_lock = threading.Lock()
+        self._ord: Dict[str, int] = {}
+        self._refs: List[Optional[str]] = []
+        self._signatures = np.zeros((0, SIGNATURE_BITS // 8), dtype=np.uint8)
+        self._dead = 0
+
+    # ---------- Mise à jour ----------
+
+    def refresh(self, progress: Optional[Progress] = None) -> int:
+        """
+        Calcule la signature des nouveaux textes et oublie ceux qui ne sont plus référencés.
+
+        Args:
+            progress: Appelé avec (traités, total) pendant les longues mises à jour
+
+        Returns:
+            Nombre de textes ajoutés ou retirés
+        """
+        with self.refresh_lock:
+            entries = {}
+            for entry in self.store.view().get("ocr_text", {}).values():
+                ref = entry.get("text_ref")
+                if ref:
+                    entries.setdefault(ref, entry)
+
+            with self._lock:
+                removed = [ref for ref in self._ord if ref not in entries]
+                for ref in removed:
+                    self._refs[self._ord.pop(ref)] = None
+                    self._dead += 1
+                if self._dead > MAX_DEAD_RATIO * max(len(self._refs), 1):
+                    self._compact()
+                work = [(ref, entry) for ref, entry in entries.items() if ref not in self._ord]
+
+            for done, (ref, entry) in enumerate(work, 1):
+                if progress and done % PROGRESS_EVERY == 0:
+                    progress(done, len(work))
+                signature = np.zeros(SIGNATURE_BITS, dtype=bool)
+                signature[trigram_bits(self.load_text(entry).lower())] = True
+                with self._lock:
+                    self._add(ref, np.packbits(signature))
+            return len(work) + len(removed)
+
+    def _add(self, ref: str, signature: np.ndarray) -> None:
+        ordinal = len(self._refs)
+        if ordinal >= self._signatures.shape[0]:
+            grown = np.zeros((max(ordinal + 1, self._signatures.shape[0] * 2, 64), SIGNATURE_BITS // 8), dtype=np.uint8)
+            grown[:ordinal] = self._signatures[:ordinal]
+            self._signatures = grown
+        self._signatures[ordinal] = signature
+        self._refs.append(ref)
+        self._ord[ref] = ordinal
+
+    def _compact(self) -> None:
+        alive = [i for i, ref in enumerate(self._refs) if ref is not None]
+        self._signatures = self._signatures[alive]
+        self._refs = [self._refs[i] for i in alive]
+        self._ord = {ref: i for i, ref in enumerate(self._refs)}
+        self._dead = 0
+
+    # ---------- Instantané ----------
+
+    def snapshot_state(self) -> Tuple[Dict[str, np.ndarray], dict]:
+        """Signatures des textes vivants et leurs références"""
+        with self._lock:
+            if self._dead or self._signatures.shape[0] != len(self._refs):
+                self._compact()
+            return {"signatures": self._signatures}, {"refs": list(self._refs)}
+
+    def restore_state(self, arrays: Dict[str, np.ndarray], state: dict) -> None:
+        refs = state["refs"]
+        if arrays["signatures"].shape != (len(refs), SIGNATURE_BITS // 8):
+            raise ValueError("Index de contenu incohérent")
+        with self._lock:
+            self._signatures = arrays["signatures"]  # Projeté : copié à la première croissance
+            self._refs = list(refs)
+            self._ord = {ref: i for i, ref in enumerate(self._refs)}
+            self._dead = 0
+
+    def reset(self) -> None:
+        with self._lock:
+            self._ord, self._refs = {}, []
+            self._signatures = np.zeros((0, SIGNATURE_BITS // 8), dtype=np.uint8)
+            self._dead = 0
+
+    # ---------- Requêtes ----------
+
+    def ruled_out(self, query: str) -> Set[str]:
+        """
+        Références des textes indexés qui ne peuvent pas contenir `query`
+        (en minuscules). Les textes pas encore indexés n'y figurent jamais.
+        """
+        bits = trigram_bits(query)
+        if bits.size == 0:
+            return set()
+        columns = bits >> 3
+        masks = (0x80 >> (bits & 7)).astype(np.uint8)
+        with self._lock:
+            n = len(self._refs)
+            selected = self._signatures[:n, columns] & masks
+            missing = np.flatnonzero((selected != masks).any(axis=1))
+            return {self._refs[i] for i in missing.tolist() if self._refs[i] is not None}
+
+    def stats(self) -> dict:
+        """Taille de l'index"""
+        with self._lock:
+            return {"texts": len(self._ord), "bytes": len(self._refs) * SIGNATURE_BITS // 8}
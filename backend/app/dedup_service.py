@@ -0,0 +1,259 @@
+"""
+Détection des doublons pour Ma GED Perso
+Empreinte SHA-256 (doublons exacts) et hash perceptuel de la première page (rescans)
+"""
+
+from PIL import Image
+import fitz  # PyMuPDF
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Set
+import hashlib
+import logging
+
+from .metadata_store import MetadataStore
+from .ocr_service import IMAGE_OPENERS, SUPPORTED_IMAGE_EXTENSIONS
+
+# Configuration
+SECTION = "hashes"  # Section des métadonnées contenant les empreintes
+CHUNK_SIZE = 1024 * 1024  # Lecture par blocs de 1 Mo
+HASH_SIZE = 8  # dHash 8x8 → 64 bits
+RENDER_DPI = 36  # Rendu basse résolution suffisant pour le hash perceptuel
+NEAR_DUPLICATE_DISTANCE = 6  # Distance de Hamming maximale pour un quasi-doublon
+BANDS = 8  # Découpage en 8 octets : distance ≤ 7 ⇒ au moins un octet identique
+PHASH_IMAGE_EXTENSIONS = SUPPORTED_IMAGE_EXTENSIONS  # Mêmes formats que l'OCR (.tif, .webp, HEIC...)
+PHASH_PDF_EXTENSIONS = {'.pdf'}
+
+logger = logging.getLogger(__name__)
+
+
+def sha256_file(path: Path) -> str:
+    """
+    Calcule le SHA-256 d'un fichier en streaming.
+
+    Args:
+        path: Chemin vers le fichier
+
+    Returns:
+        Empreinte hexadécimale
+    """
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        while chunk := f.read(CHUNK_SIZE):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _first_page_image(path: Path) -> Optional[Image.Image]:
+    suffix = path.suffix.lower()
+    if suffix in PHASH_PDF_EXTENSIONS:
+        with fitz.open(path) as doc:
+            if len(doc) == 0:
+                return None
+            pix = doc[0].get_pixmap(dpi=RENDER_DPI, colorspace=fitz.csGRAY)
+            return Image.frombytes("L", (pix.width, pix.height), pix.samples)
+    if suffix in PHASH_IMAGE_EXTENSIONS:
+        with IMAGE_OPENERS.get(suffix, Image.open)(path) as image:
+            image.draft("L", (HASH_SIZE * 32, HASH_SIZE * 32))  # Décodage JPEG réduit
+            return image.convert("L")
+    return None
+
+
+def perceptual_hash(path: Path) -> Optional[int]:
+    """
+    Calcule le dHash 64 bits de la première page d'un PDF ou d'une image.
+
+    Args:
+        path: Chemin vers le fichier
+
+    Returns:
+        Hash perceptuel, ou None si le format n'est pas supporté
+    """
+    try:
+        image = _first_page_image(path)
+    except Exception as e:
+        logger.error(f"Hash perceptuel échoué pour {path}: {e}")
+        return None
+    if image is None:
+        return None
+
+    small = image.resize((HASH_SIZE + 1, HASH_SIZE), Image.LANCZOS)
+    image.close()
+    pixels = list(small.getdata())
+    value = 0
+    for row in range(HASH_SIZE):
+        offset = row * (HASH_SIZE + 1)
+        for col in range(HASH_SIZE):
+            value = (value << 1) | (pixels[offset + col] > pixels[offset + col + 1])
+    return value
+
+
+def compute_hashes(path: Path, sha256: Optional[str] = None) -> dict:
+    """
+    Calcule l'entrée d'empreintes d'un document.
+
+    Args:
+        path: Chemin vers le fichier
+        sha256: Empreinte déjà calculée (pendant l'upload par exemple)
+
+    Returns:
+        Dictionnaire {"sha256", "phash", "size"}
+    """
+    phash = perceptual_hash(path)
+    return {
+        "sha256": sha256 or sha256_file(path),
+        "phash": f"{phash:016x}" if phash is not None else None,
+        "size": path.stat().st_size,
+    }
+
+
+def hamming(a: int, b: int) -> int:
+    """Distance de Hamming entre deux hash 64 bits"""
+    return (a ^ b).bit_count()
+
+
+def _shares_byte(diff: int, count: int) -> bool:
+    """Vrai si l'un des `count` premiers octets de `diff` est nul (octet commun)"""
+    return any(not (diff >> (j * 8)) & 0xFF for j in range(count))
+
+
+def _bands(value: int) -> Iterable[tuple]:
+    for i in range(BANDS):
+        yield i, (value >> (i * 8)) & 0xFF
+
+
+class HashIndex:
+    """
+    Index des empreintes, reconstruit depuis la section "hashes" des métadonnées.
+
+    Doublons exacts : dictionnaire SHA-256 → IDs.
+    Quasi-doublons : multi-index hashing, le hash 64 bits est découpé en
+    8 octets et chaque octet indexé ; deux hash à distance ≤ 7 partagent au
+    moins un octet, seuls ces candidats sont comparés.
+    """
+
+    def __init__(self, store: MetadataStore):
+        self.store = store
+        self._by_sha: Dict[str, Set[str]] = {}
+        self._bands: List[Dict[int, Set[str]]] = [{} for _ in range(BANDS)]
+        self._indexed: Dict[str, dict] = {}
+        self._built = False
+        store.add_listener(self._on_change)
+
+    def exact(self, sha256: str) -> List[str]:
+        """IDs des documents ayant exactement ce contenu"""
+        with self.store.mutex:
+            self._sync()
+            return sorted(self._by_sha.get(sha256, ()))
+
+    def near(self, phash: int, max_distance: int = NEAR_DUPLICATE_DISTANCE) -> List[tuple]:
+        """
+        Documents dont le hash perceptuel est proche.
+
+        Returns:
+            Liste de (id, distance) triée par distance
+        """
+        max_distance = min(max_distance, BANDS - 1)
+        with self.store.mutex:
+            self._sync()
+            candidates: Set[str] = set()
+            for i, band in _bands(phash):
+                candidates |= self._bands[i].get(band, set())
+            matches = []
+            for item_id in candidates:
+                distance = hamming(phash, self._indexed[item_id]["phash_int"])
+                if distance <= max_distance:
+                    matches.append((item_id, distance))
+            return sorted(matches, key=lambda m: m[1])
+
+    def exact_groups(self) -> List[List[str]]:
+        """Groupes de documents au contenu identique"""
+        with self.store.mutex:
+            self._sync()
+            return [sorted(ids) for ids in self._by_sha.values() if len(ids) > 1]
+
+    def near_groups(self, max_distance: int = NEAR_DUPLICATE_DISTANCE) -> List[List[str]]:
+        """
+        Groupes de quasi-doublons (composantes connexes), hors doublons exacts.
+
+        Les paires candidates sont tirées des paniers d'octets : une paire
+        n'est examinée que dans le premier octet qu'elle partage, donc une
+        seule fois, au lieu d'une recherche `near()` par document.
+        """
+        max_distance = min(max_distance, BANDS - 1)
+        with self.store.mutex:
+            self._sync()
+            parent: Dict[str, str] = {}
+
+            def find(x):
+                while parent.get(x, x) != x:
+                    x = parent[x]
+                return x
+
+            for i, band in enumerate(self._bands):
+                lower = (1 << (8 * i)) - 1  # Octets des paniers déjà parcourus
+                for bucket in band.values():
+                    if len(bucket) < 2:
+                        continue
+                    members = [(item_id, self._indexed[item_id]) for item_id in bucket]
+                    for k, (item_id, entry) in enumerate(members):
+                        for other, other_entry in members[k + 1:]:
+                            diff = entry["phash_int"] ^ other_entry["phash_int"]
+                            if _shares_byte(diff & lower, i):
+                                continue  # Paire déjà examinée dans un octet précédent
+                            if diff.bit_count() <= max_distance and entry["sha256"] != other_entry["sha256"]:
+                                parent[find(other)] = find(item_id)
+
+            groups: Dict[str, List[str]] = {}
+            for item_id in parent:
+                groups.setdefault(find(item_id), []).append(item_id)
+            for root, members in groups.items():
+                if root not in members:
+                    members.append(root)
+            return [sorted(m) for m in groups.values() if len(m) > 1]
+
+    # ---------- Interne ----------
+
+    def _sync(self) -> None:
+        self.store.view()
+        if not self._built:
+            self._rebuild()
+
+    def _on_change(self, op: Optional[dict]) -> None:
+        if op is None or (op["section"] == SECTION and op["op"] == "replace"):
+            self._built = False
+            return
+        if op["section"] != SECTION:
+            return
+        self._unindex(op["key"])
+        if op["op"] == "set":
+            self._index(op["key"], op["value"])
+
+    def _rebuild(self) -> None:
+        self._by_sha = {}
+        self._bands = [{} for _ in range(BANDS)]
+        self._indexed = {}
+        self._built = True
+        for item_id, entry in self.store.view().get(SECTION, {}).items():
+            self._index(item_id, entry)
+
+    def _index(self, item_id: str, entry: dict) -> None:
+        phash = int(entry["phash"], 16) if entry.get("phash") else None
+        self._indexed[item_id] = {"sha256": entry["sha256"], "phash_int": phash}
+        self._by_sha.setdefault(entry["sha256"], set()).add(item_id)
+        if phash is not None:
+            for i, band in _bands(phash):
+                self._bands[i].setdefault(band, set()).add(item_id)
+
+    def _unindex(self, item_id: str) -> None:
+        entry = self._indexed.pop(item_id, None)
+        if entry is None:
+            return
+        ids = self._by_sha.get(entry["sha256"], set())
+        ids.discard(item_id)
+        if not ids:
+            self._by_sha.pop(entry["sha256"], None)
+        if entry["phash_int"] is not None:
+            for i, band in _bands(entry["phash_int"]):
+                bucket = self._bands[i].get(band)
+                if bucket:
+                    bucket.discard(item_id)
@@ -0,0 +1,135 @@
+"""
+Export ZIP pour Ma GED Perso
+Archive d'une arborescence générée à la volée, sans fichier temporaire
+"""
+
+from pathlib import Path
+from typing import Callable, Iterable, Iterator, List, Optional, Tuple
+import csv
+import io
+import logging
+import time
+import zipfile
+
+# Configuration
+CHUNK_SIZE = 1024 * 1024  # Lecture et émission par blocs de 1 Mo
+INDEX_NAME = "index.csv"
+INDEX_HEADER = ["chemin", "taille", "modifié le", "étiquettes", "extrait OCR", "erreur"]
+# Formats déjà compressés : stockés tels quels (recompresser coûte du CPU pour rien)
+STORED_EXTENSIONS = {
+    '.pdf', '.jpg', '.jpeg', '.png', '.gif', '.webp', '.heic', '.tif', '.tiff',
+    '.zip', '.gz', '.bz2', '.xz', '.7z', '.rar',
+    '.docx', '.xlsx', '.pptx', '.odt', '.ods', '.odp',
+    '.mp3', '.mp4', '.m4a', '.mov', '.avi', '.mkv',
+}
+
+logger = logging.getLogger(__name__)
+
+IndexRow = Callable[[Path, str], List[str]]
+
+
+class ExportAborted(Exception):
+    """Lecture d'un fichier interrompue alors que son entrée était déjà émise"""
+
+
+class _ChunkSink(io.RawIOBase):
+    """Flux non positionnable : accumule les octets écrits par zipfile jusqu'à leur émission"""
+
+    def __init__(self):
+        self._chunks: List[bytes] = []
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, data) -> int:
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def drain(self) -> bytes:
+        data = b"".join(self._chunks)
+        self._chunks = []
+        return data
+
+
+def compression_for(path: Path) -> int:
+    """Méthode de compression d'un fichier selon son extension"""
+    return zipfile.ZIP_STORED if path.suffix.lower() in STORED_EXTENSIONS else zipfile.ZIP_DEFLATED
+
+
+def stream_zip(files: Iterable[Tuple[Path, str]], index_row: Optional[IndexRow] = None) -> Iterator[bytes]:
+    """
+    Génère une archive ZIP bloc par bloc.
+
+    Les tailles et CRC sont écrits après chaque fichier (descripteurs de
+    données), ce qui permet d'émettre l'archive sans jamais revenir en
+    arrière : mémoire constante, premiers octets envoyés immédiatement.
+    `files` est consommé au fil de l'archive : un parcours paresseux de
+    l'arborescence ne retarde pas le premier octet.
+
+    Un fichier qui ne peut pas être ouvert est ignoré (et signalé dans
+    index.csv). Une erreur de lecture après l'émission de son en-tête
+    interrompt l'export : l'archive incomplète est rejetée par le client,
+    plutôt que de livrer un fichier tronqué dans une archive valide.
+
+    Args:
+        files: Couples (chemin sur disque, nom dans l'archive)
+        index_row: Si fourni, ligne du fichier index.csv pour chaque document
+
+    Yields:
+        Blocs d'octets de l'archive
+
+    Raises:
+        ExportAborted: Lecture d'un fichier interrompue
+    """
+    sink = _ChunkSink()
+    entries: List[Tuple[Path, str, Optional[str]]] = []  # (chemin, nom, erreur)
+
+    with zipfile.ZipFile(sink, "w", allowZip64=True) as archive:
+        for path, arcname in files:
+            # Source ouverte avant l'en-tête : un fichier illisible est ignoré proprement
+            try:
+                info = zipfile.ZipInfo.from_file(path, arcname, strict_timestamps=False)
+                info.compress_type = compression_for(path)
+                src = open(path, "rb")
+            except OSError as e:
+                logger.error(f"Export de {path} ignoré: {e}")
+                entries.append((path, arcname, e.strerror or str(e)))  # Sans le chemin du serveur
+                continue
+            with src, archive.open(info, "w") as dst:
+                try:
+                    while chunk := src.read(CHUNK_SIZE):
+                        dst.write(chunk)
+                        yield sink.drain()
+                except OSError as e:
+                    logger.error(f"Export interrompu pendant la lecture de {path}: {e}")
+                    raise ExportAborted(f"{arcname}: {e}") from e
+            entries.append((path, arcname, None))
+            yield sink.drain()
+
+        if index_row is not None:
+            yield from _write_index(archive, sink, entries, index_row)
+    yield sink.drain()
+
+
+def _write_index(archive: zipfile.ZipFile, sink: _ChunkSink,
+                 entries: List[Tuple[Path, str, Optional[str]]], index_row: IndexRow) -> Iterator[bytes]:
+    """Ajoute index.csv (séparateur ; et BOM UTF-8 pour Excel), écrit ligne à ligne"""
+    info = zipfile.ZipInfo(INDEX_NAME, time.localtime()[:6])
+    info.compress_type = zipfile.ZIP_DEFLATED
+    with archive.open(info, "w") as dst:
+        text = io.TextIOWrapper(dst, encoding="utf-8-sig", newline="")
+        writer = csv.writer(text, delimiter=";")
+        writer.writerow(INDEX_HEADER)
+        for i, (path, arcname, error) in enumerate(entries, 1):
+            row = None
+            if error is None:
+                try:
+                    row = index_row(path, arcname) + [""]
+                except OSError as e:
+                    error = e.strerror or str(e)  # Fichier exporté puis supprimé entre-temps
+            writer.writerow(row or [arcname, "", "", "", "", error])
+            if i % 100 == 0:
+                text.flush()
+                yield sink.drain()
+        text.flush()
+        text.detach()
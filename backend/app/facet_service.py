@@ -0,0 +1,125 @@
+"""
+Facettes de recherche pour Ma GED Perso
+Comptage par type, extension, étiquette, armoire et année en une passe, sur des bitsets
+"""
+
+from typing import Dict, Hashable, Iterator, List, Optional
+from collections import OrderedDict
+import threading
+import time
+
+import numpy as np
+
+# Configuration
+FACETS = ("type", "extension", "tag", "armoire", "year")
+MAX_FACET_VALUES = 50  # Valeurs retournées par facette (les plus fréquentes)
+CACHE_SIZE = 16  # Recherches gardées en mémoire pour l'exploration par facettes
+CACHE_TTL = 60  # Secondes ; les modifications via l'API invalident plus tôt (numéro de séquence)
+
+
+def bitset(positions: List[int]) -> int:
+    """Entier dont les bits `positions` (croissantes) sont allumés, construit en une fois"""
+    bits = np.zeros(positions[-1] + 1, dtype=bool)
+    bits[positions] = True
+    return int.from_bytes(np.packbits(bits, bitorder="little").tobytes(), "little")
+
+
+def facet_values(item: dict) -> Dict[str, List[str]]:
+    """Valeurs de chaque facette pour un élément de résultat"""
+    extension = item.get("extension")
+    return {
+        "type": [item["type"]],
+        "extension": [extension.lower()] if extension else [],
+        "tag": list(item.get("tags") or []),
+        "armoire": [item["path"].split("/", 1)[0]],
+        "year": [item["modified_at"][:4]],
+    }
+
+
+class FacetSet:
+    """
+    Résultats candidats d'une recherche et leurs postings par facette.
+
+    Chaque candidat reçoit un numéro d'ordre (dans l'ordre de tri des
+    résultats) ; chaque valeur de facette est un entier Python utilisé comme
+    bitset de ces numéros. Filtrer revient à des ET binaires, compter à
+    `int.bit_count()` : l'exploration par facettes ne refait aucun parcours.
+    """
+
+    def __init__(self, items: List[dict]):
+        self.items = items
+        positions: Dict[str, Dict[str, List[int]]] = {facet: {} for facet in FACETS}
+        for ordinal, item in enumerate(items):
+            for facet, values in facet_values(item).items():
+                for value in values:
+                    positions[facet].setdefault(value, []).append(ordinal)
+        # Chaque bitset construit d'un bloc : des OU successifs recopieraient l'entier à chaque élément
+        self.postings: Dict[str, Dict[str, int]] = {
+            facet: {value: bitset(ordinals) for value, ordinals in values.items()}
+            for facet, values in positions.items()
+        }
+        self.all = (1 << len(items)) - 1
+
+    def select(self, filters: Dict[str, Optional[str]], skip: Optional[str] = None) -> int:
+        """Bitset des candidats satisfaisant tous les filtres (sauf celui de la facette `skip`)"""
+        mask = self.all
+        for facet, value in filters.items():
+            if value is None or facet == skip:
+                continue
+            mask &= self.postings[facet].get(value, 0)
+        return mask
+
+    def counts(self, filters: Dict[str, Optional[str]]) -> Dict[str, List[dict]]:
+        """
+        Comptes par valeur de chaque facette.
+        Une facette est comptée sous les filtres des autres facettes seulement :
+        ses autres valeurs restent visibles pour changer de sélection.
+        """
+        result = {}
+        for facet in FACETS:
+            base = self.select(filters, skip=facet)
+            counted = [(value, (bits & base).bit_count()) for value, bits in self.postings[facet].items()]
+            counted = sorted((c for c in counted if c[1]), key=lambda c: (-c[1], c[0]))
+            result[facet] = [{"value": v, "count": n} for v, n in counted[:MAX_FACET_VALUES]]
+        return result
+
+    def iter_items(self, mask: int) -> Iterator[dict]:
+        """Éléments du bitset, dans l'ordre de tri"""
+        while mask:
+            low = mask & -mask
+            yield self.items[low.bit_length() - 1]
+            mask ^= low
+
+
+class SearchCache:
+    """
+    Derniers ensembles de candidats calculés (LRU).
+    Une entrée n'est valable que pour le numéro de séquence des métadonnées
+    auquel elle a été calculée, et au plus CACHE_TTL secondes (modifications
+    faites directement sur le disque).
+    """
+
+    def __init__(self, size: int = CACHE_SIZE, ttl: float = CACHE_TTL):
+        self.size = size
+        self.ttl = ttl
+        self._entries: "OrderedDict[Hashable, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: Hashable, seq: int) -> Optional[FacetSet]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            entry_seq, created, facet_set = entry
+            if entry_seq != seq or time.monotonic() - created > self.ttl:
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return facet_set
+
+    def put(self, key: Hashable, seq: int, facet_set: FacetSet) -> None:
+        with self._lock:
+            self._entries[key] = (seq, time.monotonic(), facet_set)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.size:
+                self._entries.popitem(last=False)
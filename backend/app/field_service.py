@@ -0,0 +1,302 @@
+"""
+Champs structurés pour Ma GED Perso
+Extraction des dates, montants en euros, IBAN et SIRET du texte OCR, index triés pour les filtres par plage
+"""
+
+from datetime import date
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+import logging
+import re
+import unicodedata
+
+import numpy as np
+
+from .metadata_store import MetadataStore
+
+# Configuration
+SECTION = "fields"  # Section des métadonnées contenant les champs extraits
+MAX_VALUES = 100  # Valeurs gardées par type de champ et par document
+MIN_YEAR = 1950
+MAX_YEAR = 2100
+MAX_AMOUNT = 1_000_000_000
+
+MONTHS = {
+    "janvier": 1, "janv": 1, "fevrier": 2, "fevr": 2, "fev": 2, "mars": 3, "avril": 4, "avr": 4,
+    "mai": 5, "juin": 6, "juillet": 7, "juil": 7, "aout": 8, "septembre": 9, "sept": 9,
+    "octobre": 10, "oct": 10, "novembre": 11, "nov": 11, "decembre": 12, "dec": 12,
+}
+
+NUMERIC_DATE_RE = re.compile(r"(?<!\d)(\d{1,2})[/.-](\d{1,2})[/.-](\d{4}|\d{2})(?!\d)")
+TEXT_DATE_RE = re.compile(
+    r"\b(\d{1,2})(?:er)?\s+(%s)\.?\s+(\d{4})\b" % "|".join(sorted(MONTHS, key=len, reverse=True))
+)
+_NUMBER = r"\d{1,3}(?:[ .]\d{3})+(?:,\d{1,2})?(?!\d)|\d+(?:[.,]\d{1,2})?(?!\d)"
+AMOUNT_RE = re.compile(
+    r"(?:€|\beur\b)\s*(%s)|(?<![\d,.])(%s)\s*(?:€|\beur(?:os?)?\b)" % (_NUMBER, _NUMBER)
+)
+IBAN_RE = re.compile(r"\b([A-Z]{2}\d{2}(?: ?[A-Z0-9]{4}){2,7}(?: ?[A-Z0-9]{1,3})?)\b")
+SIRET_RE = re.compile(r"(?<!\d)(?<!\d )(\d{3} ?\d{3} ?\d{3} ?\d{5})(?! ?\d)")
+LA_POSTE_SIREN = "356000000"  # SIRET de La Poste : somme des chiffres multiple de 5
+
+logger = logging.getLogger(__name__)
+
+
+# ---------- Validation ----------
+
+def iban_is_valid(iban: str) -> bool:
+    """Clé de contrôle ISO 13616 (modulo 97)"""
+    if not 15 <= len(iban) <= 34:
+        return False
+    rearranged = iban[4:] + iban[:4]
+    digits = "".join(str(int(c, 36)) for c in rearranged)
+    return int(digits) % 97 == 1
+
+
+def luhn_is_valid(number: str) -> bool:
+    """Algorithme de Luhn (SIREN, SIRET)"""
+    total = 0
+    for i, char in enumerate(reversed(number)):
+        digit = int(char)
+        if i % 2 == 1:
+            digit *= 2
+            if digit > 9:
+                digit -= 9
+        total += digit
+    return total % 10 == 0
+
+
+def siret_is_valid(siret: str) -> bool:
+    """SIRET à 14 chiffres, clé de Luhn (ou règle particulière de La Poste)"""
+    if len(siret) != 14 or not siret.isdigit() or siret == "0" * 14:
+        return False
+    if siret.startswith(LA_POSTE_SIREN):
+        return sum(int(c) for c in siret) % 5 == 0
+    return luhn_is_valid(siret)
+
+
+# ---------- Extraction ----------
+
+def _fold(text: str) -> str:
+    """Minuscules sans accents, espaces insécables normalisés ; '€' conservé"""
+    text = text.replace(" ", " ").replace(" ", " ").replace("€", " € ").lower()
+    text = unicodedata.normalize("NFKD", text)
+    return "".join(c for c in text if not unicodedata.combining(c))
+
+
+def _make_date(day: int, month: int, year: int) -> Optional[str]:
+    if year < 100:
+        year += 2000 if year < 70 else 1900
+    if not MIN_YEAR <= year <= MAX_YEAR:
+        return None
+    try:
+        return date(year, month, day).isoformat()
+    except ValueError:
+        return None
+
+
+def extract_dates(text: str) -> List[str]:
+    """Dates au format français (15/03/2024, 15.03.24, 1er mars 2024), en ISO"""
+    folded = _fold(text)
+    found = set()
+    for day, month, year in NUMERIC_DATE_RE.findall(folded):
+        iso = _make_date(int(day), int(month), int(year))
+        if iso:
+            found.add(iso)
+    for day, month, year in TEXT_DATE_RE.findall(folded):
+        iso = _make_date(int(day), MONTHS[month], int(year))
+        if iso:
+            found.add(iso)
+    return sorted(found)[:MAX_VALUES]
+
+
+def _parse_amount(raw: str) -> Optional[float]:
+    raw = raw.replace(" ", "")
+    if "," in raw:
+        raw = raw.replace(".", "").replace(",", ".")  # 1.234,56
+    elif re.search(r"\.\d{3}$", raw) or raw.count(".") > 1:
+        raw = raw.replace(".", "")  # 1.234 (milliers)
+    try:
+        value = round(float(raw), 2)
+    except ValueError:
+        return None
+    return value if 0 < value < MAX_AMOUNT else None
+
+
+def extract_amounts(text: str) -> List[float]:
+    """Montants accompagnés d'un symbole ou d'une mention euro (1 234,56 €, EUR 12.50)"""
+    found = set()
+    for before, after in AMOUNT_RE.findall(_fold(text)):
+        value = _parse_amount(before or after)
+        if value is not None:
+            found.add(value)
+    return sorted(found)[:MAX_VALUES]
+
+
+def extract_ibans(text: str) -> List[str]:
+    """IBAN dont la clé modulo 97 est valide, sans espaces"""
+    found = set()
+    for raw in IBAN_RE.findall(text.upper()):
+        iban = raw.replace(" ", "")
+        if iban_is_valid(iban):
+            found.add(iban)
+    return sorted(found)[:MAX_VALUES]
+
+
+def extract_sirets(text: str) -> List[str]:
+    """SIRET (14 chiffres) dont la clé de Luhn est valide"""
+    found = set()
+    for raw in SIRET_RE.findall(text):
+        siret = raw.replace(" ", "")
+        if siret_is_valid(siret):
+            found.add(siret)
+    return sorted(found)[:MAX_VALUES]
+
+
+def extract_fields(text: str) -> dict:
+    """
+    Extrait les champs structurés d'un texte OCR.
+
+    Args:
+        text: Texte brut
+
+    Returns:
+        Dictionnaire {"dates", "amounts", "ibans", "sirets"} (listes triées)
+    """
+    return {
+        "dates": extract_dates(text),
+        "amounts": extract_amounts(text),
+        "ibans": extract_ibans(text),
+        "sirets": extract_sirets(text),
+    }
+
+
+# ---------- Index ----------
+
+def _date_key(iso: str) -> int:
+    return int(iso.replace("-", ""))  # 2024-03-15 → 20240315, ordre préservé
+
+
+def _amount_key(value: float) -> int:
+    return int(round(value * 100))  # Centimes
+
+
+class FieldIndex:
+    """
+    Index des champs extraits, construit depuis la section "fields".
+
+    Dates et montants : tableaux triés (clé entière, document) interrogés par
+    recherche dichotomique ; reconstruits paresseusement après modification.
+    IBAN et SIRET : dictionnaires valeur → documents.
+    """
+
+    def __init__(self, store: MetadataStore):
+        self.store = store
+        self._fields: Dict[str, dict] = {}
+        self._exact: Dict[str, Dict[str, Set[str]]] = {"ibans": {}, "sirets": {}}
+        self._sorted: Dict[str, Tuple[np.ndarray, np.ndarray]] = {}
+        self._ids: List[str] = []
+        self._built = False
+        self._dirty = True
+        store.add_listener(self._on_change)
+
+    def get(self, item_id: str) -> Optional[dict]:
+        """Champs extraits d'un document"""
+        with self.store.mutex:
+            self._sync()
+            return self._fields.get(item_id)
+
+    def query(self, date_from: Optional[date] = None, date_to: Optional[date] = None,
+              amount_min: Optional[float] = None, amount_max: Optional[float] = None,
+              iban: Optional[str] = None, siret: Optional[str] = None) -> Set[str]:
+        """
+        Documents satisfaisant tous les filtres donnés.
+        Un document correspond à une plage s'il contient au moins une valeur dans cette plage.
+        """
+        with self.store.mutex:
+            self._sync()
+            if self._dirty:
+                self._build_sorted()
+            result: Optional[Set[str]] = None
+
+            def narrow(ids: Iterable[str]) -> None:
+                nonlocal result
+                result = set(ids) if result is None else result & set(ids)
+
+            if date_from is not None or date_to is not None:
+                low = _date_key(date_from.isoformat()) if date_from else None
+                high = _date_key(date_to.isoformat()) if date_to else None
+                narrow(self._range("dates", low, high))
+            if amount_min is not None or amount_max is not None:
+                low = _amount_key(amount_min) if amount_min is not None else None
+                high = _amount_key(amount_max) if amount_max is not None else None
+                narrow(self._range("amounts", low, high))
+            if iban:
+                narrow(self._exact["ibans"].get(iban.replace(" ", "").upper(), ()))
+            if siret:
+                narrow(self._exact["sirets"].get(siret.replace(" ", ""), ()))
+            return result if result is not None else set(self._fields)
+
+    def _range(self, kind: str, low: Optional[int], high: Optional[int]) -> Set[str]:
+        keys, owners = self._sorted[kind]
+        start = 0 if low is None else np.searchsorted(keys, low, side="left")
+        end = len(keys) if high is None else np.searchsorted(keys, high, side="right")
+        return {self._ids[i] for i in np.unique(owners[start:end])}
+
+    # ---------- Interne ----------
+
+    def _sync(self) -> None:
+        self.store.view()
+        if not self._built:
+            self._rebuild()
+
+    def _on_change(self, op: Optional[dict]) -> None:
+        if op is None or (op["section"] == SECTION and op["op"] == "replace"):
+            self._built = False
+            return
+        if op["section"] != SECTION:
+            return
+        self._unindex(op["key"])
+        if op["op"] == "set":
+            self._index(op["key"], op["value"])
+
+    def _rebuild(self) -> None:
+        self._fields = {}
+        self._exact = {"ibans": {}, "sirets": {}}
+        self._built = True
+        for item_id, fields in self.store.view().get(SECTION, {}).items():
+            self._index(item_id, fields)
+
+    def _index(self, item_id: str, fields: dict) -> None:
+        self._fields[item_id] = fields
+        for kind, index in self._exact.items():
+            for value in fields.get(kind, ()):
+                index.setdefault(value, set()).add(item_id)
+        self._dirty = True
+
+    def _unindex(self, item_id: str) -> None:
+        fields = self._fields.pop(item_id, None)
+        if fields is None:
+            return
+        for kind, index in self._exact.items():
+            for value in fields.get(kind, ()):
+                owners = index.get(value)
+                if owners:
+                    owners.discard(item_id)
+                    if not owners:
+                        del index[value]
+        self._dirty = True
+
+    def _build_sorted(self) -> None:
+        """Tableaux (clé, document) triés par clé pour chaque champ ordonné"""
+        self._ids = list(self._fields)
+        for kind, to_key in (("dates", _date_key), ("amounts", _amount_key)):
+            keys, owners = [], []
+            for ordinal, item_id in enumerate(self._ids):
+                values = self._fields[item_id].get(kind, ())
+                keys.extend(to_key(v) for v in values)
+                owners.extend([ordinal] * len(values))
+            keys = np.array(keys, dtype=np.int64)
+            owners = np.array(owners, dtype=np.int32)
+            order = np.argsort(keys, kind="stable")
+            self._sorted[kind] = (keys[order], owners[order])
+        self._dirty = False
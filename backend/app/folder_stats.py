@@ -0,0 +1,216 @@
+"""
+Statistiques de dossiers pour Ma GED Perso
+Taille, nombre de documents et dernière modification cumulés par dossier, propagés aux ancêtres
+"""
+
+from datetime import datetime
+from pathlib import Path
+from typing import Callable, Dict, Iterable, List, Optional
+import logging
+import os
+import threading
+
+from .metadata_store import MetadataStore, MetadataTransaction
+
+# Configuration
+SECTION = "folder_stats"  # Section des métadonnées, indexée par ID de dossier
+
+logger = logging.getLogger(__name__)
+
+# Entrée d'un dossier :
+#   t        mtime_ns du dossier lors du dernier inventaire de son contenu direct
+#   b, d, m  octets, documents et modification la plus récente du contenu direct
+#   B, D, M  mêmes valeurs cumulées sur tout le sous-arbre
+Entry = Dict[str, float]
+
+
+class FolderStats:
+    """
+    Agrégats récursifs par dossier, partagés entre workers via les métadonnées.
+
+    Les opérations de l'API mettent à jour le dossier concerné puis ajoutent
+    la différence à chaque ancêtre : une armoire connaît sa taille sans que
+    personne ne parcoure son contenu. Les modifications faites hors de l'API
+    sont rattrapées paresseusement : un dossier dont la mtime a changé est
+    réinventorié (son contenu direct seulement) en arrière-plan après avoir
+    été affiché, et l'écart est propagé aux ancêtres. Indexer par ID plutôt que
+    par chemin garde les agrégats d'un sous-arbre valides après un déplacement.
+    """
+
+    def __init__(self, store: MetadataStore, root: Path,
+                 id_for_path: Callable[..., str], lookup: Callable[[Path], Optional[str]],
+                 children: Callable[[str], Dict[str, str]], is_hidden: Callable[[str], bool]):
+        self.store = store
+        self.root = root
+        self.id_for_path = id_for_path
+        self.lookup = lookup
+        self.children = children
+        self.is_hidden = is_hidden
+        self._stale: Dict[str, Path] = {}  # Dossiers affichés dont la mtime a changé
+        self._stale_lock = threading.Lock()
+
+    def summary(self, item_id: str, path: Path, mtime_ns: int) -> dict:
+        """
+        Agrégats d'un dossier pour l'API, sans écriture : si sa mtime a changé,
+        les valeurs connues sont retournées et le dossier est réinventorié par
+        `refresh_stale()`.
+
+        Args:
+            item_id: ID du dossier
+            path: Chemin du dossier
+            mtime_ns: mtime actuelle (déjà connue de l'appelant)
+        """
+        entry = self.store.view().get(SECTION, {}).get(item_id)
+        if entry is None or entry["t"] != mtime_ns:
+            with self._stale_lock:
+                self._stale[item_id] = path
+        if entry is None:
+            return {}
+        return {
+            "total_size": entry["B"],
+            "documents_count": entry["D"],
+            "last_modified": datetime.fromtimestamp(entry["M"]).isoformat(),
+        }
+
+    def refresh(self, dirs: Iterable[Path]) -> Dict[str, Entry]:
+        """
+        Réinventorie le contenu direct de dossiers (après un dépôt, une suppression,
+        un déplacement...) et propage les écarts aux ancêtres. Les sous-dossiers
+        encore inconnus sont calculés entièrement.
+
+        Le contenu direct est relu même si la mtime n'a pas bougé : sa résolution
+        (souvent quelques millisecondes) ne distingue pas deux changements rapprochés.
+
+        Returns:
+            Nouvelles entrées, par ID
+        """
+        results = {}
+        with self.store.transaction() as txn:
+            for path in dirs:
+                if path == self.root or not path.is_dir():
+                    continue
+                item_id = self.id_for_path(path, txn)
+                entry = self._scan(txn, path, item_id, deep=False, force=True)
+                results[item_id] = entry
+        return results
+
+    def refresh_stale(self) -> int:
+        """
+        Réinventorie les dossiers signalés par `summary()` (appelé en arrière-plan).
+
+        Returns:
+            Nombre de dossiers réinventoriés
+        """
+        with self._stale_lock:
+            stale, self._stale = self._stale, {}
+        if stale:
+            self.refresh(stale.values())
+        return len(stale)
+
+    def reconcile(self, progress=None) -> List[Path]:
+        """
+        Vérifie tous les dossiers (une armoire par transaction) : ceux dont la
+        mtime a changé hors de l'API sont réinventoriés, les cumuls recalculés.
+
+        Un dossier dont la mtime n'a pas bougé n'est pas relisté : ses
+        sous-dossiers sont retrouvés dans le registre d'IDs. Sur une
+        arborescence inchangée, le coût est d'un stat() par dossier.
+
+        Returns:
+            Dossiers dont le contenu direct a été relu (racine comprise)
+        """
+        armoires = [p for p in sorted(self.root.iterdir()) if p.is_dir() and not self.is_hidden(p.name)]
+        rescanned = [self.root]
+        for done, path in enumerate(armoires, 1):
+            with self.store.transaction() as txn:
+                item_id = self.id_for_path(path, txn)
+                self._scan(txn, path, item_id, deep=True, rescanned=rescanned)
+            if progress:
+                progress(done, len(armoires))
+        return rescanned
+
+    # ---------- Interne ----------
+
+    def _scan(self, txn: MetadataTransaction, path: Path, item_id: str,
+              deep: bool, force: bool = False, top: bool = True,
+              rescanned: Optional[List[Path]] = None) -> Entry:
+        """
+        Inventaire d'un dossier. Le contenu direct n'est relu que si la mtime a
+        changé (ou si `force`) ; les sous-dossiers sont parcourus si `deep` ou
+        s'ils sont inconnus. Seul le dossier de départ (`top`) reporte son écart
+        sur les ancêtres : celui des sous-dossiers est déjà dans ses cumuls.
+        Les dossiers relus sont ajoutés à `rescanned`.
+        """
+        entries = txn.data.get(SECTION, {})
+        old = entries.get(item_id)
+        mtime_ns = path.stat().st_mtime_ns
+        reuse_own = not force and old is not None and old["t"] == mtime_ns
+        own_bytes, own_docs, own_latest = (old["b"], old["d"], old["m"]) if reuse_own else (0, 0, mtime_ns / 1e9)
+        total_bytes, total_docs, total_latest = 0, 0, 0.0
+
+        if reuse_own and deep:
+            # Contenu direct inchangé : inutile de relister, les sous-dossiers sont connus
+            for name, child_id in self.children(item_id).items():
+                if child_id not in entries or self.is_hidden(name):
+                    continue  # Fichier
+                try:
+                    child = self._scan(txn, path / name, child_id, deep, top=False, rescanned=rescanned)
+                except FileNotFoundError:
+                    continue
+                total_bytes += child["B"]
+                total_docs += child["D"]
+                total_latest = max(total_latest, child["M"])
+        else:
+            if rescanned is not None and not reuse_own:
+                rescanned.append(path)
+            try:
+                with os.scandir(path) as it:
+                    for e in it:
+                        if self.is_hidden(e.name):
+                            continue
+                        if e.is_dir():
+                            child_path = Path(e.path)
+                            child_id = self.id_for_path(child_path, txn)
+                            child = entries.get(child_id)
+                            if child is None or deep:
+                                child = self._scan(txn, child_path, child_id, deep, top=False, rescanned=rescanned)
+                            total_bytes += child["B"]
+                            total_docs += child["D"]
+                            total_latest = max(total_latest, child["M"])
+                        elif not reuse_own and e.is_file():
+                            st = e.stat()
+                            own_bytes += st.st_size
+                            own_docs += 1
+                            own_latest = max(own_latest, st.st_mtime)
+            except PermissionError:
+                pass
+
+        entry = {
+            "t": mtime_ns, "b": own_bytes, "d": own_docs, "m": own_latest,
+            "B": own_bytes + total_bytes, "D": own_docs + total_docs, "M": max(own_latest, total_latest),
+        }
+        if entry != old:
+            txn.set(SECTION, item_id, entry)
+            if top:
+                self._propagate(txn, old, entry, path)
+        return entry
+
+    def _propagate(self, txn: MetadataTransaction, old: Optional[Entry], new: Entry, path: Path) -> None:
+        """Reporte l'écart des cumuls d'un dossier sur tous ses ancêtres connus"""
+        delta_bytes = new["B"] - (old["B"] if old else 0)
+        delta_docs = new["D"] - (old["D"] if old else 0)
+        if not delta_bytes and not delta_docs and old and new["M"] <= old["M"]:
+            return
+        entries = txn.data.get(SECTION, {})
+        for ancestor in path.parents:
+            if ancestor == self.root or self.root not in ancestor.parents:
+                break
+            ancestor_id = self.lookup(ancestor)
+            current = entries.get(ancestor_id) if ancestor_id else None
+            if current is None:
+                continue  # Sera calculé entièrement à sa première consultation
+            updated = dict(current)
+            updated["B"] += delta_bytes
+            updated["D"] += delta_docs
+            updated["M"] = max(current["M"], new["M"])
+            txn.set(SECTION, ancestor_id, updated)
@@ -0,0 +1,468 @@
+"""
+Tâches de fond pour Ma GED Perso
+Suppressions et déplacements longs exécutés hors requête, avec avancement et annulation
+"""
+
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import asdict, dataclass, field
+from datetime import datetime
+from pathlib import Path
+from typing import Callable, Dict, List, Optional
+import errno
+import fcntl
+import json
+import logging
+import os
+import secrets
+import shutil
+import tempfile
+import threading
+import time
+
+# Configuration
+JOBS_DIR = ".ged_store/jobs"  # État des tâches, partagé entre workers (relatif à GED_ROOT)
+TRASH_DIR = ".ged_store/trash"  # Corbeille de suppression rapide (relatif à GED_ROOT)
+SIBLING_TRASH_PREFIX = ".ged_store-trash-"  # Corbeille à côté de l'élément s'il est sur un autre volume
+MOVE_TMP_PREFIX = ".ged_store-move-"  # Copie en cours d'un déplacement entre volumes
+FS_JOB_WORKERS = int(os.environ.get("GED_FS_JOB_WORKERS", "1"))  # Tâches simultanées par worker
+PROGRESS_INTERVAL = 0.5  # Secondes entre deux écritures de l'avancement
+COPY_CHUNK_SIZE = 4 * 1024 * 1024
+JOB_RETENTION = 24 * 3600  # Secondes de conservation des tâches terminées
+JOB_STATES = ("queued", "running", "completed", "failed", "cancelled", "interrupted")
+ACTIVE_STATES = ("queued", "running")
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class Job:
+    """État d'une tâche, tel qu'enregistré dans JOBS_DIR/<id>.json"""
+    id: str
+    kind: str  # "delete" ou "move"
+    item_id: str
+    path: str  # Origine, relative à GED_ROOT
+    destination: Optional[str] = None  # Relative à GED_ROOT (déplacement)
+    state: str = "queued"
+    phase: str = ""  # "purge" (suppression) ; "copy", "finish" puis "cleanup" (déplacement)
+    cancellable: bool = False
+    files_done: int = 0
+    files_total: int = 0  # Estimation (statistiques du dossier), relevée si dépassée
+    bytes_done: int = 0
+    bytes_total: int = 0
+    error: Optional[str] = None
+    created_at: str = field(default_factory=lambda: datetime.now().isoformat())
+    started_at: Optional[str] = None
+    finished_at: Optional[str] = None
+    work_path: Optional[str] = None  # Corbeille ou copie temporaire (absolu, interne)
+
+    def public(self) -> dict:
+        """Objet tâche de l'API"""
+        data = asdict(self)
+        del data["work_path"]
+        return data
+
+
+class JobCancelled(Exception):
+    """Annulation demandée par l'utilisateur"""
+
+
+class JobStopped(Exception):
+    """Arrêt du worker : la tâche sera reprise au prochain démarrage"""
+
+
+class _Progress:
+    """Compteurs d'une tâche, enregistrés et confrontés aux demandes d'annulation à intervalle régulier"""
+
+    def __init__(self, manager: "JobManager", job: Job):
+        self.manager = manager
+        self.job = job
+        self._last = 0.0
+
+    def add(self, files: int = 0, nbytes: int = 0) -> None:
+        job = self.job
+        job.files_done += files
+        job.bytes_done += nbytes
+        now = time.monotonic()
+        if now - self._last >= PROGRESS_INTERVAL:
+            self._last = now
+            self.checkpoint()
+
+    def checkpoint(self) -> None:
+        job = self.job
+        job.files_total = max(job.files_total, job.files_done)
+        job.bytes_total = max(job.bytes_total, job.bytes_done)
+        self.manager._save(job)
+        if self.manager._stopping.is_set():
+            raise JobStopped()
+        if job.cancellable and self.manager._cancel_path(job.id).exists():
+            raise JobCancelled()
+
+
+class JobManager:
+    """
+    Exécute les opérations longues sur l'arborescence en tâche de fond.
+
+    Supprimer un dossier le renomme d'abord dans une corbeille cachée
+    (instantané, même volume) : il disparaît de la GED et la requête répond
+    tout de suite, l'espace étant libéré ensuite. Un déplacement entre
+    volumes (copie complète) est copié dans un dossier caché de la
+    destination puis renommé, et reste annulable jusque-là.
+
+    L'état de chaque tâche est un fichier JSON lisible par tous les workers ;
+    le worker qui l'exécute garde un verrou (flock) sur JOBS_DIR/<id>.lock,
+    ce qui permet de reconnaître et reprendre au démarrage une tâche
+    interrompue par un arrêt.
+    """
+
+    def __init__(self, root: Path, workers: int = FS_JOB_WORKERS):
+        self.root = root
+        self.jobs_dir = root / JOBS_DIR
+        self.trash_dir = root / TRASH_DIR
+        self.workers = workers
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._locks: Dict[str, int] = {}  # id → descripteur verrouillé (sous _mutex)
+        self._mutex = threading.Lock()
+        self._stopping = threading.Event()
+
+    # ---------- Lancement ----------
+
+    def delete(self, path: Path, item_id: str, files_total: int = 0, bytes_total: int = 0) -> dict:
+        """
+        Retire un dossier de l'arborescence (renommage dans la corbeille) et
+        lance la libération de l'espace.
+
+        Returns:
+            Tâche de purge (non annulable : l'élément n'est déjà plus dans la GED)
+        """
+        job = Job(self._new_id(), "delete", item_id, self._relative(path), phase="purge",
+                  files_total=files_total, bytes_total=bytes_total)
+        job.work_path = str(self._trash(path, job.id))
+        self._submit(job)
+        return job.public()
+
+    def move(self, path: Path, new_path: Path, item_id: str, on_done: Callable[[], None],
+             files_total: int = 0, bytes_total: int = 0) -> dict:
+        """
+        Déplace un élément vers un autre volume (copie puis suppression de l'original).
+
+        Args:
+            on_done: Appelée une fois la copie en place et l'original retiré de l'arborescence
+
+        Returns:
+            Tâche de copie (annulable tant que la copie n'est pas terminée)
+        """
+        job = Job(self._new_id(), "move", item_id, self._relative(path), self._relative(new_path),
+                  phase="copy", cancellable=True, files_total=files_total, bytes_total=bytes_total)
+        job.work_path = str(new_path.parent / f"{MOVE_TMP_PREFIX}{job.id}")
+        self._submit(job, on_done)
+        return job.public()
+
+    # ---------- Consultation ----------
+
+    def get(self, job_id: str) -> Optional[dict]:
+        """État d'une tâche (tous workers confondus), ou None si inconnue"""
+        job = self._load(job_id)
+        return self._observed(job).public() if job else None
+
+    def list(self) -> List[dict]:
+        """Tâches récentes, les plus récentes d'abord"""
+        self._expire()
+        jobs = [self._load(p.stem) for p in self.jobs_dir.glob("*.json")] if self.jobs_dir.exists() else []
+        jobs = [self._observed(j) for j in jobs if j]
+        jobs.sort(key=lambda j: j.created_at, reverse=True)
+        return [j.public() for j in jobs]
+
+    def cancel(self, job_id: str) -> Optional[dict]:
+        """
+        Demande l'annulation d'une tâche (prise en compte par le worker qui l'exécute).
+
+        Raises:
+            ValueError: Tâche terminée ou non annulable
+        """
+        job = self._load(job_id)
+        if job is None:
+            return None
+        job = self._observed(job)
+        if job.state not in ACTIVE_STATES:
+            raise ValueError("Tâche déjà terminée")
+        if not job.cancellable:
+            raise ValueError("Tâche non annulable")
+        self._cancel_path(job_id).touch()
+        return job.public()
+
+    # ---------- Cycle de vie ----------
+
+    def resume(self, on_move_done: Optional[Callable[[Job], None]] = None) -> int:
+        """
+        Reprend les tâches interrompues par un arrêt (aucun worker ne les verrouille) :
+        purges et nettoyages continuent, une copie inachevée est effacée.
+
+        Args:
+            on_move_done: Rappelée pour un déplacement arrêté entre la bascule et
+                la fin de son `on_done` (qui doit donc pouvoir être rejouée)
+
+        Returns:
+            Nombre de tâches reprises
+        """
+        self._stopping.clear()
+        self._expire()
+        resumed = 0
+        for state_path in sorted(self.jobs_dir.glob("*.json")) if self.jobs_dir.exists() else []:
+            job = self._load(state_path.stem)
+            if job is None or job.state not in ACTIVE_STATES or not self._acquire(job.id, blocking=False):
+                continue
+            resumed += 1
+            if job.phase == "copy":
+                job.phase = "abort"  # La copie partielle est effacée, l'original est intact
+            on_done = (lambda job=job: on_move_done(job)) if on_move_done is not None else None
+            self._executor_submit(job, on_done)
+        return resumed
+
+    def stop(self) -> None:
+        """Interrompt les tâches en cours (reprises au prochain démarrage)"""
+        self._stopping.set()
+        with self._mutex:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=True, cancel_futures=True)
+        with self._mutex:
+            job_ids = list(self._locks)
+        for job_id in job_ids:
+            self._release(job_id)
+
+    # ---------- Exécution ----------
+
+    def _submit(self, job: Job, on_done: Optional[Callable[[], None]] = None) -> None:
+        self._acquire(job.id, blocking=True)
+        self._save(job)
+        self._executor_submit(job, on_done)
+
+    def _executor_submit(self, job: Job, on_done: Optional[Callable[[], None]]) -> None:
+        with self._mutex:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="fs-job")
+            self._executor.submit(self._run, job, on_done)
+
+    def _run(self, job: Job, on_done: Optional[Callable[[], None]]) -> None:
+        progress = _Progress(self, job)
+        try:
+            job.state = "running"
+            job.started_at = job.started_at or datetime.now().isoformat()
+            progress.checkpoint()
+            if job.phase == "copy":
+                self._run_copy(job, progress, on_done)
+            elif job.phase == "finish":
+                self._finish_move(job, on_done)
+            elif job.phase == "abort":
+                job.cancellable = False
+                self._purge(Path(job.work_path), progress)
+                job.state = "interrupted"
+            else:
+                job.cancellable = False
+                self._purge(Path(job.work_path), progress)
+                job.state = "completed"
+        except JobStopped:
+            job.state = "queued"
+        except JobCancelled:
+            job.cancellable = False
+            self._purge(Path(job.work_path), None)
+            job.state = "cancelled"
+        except Exception as e:
+            logger.error("Tâche %s (%s) échouée: %s", job.id, job.kind, e)
+            job.state = "failed"
+            job.error = str(e)
+        finally:
+            if job.state not in ACTIVE_STATES:
+                job.finished_at = datetime.now().isoformat()
+            self._save(job)
+            self._cancel_path(job.id).unlink(missing_ok=True)
+            self._release(job.id)
+
+    def _run_copy(self, job: Job, progress: _Progress, on_done: Optional[Callable[[], None]]) -> None:
+        source = self.root / job.path
+        target = self.root / job.destination
+        work = Path(job.work_path)
+        self._copy(source, work, progress)
+        progress.checkpoint()  # Dernière occasion d'annuler
+
+        # Bascule : la copie prend sa place, l'original part à la corbeille de son volume
+        job.cancellable = False
+        os.rename(work, target)
+        job.phase = "finish"  # Repris par `resume()` : on_done est rejouée
+        job.work_path = str(self._trash(source, job.id))
+        self._save(job)
+        self._finish_move(job, on_done)
+
+    def _finish_move(self, job: Job, on_done: Optional[Callable[[], None]]) -> None:
+        """Enregistre le déplacement (on_done), puis efface l'original mis à la corbeille"""
+        try:
+            if on_done is not None:
+                on_done()
+            job.phase = "cleanup"
+            self._save(job)
+        finally:
+            self._purge(Path(job.work_path), None)  # Les compteurs restent ceux de la copie
+        job.state = "completed"
+
+    def _copy(self, source: Path, target: Path, progress: _Progress) -> None:
+        """Copie un fichier ou une arborescence en comptant fichiers et octets"""
+        if not source.is_dir() or source.is_symlink():
+            self._copy_file(source, target, progress)
+            return
+        directories = []
+        for dirpath, dirnames, filenames in os.walk(source):
+            destination = target / os.path.relpath(dirpath, source)
+            destination.mkdir(parents=True, exist_ok=True)
+            directories.append((Path(dirpath), destination))
+            for name in list(dirnames):
+                if os.path.islink(os.path.join(dirpath, name)):
+                    dirnames.remove(name)
+                    filenames.append(name)
+            for name in filenames:
+                self._copy_file(Path(dirpath) / name, destination / name, progress)
+        # Dates des dossiers en dernier : y copier des fichiers les modifie
+        for src, dst in reversed(directories):
+            shutil.copystat(src, dst)
+
+    def _copy_file(self, source: Path, target: Path, progress: _Progress) -> None:
+        if source.is_symlink():
+            os.symlink(os.readlink(source), target)
+            progress.add(files=1)
+            return
+        with open(source, "rb") as src, open(target, "wb") as dst:
+            while chunk := src.read(COPY_CHUNK_SIZE):
+                dst.write(chunk)
+                progress.add(nbytes=len(chunk))
+        shutil.copystat(source, target)
+        progress.add(files=1)
+
+    def _purge(self, path: Path, progress: Optional[_Progress]) -> None:
+        """Efface un fichier ou une arborescence (les entrées déjà effacées sont ignorées)"""
+        if path.is_dir() and not path.is_symlink():
+            for dirpath, dirnames, filenames in os.walk(path, topdown=False):
+                for name in filenames:
+                    self._unlink(Path(dirpath) / name, progress)
+                for name in dirnames:
+                    child = Path(dirpath) / name
+                    if child.is_symlink():
+                        self._unlink(child, progress)
+                    else:
+                        _ignore_missing(os.rmdir, child)
+            _ignore_missing(os.rmdir, path)
+        elif path.exists() or path.is_symlink():
+            self._unlink(path, progress)
+        # Conteneur de la corbeille principale
+        if path.parent.parent == self.trash_dir:
+            _ignore_missing(os.rmdir, path.parent)
+
+    def _unlink(self, path: Path, progress: Optional[_Progress]) -> None:
+        try:
+            size = path.lstat().st_size
+            path.unlink()
+        except FileNotFoundError:
+            return
+        if progress is not None:
+            progress.add(files=1, nbytes=size)
+
+    def _trash(self, path: Path, job_id: str) -> Path:
+        """
+        Retire instantanément un élément de l'arborescence : renommage dans la
+        corbeille principale, ou à côté de lui (caché) s'il est sur un autre volume.
+        """
+        container = self.trash_dir / job_id
+        container.mkdir(parents=True, exist_ok=True)
+        trashed = container / path.name
+        try:
+            os.rename(path, trashed)
+            return trashed
+        except OSError as e:
+            _ignore_missing(os.rmdir, container)
+            if e.errno != errno.EXDEV:
+                raise
+        trashed = path.parent / f"{SIBLING_TRASH_PREFIX}{job_id}"
+        os.rename(path, trashed)
+        return trashed
+
+    # ---------- État partagé ----------
+
+    def _new_id(self) -> str:
+        return secrets.token_urlsafe(9)
+
+    def _relative(self, path: Path) -> str:
+        return str(path.relative_to(self.root))
+
+    def _state_path(self, job_id: str) -> Path:
+        return self.jobs_dir / f"{job_id}.json"
+
+    def _lock_path(self, job_id: str) -> Path:
+        return self.jobs_dir / f"{job_id}.lock"
+
+    def _cancel_path(self, job_id: str) -> Path:
+        return self.jobs_dir / f"{job_id}.cancel"
+
+    def _save(self, job: Job) -> None:
+        """Écriture atomique (fichier temporaire puis renommage)"""
+        self.jobs_dir.mkdir(parents=True, exist_ok=True)
+        fd, tmp_name = tempfile.mkstemp(dir=self.jobs_dir, prefix=".tmp-")
+        try:
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                json.dump(asdict(job), f, ensure_ascii=False)
+            os.replace(tmp_name, self._state_path(job.id))
+        except Exception:
+            Path(tmp_name).unlink(missing_ok=True)
+            raise
+
+    def _load(self, job_id: str) -> Optional[Job]:
+        if "/" in job_id or job_id.startswith("."):
+            return None
+        try:
+            with open(self._state_path(job_id), encoding="utf-8") as f:
+                return Job(**json.load(f))
+        except (FileNotFoundError, json.JSONDecodeError, TypeError):
+            return None
+
+    def _observed(self, job: Job) -> Job:
+        """Une tâche active que plus aucun worker ne verrouille a été interrompue"""
+        with self._mutex:
+            held = job.id in self._locks
+        if job.state in ACTIVE_STATES and not held and self._acquire(job.id, blocking=False):
+            self._release(job.id)
+            job.state = "interrupted"
+        return job
+
+    def _acquire(self, job_id: str, blocking: bool) -> bool:
+        self.jobs_dir.mkdir(parents=True, exist_ok=True)
+        fd = os.open(self._lock_path(job_id), os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX | (0 if blocking else fcntl.LOCK_NB))
+        except BlockingIOError:
+            os.close(fd)
+            return False
+        with self._mutex:
+            self._locks[job_id] = fd
+        return True
+
+    def _release(self, job_id: str) -> None:
+        with self._mutex:
+            fd = self._locks.pop(job_id, None)
+        if fd is not None:
+            os.close(fd)  # Libère aussi le verrou
+
+    def _expire(self) -> None:
+        """Oublie les tâches terminées depuis plus de JOB_RETENTION"""
+        if not self.jobs_dir.exists():
+            return
+        limit = time.time() - JOB_RETENTION
+        for state_path in self.jobs_dir.glob("*.json"):
+            job = self._load(state_path.stem)
+            if job is None or job.state in ACTIVE_STATES or state_path.stat().st_mtime > limit:
+                continue
+            for path in (state_path, self._lock_path(job.id), self._cancel_path(job.id)):
+                path.unlink(missing_ok=True)
+
+
+def _ignore_missing(fn: Callable[[Path], None], path: Path) -> None:
+    try:
+        fn(path)
+    except FileNotFoundError:
+        pass
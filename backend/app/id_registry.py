@@ -0,0 +1,329 @@
+"""
+Registre des identifiants pour Ma GED Perso
+Identifiants courts et stables, indépendants du chemin (survivent aux renommages et déplacements)
+"""
+
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Set
+import logging
+import os
+import secrets
+import threading
+
+from .metadata_store import MetadataStore, MetadataTransaction
+
+# Configuration
+SECTION = "ids"  # Section des métadonnées contenant le registre
+ID_BYTES = 6  # 6 octets → 8 caractères URL-safe
+REGISTER_BATCH = 1000  # Enregistrements par transaction lors du parcours initial
+MAX_DEPTH = 64
+
+logger = logging.getLogger(__name__)
+
+
+class IdRegistry:
+    """
+    Associe à chaque fichier/dossier un identifiant court et stable.
+
+    Chaque enregistrement stocke `{"parent": id_parent, "name": nom, "ino": inode}`
+    (parent vide pour les armoires). Renommer ou déplacer un dossier ne
+    modifie donc qu'un seul enregistrement, quel que soit son contenu.
+    Chemin → ID coûte O(profondeur) ; ID → chemin est mis en cache jusqu'au
+    prochain renommage, déplacement ou retrait.
+
+    Les lectures passent par `peek()`, qui n'écrit jamais : un chemin inconnu
+    y est mis en attente et enregistré par lots avec `register_pending()`.
+    """
+
+    def __init__(self, store: MetadataStore, root: Path):
+        self.store = store
+        self.root = root
+        self._children: Dict[str, Dict[str, str]] = {}  # parent → {nom → id}
+        self._by_ino: Dict[int, str] = {}
+        self._indexed: Dict[str, tuple] = {}  # id → (parent, nom, inode) indexés
+        self._paths: Dict[str, Path] = {}  # Cache id → chemin
+        self._built = False
+        self._pending: Set[Path] = set()  # Dossiers dont le contenu attend d'être enregistré
+        self._pending_lock = threading.Lock()
+        self._pending_event = threading.Event()
+        store.add_listener(self._on_change)
+
+    # ---------- Chemin → ID ----------
+
+    def id_for_path(self, path: Path, txn: Optional[MetadataTransaction] = None) -> str:
+        """Retourne l'ID d'un chemin existant, en l'enregistrant si nécessaire"""
+        return self.ids_for_paths([path], txn)[0]
+
+    def ids_for_paths(self, paths: List[Path], txn: Optional[MetadataTransaction] = None) -> List[str]:
+        """
+        Retourne les IDs d'une liste de chemins.
+        Les chemins inconnus sont enregistrés dans une seule transaction.
+        """
+        with self.store.mutex:
+            self._sync()
+            ids = [self.lookup(p) for p in paths]
+            if all(ids):
+                return ids
+            if txn is not None:
+                return [i or self._register(txn, p) for i, p in zip(ids, paths)]
+            with self.store.transaction() as txn:
+                # Relecture : un autre worker a pu enregistrer ces chemins entre-temps
+                return [self.lookup(p) or self._register(txn, p) for p in paths]
+
+    def lookup(self, path: Path) -> Optional[str]:
+        """Retourne l'ID d'un chemin déjà enregistré, sans rien créer"""
+        with self.store.mutex:
+            self._sync()
+            parent = ""
+            for part in path.relative_to(self.root).parts:
+                parent = self._children.get(parent, {}).get(part)
+                if parent is None:
+                    return None
+            return parent or None
+
+    def peek(self, path: Path) -> Optional[str]:
+        """
+        Retourne l'ID d'un chemin déjà enregistré, sans transaction.
+        Un chemin inconnu est mis en attente de `register_pending()`.
+        """
+        item_id = self.lookup(path)
+        if item_id is None and path != self.root:
+            with self._pending_lock:
+                self._pending.add(path.parent)
+            self._pending_event.set()
+        return item_id
+
+    # ---------- ID → chemin ----------
+
+    def path_for_id(self, item_id: str) -> Optional[Path]:
+        """Retourne le chemin courant d'un ID, ou None si inconnu"""
+        with self.store.mutex:
+            self._sync()
+            path = self._paths.get(item_id)
+            if path is not None:
+                return path
+            records = self._records()
+            parts = []
+            current = item_id
+            while current:
+                record = records.get(current)
+                if record is None or len(parts) > MAX_DEPTH:
+                    return None
+                parts.append(record["name"])
+                current = record["parent"]
+            if not parts:
+                return None
+            path = self._paths[item_id] = self.root.joinpath(*reversed(parts))
+            return path
+
+    def knows(self, item_id: str) -> bool:
+        """Vérifie si un ID appartient au registre"""
+        with self.store.mutex:
+            self._sync()
+            return item_id in self._records()
+
+    def children(self, item_id: str) -> Dict[str, str]:
+        """Retourne les enfants directs enregistrés d'un élément ({nom → id})"""
+        with self.store.mutex:
+            self._sync()
+            return dict(self._children.get(item_id, {}))
+
+    def descendants(self, item_id: str) -> List[str]:
+        """Retourne les IDs de tous les descendants enregistrés d'un élément"""
+        with self.store.mutex:
+            self._sync()
+            result = []
+            stack = [item_id]
+            while stack:
+                children = list(self._children.get(stack.pop(), {}).values())
+                result.extend(children)
+                stack.extend(children)
+            return result
+
+    # ---------- Mutations ----------
+
+    def rename(self, item_id: str, new_name: str, txn: Optional[MetadataTransaction] = None) -> None:
+        """Enregistre le renommage d'un élément (descendants inclus, en O(1))"""
+        self._update(item_id, txn, name=new_name)
+
+    def move(self, item_id: str, new_path: Path, txn: Optional[MetadataTransaction] = None) -> None:
+        """Enregistre le déplacement d'un élément vers `new_path` (déjà effectué sur disque)"""
+        with self.store.mutex:
+            parent = self.id_for_path(new_path.parent, txn) if new_path.parent != self.root else ""
+            self._update(item_id, txn, parent=parent, name=new_path.name, ino=_inode(new_path))
+
+    def forget(self, item_ids: Iterable[str], txn: MetadataTransaction) -> None:
+        """Retire des IDs du registre"""
+        for item_id in item_ids:
+            txn.delete(SECTION, item_id)
+
+    def register_tree(self, is_hidden, directories: Optional[Iterable[Path]] = None) -> int:
+        """
+        Parcourt l'arborescence et enregistre les chemins inconnus par lots.
+
+        Args:
+            is_hidden: Fonction indiquant si un nom doit être ignoré
+            directories: Dossiers dont lister le contenu direct seulement (ceux
+                dont la mtime a changé) ; toute l'arborescence si None
+
+        Returns:
+            Nombre de chemins nouvellement enregistrés
+        """
+        registered = 0
+        pending: List[Path] = []
+
+        def flush():
+            nonlocal registered
+            if pending:
+                self.ids_for_paths(pending)
+                registered += len(pending)
+                pending.clear()
+
+        recursive = directories is None
+        stack = [self.root] if recursive else list(directories)
+        while stack:
+            directory = stack.pop()
+            try:
+                entries = list(os.scandir(directory))
+            except OSError:
+                continue
+            for entry in entries:
+                if is_hidden(entry.name):
+                    continue
+                path = Path(entry.path)
+                if self.lookup(path) is None:
+                    pending.append(path)
+                if recursive and entry.is_dir(follow_symlinks=False):
+                    stack.append(path)
+            if len(pending) >= REGISTER_BATCH:
+                flush()
+        flush()
+        return registered
+
+    def wait_pending(self, timeout: Optional[float] = None) -> bool:
+        """Attend qu'une lecture ait rencontré un chemin inconnu"""
+        return self._pending_event.wait(timeout)
+
+    def register_pending(self, is_hidden) -> int:
+        """
+        Enregistre par lots le contenu des dossiers mis en attente par `peek()`.
+
+        Returns:
+            Nombre de chemins nouvellement enregistrés
+        """
+        with self._pending_lock:
+            directories, self._pending = self._pending, set()
+            self._pending_event.clear()
+        if not directories:
+            return 0
+        return self.register_tree(is_hidden, directories)
+
+    # ---------- Interne ----------
+
+    def _records(self) -> dict:
+        return self.store.view().get(SECTION, {})
+
+    def _sync(self) -> None:
+        self.store.view()  # Rattrape le journal (et notifie les écouteurs)
+        if not self._built:
+            self._rebuild()
+
+    def _update(self, item_id: str, txn: Optional[MetadataTransaction], **changes) -> None:
+        with self.store.mutex:
+            if txn is None:
+                with self.store.transaction() as txn:
+                    self._update(item_id, txn, **changes)
+                return
+            record = txn.data.get(SECTION, {}).get(item_id)
+            if record is None:
+                return
+            txn.set(SECTION, item_id, {**record, **changes})
+
+    def _register(self, txn: MetadataTransaction, path: Path) -> str:
+        parent = ""
+        current = self.root
+        for part in path.relative_to(self.root).parts:
+            current = current / part
+            item_id = self._children.get(parent, {}).get(part)
+            if item_id is None:
+                ino = _inode(current)
+                item_id = self._reattach(txn, parent, part, ino) or self._allocate(txn, parent, part, ino)
+            parent = item_id
+        return parent
+
+    def _reattach(self, txn: MetadataTransaction, parent: str, name: str, ino: Optional[int]) -> Optional[str]:
+        """
+        Réutilise l'ID d'un élément renommé ou déplacé hors de l'API (SMB, File Station) :
+        même inode, même nom ou même parent, et ancien chemin disparu.
+        """
+        item_id = self._by_ino.get(ino) if ino is not None else None
+        if item_id is None:
+            return None
+        record = txn.data.get(SECTION, {}).get(item_id)
+        if record is None or (record["parent"] != parent and record["name"] != name):
+            return None
+        old_path = self.path_for_id(item_id)
+        if old_path is not None and old_path.exists():
+            return None
+        txn.set(SECTION, item_id, {"parent": parent, "name": name, "ino": ino})
+        return item_id
+
+    def _allocate(self, txn: MetadataTransaction, parent: str, name: str, ino: Optional[int]) -> str:
+        records = txn.data.get(SECTION, {})
+        item_id = secrets.token_urlsafe(ID_BYTES)
+        while item_id in records:
+            item_id = secrets.token_urlsafe(ID_BYTES)
+        txn.set(SECTION, item_id, {"parent": parent, "name": name, "ino": ino})
+        return item_id
+
+    def _on_change(self, op: Optional[dict]) -> None:
+        if op is None:
+            self._built = False
+            self._paths = {}
+            return
+        if op["section"] != SECTION:
+            return
+        if op["op"] == "replace":
+            self._built = False
+            self._paths = {}
+            return
+        item_id = op["key"]
+        if item_id in self._indexed:
+            self._paths = {}  # Renommage, déplacement ou retrait : les chemins des descendants changent
+        self._unindex(item_id)
+        if op["op"] == "set":
+            self._index(item_id, op["value"])
+
+    def _rebuild(self) -> None:
+        self._paths = {}
+        self._children = {}
+        self._by_ino = {}
+        self._indexed = {}
+        self._built = True
+        for item_id, record in self._records().items():
+            self._index(item_id, record)
+
+    def _index(self, item_id: str, record: dict) -> None:
+        parent, name, ino = record["parent"], record["name"], record.get("ino")
+        self._children.setdefault(parent, {})[name] = item_id
+        if ino is not None:
+            self._by_ino[ino] = item_id
+        self._indexed[item_id] = (parent, name, ino)
+
+    def _unindex(self, item_id: str) -> None:
+        previous = self._indexed.pop(item_id, None)
+        if previous is None:
+            return
+        parent, name, ino = previous
+        siblings = self._children.get(parent, {})
+        if siblings.get(name) == item_id:
+            del siblings[name]
+        if ino is not None and self._by_ino.get(ino) == item_id:
+            del self._by_ino[ino]
+
+
+def _inode(path: Path) -> Optional[int]:
+    try:
+        return path.stat().st_ino
+    except OSError:
+        return None
@@ -0,0 +1,309 @@
+"""
+Instantanés des index pour Ma GED Perso
+Fichier binaire versionné et vérifié (CRC32, marqueur de fin), relu par projection mémoire au démarrage
+"""
+
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, List, Optional, Protocol, Tuple
+import fcntl
+import json
+import logging
+import mmap
+import os
+import struct
+import tempfile
+import threading
+import zlib
+
+import numpy as np
+
+# Configuration
+SNAPSHOT_DIR = ".ged_store/indexes"  # Relatif à GED_ROOT
+MAGIC = b"GEDSNAP\0"
+FORMAT_VERSION = 2
+HEADER = struct.Struct("<8sIQI")  # magic, version du format, longueur et CRC de la table des matières
+TRAILER = struct.Struct("<8sQ")  # magic, taille totale du fichier : détecte un fichier tronqué
+ALIGNMENT = 64  # Alignement des tableaux dans le fichier
+
+logger = logging.getLogger(__name__)
+
+Arrays = Dict[str, np.ndarray]
+
+
+class SnapshotError(Exception):
+    """Instantané absent, d'une autre version ou corrompu"""
+
+
+class Snapshottable(Protocol):
+    """
+    Index pouvant être sauvegardé puis restauré.
+    `refresh_lock` (optionnel) sérialise ses mises à jour.
+    """
+
+    SNAPSHOT_SCHEMA: int
+
+    def snapshot_state(self) -> Tuple[Arrays, dict]: ...
+
+    def restore_state(self, arrays: Arrays, state: dict) -> None: ...
+
+    def reset(self) -> None: ...
+
+
+def write_snapshot(path: Path, kind: str, schema: str, arrays: Arrays, state: dict) -> int:
+    """
+    Écrit un instantané de façon atomique.
+
+    Format : en-tête fixe, table des matières JSON (état + description des
+    tableaux avec leur CRC32), les tableaux bruts alignés sur 64 octets, puis
+    un marqueur de fin portant la taille du fichier.
+
+    Returns:
+        Taille du fichier en octets
+    """
+    toc = {
+        "kind": kind,
+        "schema": schema,
+        "created_at": datetime.now().isoformat(),
+        "state": state,
+        "arrays": {},
+    }
+    offset = 0
+    layout = []
+    for name, array in arrays.items():
+        array = np.ascontiguousarray(array)
+        raw = array.reshape(-1).view(np.uint8)
+        offset = -(-offset // ALIGNMENT) * ALIGNMENT
+        toc["arrays"][name] = {
+            "dtype": array.dtype.str,
+            "shape": list(array.shape),
+            "offset": offset,
+            "nbytes": array.nbytes,
+            "crc32": zlib.crc32(raw),
+        }
+        layout.append((offset, raw))
+        offset += array.nbytes
+
+    toc_bytes = json.dumps(toc, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+    data_start = -(-(HEADER.size + len(toc_bytes)) // ALIGNMENT) * ALIGNMENT
+
+    path.parent.mkdir(parents=True, exist_ok=True)
+    fd, tmp_name = tempfile.mkstemp(dir=path.parent, prefix=".tmp-")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(HEADER.pack(MAGIC, FORMAT_VERSION, len(toc_bytes), zlib.crc32(toc_bytes)))
+            f.write(toc_bytes)
+            for array_offset, raw in layout:
+                f.seek(data_start + array_offset)
+                f.write(raw)
+            f.truncate(data_start + offset)
+            f.seek(data_start + offset)
+            f.write(TRAILER.pack(MAGIC, data_start + offset + TRAILER.size))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_name, path)
+    except Exception:
+        Path(tmp_name).unlink(missing_ok=True)
+        raise
+    return data_start + offset + TRAILER.size
+
+
+def read_snapshot(path: Path, kind: str, schema: str, verify: bool = False) -> Tuple[Arrays, dict]:
+    """
+    Projette un instantané en mémoire et vérifie son intégrité.
+
+    Les tableaux retournés sont des vues en lecture seule sur le fichier :
+    seules les pages réellement consultées sont lues depuis le disque.
+    Sans `verify`, seuls l'en-tête, la table des matières et le marqueur de
+    fin sont vérifiés ; calculer le CRC de chaque tableau oblige à relire
+    tout le fichier (voir `SnapshotManager.load`).
+
+    Args:
+        verify: Vérifie aussi le CRC32 de chaque tableau
+
+    Raises:
+        SnapshotError: Fichier absent, version différente ou CRC invalide
+    """
+    try:
+        with open(path, "rb") as f:
+            mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    except (OSError, ValueError) as e:
+        raise SnapshotError(f"Instantané illisible: {e}")
+
+    if len(mapped) < HEADER.size:
+        raise SnapshotError("Instantané tronqué")
+    magic, version, toc_length, toc_crc = HEADER.unpack_from(mapped, 0)
+    if magic != MAGIC or version != FORMAT_VERSION:
+        raise SnapshotError(f"Format d'instantané non reconnu (version {version})")
+    toc_bytes = mapped[HEADER.size:HEADER.size + toc_length]
+    if len(toc_bytes) != toc_length or zlib.crc32(toc_bytes) != toc_crc:
+        raise SnapshotError("Table des matières corrompue")
+    toc = json.loads(toc_bytes)
+    if toc.get("kind") != kind or toc.get("schema") != schema:
+        raise SnapshotError(f"Instantané {toc.get('kind')} [{toc.get('schema')}], attendu {kind} [{schema}]")
+
+    if len(mapped) < TRAILER.size or TRAILER.unpack_from(mapped, len(mapped) - TRAILER.size) != (MAGIC, len(mapped)):
+        raise SnapshotError("Instantané tronqué")
+
+    data_start = -(-(HEADER.size + toc_length) // ALIGNMENT) * ALIGNMENT
+    data_end = len(mapped) - TRAILER.size
+    arrays = {}
+    view = memoryview(mapped)
+    for name, spec in toc["arrays"].items():
+        start = data_start + spec["offset"]
+        end = start + spec["nbytes"]
+        if end > data_end or (verify and zlib.crc32(view[start:end]) != spec["crc32"]):
+            raise SnapshotError(f"Tableau {name} corrompu")
+        dtype = np.dtype(spec["dtype"])
+        count = spec["nbytes"] // dtype.itemsize
+        arrays[name] = np.frombuffer(mapped, dtype=dtype, count=count, offset=start).reshape(spec["shape"])
+    return arrays, toc["state"]
+
+
+class SnapshotManager:
+    """
+    Sauvegarde et restauration groupées d'index liés (ils partagent le vocabulaire).
+
+    Au démarrage, `hold()` bloque le rafraîchissement des index jusqu'à la fin
+    de `load()` : une requête arrivée pendant la restauration attend quelques
+    instants au lieu de lancer une reconstruction complète. Après restauration,
+    le rafraîchissement normal ne retraite que les documents dont le texte ou
+    le classement a changé depuis l'instantané.
+
+    Un seul worker uvicorn écrit à la fois (verrou fichier non bloquant).
+
+    Les CRC des tableaux sont vérifiés au premier chargement d'un fichier
+    (nouvelle date de modification, taille ou inode) ; le résultat est noté
+    dans un fichier témoin `.verified` pour que les démarrages suivants
+    n'aient pas à relire tout l'instantané. Un fichier écrit par `save()`
+    est noté vérifié d'office (ses CRC viennent d'être calculés).
+    """
+
+    def __init__(self, path: Path, kind: str, components: Dict[str, Snapshottable]):
+        self.path = path
+        self.kind = kind
+        self.components = components
+        # Toute évolution d'un composant invalide l'instantané entier
+        self.schema = ",".join(f"{name}:{c.SNAPSHOT_SCHEMA}" for name, c in components.items())
+        self.loaded: Optional[str] = None  # Date de l'instantané restauré
+        self.saved_at: Optional[str] = None
+        self.last_error: Optional[str] = None
+        self._held = False
+
+    def hold(self) -> None:
+        """Suspend les rafraîchissements jusqu'à `load()`"""
+        for lock in self._locks():
+            lock.acquire()
+        self._held = True
+
+    def load(self) -> bool:
+        """
+        Restaure tous les index depuis l'instantané, puis libère `hold()`.
+
+        Returns:
+            True si l'instantané a été restauré
+        """
+        try:
+            signature = self._signature()
+            verify = signature is None or signature != self._verified_signature()
+            arrays, state = read_snapshot(self.path, self.kind, self.schema, verify=verify)
+            if verify and signature is not None and self._signature() == signature:
+                self._mark_verified(signature)
+            for name, component in self.components.items():
+                prefix = f"{name}."
+                component.restore_state(
+                    {k[len(prefix):]: v for k, v in arrays.items() if k.startswith(prefix)},
+                    state[name]
+                )
+            self.loaded = state.get("_created_at")
+            return True
+        except SnapshotError as e:
+            if self.path.exists():
+                self.last_error = str(e)
+                logger.warning(f"Instantané {self.path.name} ignoré: {e}")
+            return False
+        except Exception as e:
+            self.last_error = str(e)
+            logger.error(f"Restauration de {self.path.name} échouée: {e}")
+            for component in self.components.values():
+                component.reset()  # Reconstruction complète au prochain rafraîchissement
+            return False
+        finally:
+            self._release()
+
+    def save(self) -> bool:
+        """
+        Écrit l'instantané (ignoré si un autre worker est en train de l'écrire).
+
+        Returns:
+            True si l'instantané a été écrit
+        """
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        fd = os.open(self.path.with_suffix(".lock"), os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            try:
+                fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                return False
+            self.path.with_suffix(".verified").unlink(missing_ok=True)
+            arrays: Arrays = {}
+            state: dict = {"_created_at": datetime.now().isoformat()}
+            # Tous les index figés ensemble : leurs colonnes renvoient au même vocabulaire
+            locks = self._locks()
+            for lock in locks:
+                lock.acquire()
+            try:
+                for name, component in self.components.items():
+                    component_arrays, component_state = component.snapshot_state()
+                    arrays.update({f"{name}.{k}": v for k, v in component_arrays.items()})
+                    state[name] = component_state
+            finally:
+                for lock in reversed(locks):
+                    lock.release()
+            size = write_snapshot(self.path, self.kind, self.schema, arrays, state)
+            self._mark_verified(self._signature())
+            self.saved_at = state["_created_at"]
+            logger.info(f"Instantané {self.path.name} écrit ({size // 1024} Ko)")
+            return True
+        finally:
+            os.close(fd)
+
+    def status(self) -> dict:
+        return {
+            "path": str(self.path.name),
+            "restored_from": self.loaded,
+            "saved_at": self.saved_at,
+            "error": self.last_error,
+        }
+
+    def _signature(self) -> Optional[list]:
+        """Identité du fichier d'instantané (inode, taille, date de modification)"""
+        try:
+            stat = self.path.stat()
+        except OSError:
+            return None
+        return [stat.st_ino, stat.st_size, stat.st_mtime_ns]
+
+    def _verified_signature(self) -> Optional[list]:
+        try:
+            return json.loads(self.path.with_suffix(".verified").read_text())
+        except (OSError, ValueError):
+            return None
+
+    def _mark_verified(self, signature: Optional[list]) -> None:
+        if signature is None:
+            return
+        try:
+            self.path.with_suffix(".verified").write_text(json.dumps(signature))
+        except OSError as e:
+            logger.warning(f"Témoin de vérification de {self.path.name} non écrit: {e}")
+
+    def _locks(self) -> List[threading.Lock]:
+        return [c.refresh_lock for c in self.components.values() if hasattr(c, "refresh_lock")]
+
+    def _release(self) -> None:
+        if self._held:
+            self._held = False
+            for lock in reversed(self._locks()):
+                lock.release()
+
@@ -0,0 +1,254 @@
+"""
+Dossier d'import surveillé pour Ma GED Perso
+Absorbe les PDFs déposés par le scanner réseau : stabilité, empreinte, classement, OCR
+"""
+
+from pathlib import Path
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import Callable, Dict, List, Optional
+import asyncio
+import fcntl
+import logging
+import os
+import shutil
+import time
+
+from .dedup_service import sha256_file
+
+# Configuration
+INGEST_DIR = os.environ.get("GED_INGEST_DIR", "")  # Vide = import désactivé
+INGEST_TARGET = os.environ.get("GED_INGEST_TARGET", "A classer")  # Relatif à GED_ROOT
+INGEST_WORKERS = int(os.environ.get("GED_INGEST_WORKERS", max(1, (os.cpu_count() or 2) // 2)))
+INGEST_SKIP_DUPLICATES = os.environ.get("GED_INGEST_SKIP_DUPLICATES", "true").lower() == "true"
+POLL_INTERVAL = 3.0  # Secondes entre deux scans du dossier
+STABLE_POLLS = 2  # Scans consécutifs sans changement de taille/date avant traitement
+QUEUE_SIZE = 32  # Au-delà, le scan attend que les workers se libèrent
+DUPLICATES_DIR = "_doublons"
+ERRORS_DIR = "_erreurs"
+
+logger = logging.getLogger(__name__)
+
+FileDocument = Callable[[Path, Path, str], Path]
+FindDuplicates = Callable[[str], List[dict]]
+
+
+class IngestPipeline:
+    """
+    Surveille un dossier d'import et y traite chaque fichier une fois stable.
+
+    Un fichier est considéré comme complet lorsque sa taille et sa date de
+    modification n'ont pas bougé pendant STABLE_POLLS scans. Les fichiers
+    stables passent par une file bornée (contre-pression) vers un pool de
+    threads dédié, pour ne jamais consommer les threads de l'API.
+
+    Classement : un fichier déposé dans `<import>/Banques/Relevés/` va dans
+    `GED_ROOT/Banques/Relevés/` si ce dossier existe, sinon dans INGEST_TARGET.
+    """
+
+    def __init__(self, source: Path, root: Path, file_document: FileDocument,
+                 find_duplicates: FindDuplicates, workers: int = INGEST_WORKERS):
+        self.source = source
+        self.root = root
+        self.file_document = file_document
+        self.find_duplicates = find_duplicates
+        self.workers = workers
+
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._queue: Optional[asyncio.Queue] = None
+        self._tasks: List[asyncio.Task] = []
+        self._lock_fd: Optional[int] = None
+        self._candidates: Dict[Path, tuple] = {}  # chemin → (taille, mtime, scans stables)
+        self._in_flight: set = set()
+
+        self.started_at: Optional[str] = None
+        self.processing = 0
+        self.done = 0
+        self.failed = 0
+        self.duplicates = 0
+        self.bytes_done = 0
+        self.recent: deque = deque(maxlen=20)
+
+    # ---------- Cycle de vie ----------
+
+    def start(self) -> bool:
+        """
+        Démarre la surveillance (dans la boucle asyncio courante).
+        Un seul worker uvicorn surveille le dossier : les autres n'obtiennent pas le verrou.
+        """
+        if not self._acquire_leadership():
+            return False
+        self.source.mkdir(parents=True, exist_ok=True)
+        self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="ingest")
+        self._queue = asyncio.Queue(maxsize=QUEUE_SIZE)
+        self._tasks = [asyncio.create_task(self._watch())]
+        self._tasks += [asyncio.create_task(self._work()) for _ in range(self.workers)]
+        self.started_at = datetime.now().isoformat()
+        logger.info(f"Import surveillé: {self.source} ({self.workers} workers)")
+        return True
+
+    async def stop(self) -> None:
+        """Arrête la surveillance et les workers"""
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        if self._executor:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+        if self._lock_fd is not None:
+            os.close(self._lock_fd)
+            self._lock_fd = None
+
+    @property
+    def running(self) -> bool:
+        return bool(self._tasks)
+
+    def status(self) -> dict:
+        """État courant du pipeline"""
+        return {
+            "enabled": True,
+            "running": self.running,
+            "source": str(self.source),
+            "default_target": INGEST_TARGET,
+            "workers": self.workers,
+            "started_at": self.started_at,
+            "waiting_stability": len(self._candidates),
+            "queued": self._queue.qsize() if self._queue else 0,
+            "processing": self.processing,
+            "done": self.done,
+            "failed": self.failed,
+            "duplicates": self.duplicates,
+            "bytes_done": self.bytes_done,
+            "recent": list(self.recent),
+        }
+
+    # ---------- Surveillance ----------
+
+    async def _watch(self) -> None:
+        while True:
+            try:
+                ready = await asyncio.to_thread(self._scan)
+                for path in ready:
+                    self._in_flight.add(path)
+                    await self._queue.put(path)  # Bloque si la file est pleine
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Scan du dossier d'import échoué: {e}")
+            await asyncio.sleep(POLL_INTERVAL)
+
+    def _scan(self) -> List[Path]:
+        """Retourne les fichiers devenus stables depuis le dernier scan"""
+        seen = set()
+        ready = []
+        for path in self._iter_files(self.source):
+            if path in self._in_flight:
+                continue
+            seen.add(path)
+            try:
+                st = path.stat()
+            except FileNotFoundError:
+                continue
+            size, mtime, stable = self._candidates.get(path, (None, None, 0))
+            if (st.st_size, st.st_mtime) == (size, mtime) and st.st_size > 0:
+                stable += 1
+            else:
+                stable = 0
+            if stable >= STABLE_POLLS:
+                ready.append(path)
+                self._candidates.pop(path, None)
+            else:
+                self._candidates[path] = (st.st_size, st.st_mtime, stable)
+
+        # Oublier les fichiers disparus
+        for path in list(self._candidates):
+            if path not in seen:
+                del self._candidates[path]
+        return ready
+
+    def _iter_files(self, directory: Path):
+        try:
+            entries = list(os.scandir(directory))
+        except OSError:
+            return
+        for entry in entries:
+            if entry.name[0] in ".@#" or entry.name in (DUPLICATES_DIR, ERRORS_DIR):
+                continue
+            if entry.is_dir(follow_symlinks=False):
+                yield from self._iter_files(Path(entry.path))
+            elif entry.is_file(follow_symlinks=False):
+                yield Path(entry.path)
+
+    # ---------- Traitement ----------
+
+    async def _work(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            path = await self._queue.get()
+            self.processing += 1
+            try:
+                await loop.run_in_executor(self._executor, self._process, path)
+            finally:
+                self.processing -= 1
+                self._in_flight.discard(path)
+                self._queue.task_done()
+
+    def _process(self, path: Path) -> None:
+        started = time.monotonic()
+        event = {"file": str(path.relative_to(self.source)), "at": datetime.now().isoformat()}
+        try:
+            size = path.stat().st_size
+            sha256 = sha256_file(path)
+
+            if INGEST_SKIP_DUPLICATES and self.find_duplicates(sha256):
+                self._set_aside(path, DUPLICATES_DIR)
+                self.duplicates += 1
+                event["status"] = "duplicate"
+            else:
+                target = self._target_dir(path)
+                filed = self.file_document(path, target, sha256)
+                self.done += 1
+                self.bytes_done += size
+                event["status"] = "done"
+                event["path"] = str(filed.relative_to(self.root))
+        except Exception as e:
+            logger.error(f"Import de {path} échoué: {e}")
+            self.failed += 1
+            event["status"] = "failed"
+            event["error"] = str(e)
+            if path.exists():
+                self._set_aside(path, ERRORS_DIR)
+        event["seconds"] = round(time.monotonic() - started, 2)
+        self.recent.appendleft(event)
+
+    def _target_dir(self, path: Path) -> Path:
+        """Dossier GED de destination (classement automatique)"""
+        relative = path.parent.relative_to(self.source)
+        if relative.parts:
+            mirrored = self.root / relative
+            if mirrored.is_dir():
+                return mirrored
+        target = self.root / INGEST_TARGET
+        target.mkdir(parents=True, exist_ok=True)
+        return target
+
+    def _set_aside(self, path: Path, folder: str) -> None:
+        destination = self.source / folder
+        destination.mkdir(exist_ok=True)
+        target = destination / path.name
+        if target.exists():
+            target = destination / f"{path.stem}_{int(time.time())}{path.suffix}"
+        shutil.move(str(path), str(target))
+
+    def _acquire_leadership(self) -> bool:
+        lock_path = self.root / ".ged_store" / "ingest.lock"
+        lock_path.parent.mkdir(parents=True, exist_ok=True)
+        fd = os.open(lock_path, os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            os.close(fd)
+            return False
+        self._lock_fd = fd
+        return True
@@ -0,0 +1,152 @@
+"""
+Fiches d'éléments pour Ma GED Perso
+Représentation compacte (__slots__) des fichiers et dossiers, mise en cache par chemin et invalidée par mtime
+"""
+
+from collections import OrderedDict
+from datetime import datetime
+from pathlib import Path
+from typing import Callable, List, Optional
+import mimetypes
+import os
+import stat as stat_module
+import threading
+
+# Configuration
+MAX_RECORDS = 50_000  # Fiches gardées en mémoire (les moins récemment servies sont oubliées)
+
+
+class ItemRecord:
+    """
+    Fiche figée d'un fichier ou dossier : tout ce que `path_to_item` expose,
+    sauf les étiquettes (qui changent sans toucher au disque).
+    Les dates ISO et le type MIME sont calculés une seule fois.
+    """
+
+    __slots__ = (
+        "id", "name", "type", "path", "created_at", "modified_at",
+        "size", "extension", "mime_type", "children_count", "signature",
+    )
+
+    def __init__(self, item_id: str, name: str, item_type: str, path: str, stat: os.stat_result,
+                 children_count: Optional[int] = None):
+        self.id = item_id
+        self.name = name
+        self.type = item_type
+        self.path = path
+        self.created_at = datetime.fromtimestamp(stat.st_ctime).isoformat()
+        self.modified_at = datetime.fromtimestamp(stat.st_mtime).isoformat()
+        self.children_count = children_count
+        if children_count is None:
+            suffix = os.path.splitext(name)[1]
+            self.size = stat.st_size
+            self.extension = suffix[1:] if suffix else None
+            self.mime_type = mimetypes.guess_type(name)[0]
+        else:
+            self.size = self.extension = self.mime_type = None
+        self.signature = _signature(stat)
+
+    @property
+    def is_file(self) -> bool:
+        return self.children_count is None
+
+    def to_dict(self, item_type: Optional[str] = None, tags: Optional[List[str]] = None) -> dict:
+        """Objet item de l'API (même forme que l'historique `path_to_item`)"""
+        item = {
+            "id": self.id,
+            "name": self.name,
+            "type": item_type or self.type,
+            "path": self.path,
+            "created_at": self.created_at,
+            "modified_at": self.modified_at,
+        }
+        if self.children_count is None:
+            item["size"] = self.size
+            item["extension"] = self.extension
+            item["mime_type"] = self.mime_type
+            item["tags"] = list(tags or [])
+        else:
+            item["children_count"] = self.children_count
+        return item
+
+
+def _signature(stat: os.stat_result) -> tuple:
+    # L'inode distingue un fichier recréé au même chemin ; la mtime d'un
+    # dossier change à chaque ajout, suppression ou renommage d'un enfant
+    return (stat.st_ino, stat.st_mtime_ns, stat.st_ctime_ns, stat.st_size)
+
+
+class ItemRecordCache:
+    """
+    Cache LRU des fiches par chemin.
+
+    Une fiche est resservie tant que la signature `stat()` du chemin est
+    inchangée : lister un dossier déjà vu coûte un `stat()` par entrée, sans
+    recherche d'ID, `relative_to`, conversion de dates ni `iterdir()` des sous-dossiers.
+
+    Un élément pas encore enregistré (`lookup_id` retourne None) reçoit
+    l'ID provisoire de `provisional_id` ; sa fiche n'est pas gardée, pour
+    servir l'ID stable dès qu'il existe.
+    """
+
+    def __init__(self, root: Path, lookup_id: Callable[[Path], Optional[str]],
+                 provisional_id: Callable[[Path], str],
+                 item_type: Callable[[Path, int], str], is_hidden: Callable[[str], bool],
+                 max_records: int = MAX_RECORDS):
+        self.root = root
+        self.lookup_id = lookup_id
+        self.provisional_id = provisional_id
+        self.item_type = item_type
+        self.is_hidden = is_hidden
+        self.max_records = max_records
+        self._records: "OrderedDict[str, ItemRecord]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, path: Path, stat: Optional[os.stat_result] = None) -> ItemRecord:
+        """
+        Fiche d'un chemin, recalculée s'il a changé.
+
+        Args:
+            path: Fichier ou dossier existant
+            stat: Résultat de `stat()` déjà connu (ex: `os.DirEntry.stat()`)
+
+        Raises:
+            FileNotFoundError: Si le chemin n'existe plus
+        """
+        if stat is None:
+            stat = path.stat()
+        key = str(path)
+        with self._lock:
+            record = self._records.get(key)
+            if record is not None and record.signature == _signature(stat):
+                self._records.move_to_end(key)
+                return record
+
+        item_id = self.lookup_id(path)
+        if item_id is None:
+            return self._build(path, stat, self.provisional_id(path))
+        record = self._build(path, stat, item_id)
+        with self._lock:
+            self._records[key] = record
+            self._records.move_to_end(key)
+            while len(self._records) > self.max_records:
+                self._records.popitem(last=False)
+        return record
+
+    def _build(self, path: Path, stat: os.stat_result, item_id: str) -> ItemRecord:
+        relative = path.relative_to(self.root)
+        children_count = None
+        if stat_module.S_ISDIR(stat.st_mode):
+            try:
+                with os.scandir(path) as entries:
+                    children_count = sum(1 for e in entries if not self.is_hidden(e.name))
+            except PermissionError:
+                children_count = 0
+        return ItemRecord(
+            item_id,
+            path.name,
+            self.item_type(path, len(relative.parts) - 1),
+            str(relative),
+            stat,
+            children_count,
+        )
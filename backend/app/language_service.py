@@ -0,0 +1,86 @@
+"""
+Détection de langue pour Ma GED Perso
+Choix des modèles Tesseract par document, d'après les mots outils du texte natif ou d'un OCR basse résolution
+"""
+
+from typing import Dict, FrozenSet, Iterable, List, Optional
+import re
+import unicodedata
+
+# Configuration
+MIN_HITS = 5  # Mots outils reconnus en dessous desquels on ne conclut pas
+SECONDARY_SHARE = 0.2  # Part minimale des indices pour garder une seconde langue
+MAX_SAMPLE_CHARS = 20_000  # Texte analysé (le début du document suffit)
+
+# Mots outils fréquents (minuscules, sans accents), par code de langue Tesseract
+STOPWORDS: Dict[str, FrozenSet[str]] = {
+    "fra": frozenset(
+        "le la les des du de et est un une pour dans par sur avec au aux ce cette ces qui que "
+        "ne pas sont vous nous votre vos il elle ils leur mais ou donc sera etre avez".split()
+    ),
+    "eng": frozenset(
+        "the and of to in is for on with by this that are be from at as your you it or not "
+        "have has was will an our we please any which".split()
+    ),
+    "deu": frozenset(
+        "der die das und ist nicht ein eine einer den dem des mit von zu auf fur sich im sie "
+        "wir ihr ihre bei oder auch werden wird nach aus zum zur uber".split()
+    ),
+    "spa": frozenset(
+        "el la los las del de y en que por con para una es su sus al lo como mas se este esta "
+        "pero usted le no fue han".split()
+    ),
+}
+
+TOKEN_RE = re.compile(r"[a-z]+")
+
+
+def _tokens(text: str) -> List[str]:
+    text = unicodedata.normalize("NFKD", text[:MAX_SAMPLE_CHARS].lower())
+    return TOKEN_RE.findall("".join(c for c in text if not unicodedata.combining(c)))
+
+
+def _exclusive_words(candidates: Iterable[str]) -> Dict[str, FrozenSet[str]]:
+    """Mots outils propres à chaque candidate ("de", "la"... ne départagent pas français et espagnol)"""
+    candidates = [c for c in candidates if c in STOPWORDS]
+    exclusive = {}
+    for lang in candidates:
+        others = set().union(*(STOPWORDS[o] for o in candidates if o != lang))
+        exclusive[lang] = STOPWORDS[lang] - others
+    return exclusive
+
+
+def detect_languages(text: str, candidates: List[str]) -> Optional[List[str]]:
+    """
+    Retourne le plus petit ensemble de langues expliquant le texte.
+
+    Chaque langue candidate marque un point par mot outil qui lui est propre ;
+    la langue dominante est toujours gardée, une autre seulement si elle
+    représente au moins SECONDARY_SHARE des points (document bilingue).
+
+    Args:
+        text: Texte natif ou OCR rapide de la première page
+        candidates: Codes Tesseract envisagés, par ordre de préférence
+
+    Returns:
+        Langues retenues (dans l'ordre des candidates), ou None si le texte
+        est trop pauvre pour conclure
+    """
+    exclusive = _exclusive_words(candidates)
+    if len(exclusive) < 2:
+        return list(exclusive) or None
+
+    hits = dict.fromkeys(exclusive, 0)
+    for token in _tokens(text):
+        for lang, words in exclusive.items():
+            if token in words:
+                hits[lang] += 1
+    total = sum(hits.values())
+    if total < MIN_HITS:
+        return None
+
+    best = max(hits.values())
+    return [
+        lang for lang in exclusive
+        if hits[lang] == best or hits[lang] >= SECONDARY_SHARE * total
+    ]
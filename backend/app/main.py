@@ -3,26 +3,69 @@ Ma GED Perso - API FastAPI
 API pour la gestion électronique de documents sur Synology NAS
 """
 
-from fastapi import FastAPI, HTTPException, UploadFile, File, Query
+from fastapi import FastAPI, HTTPException, UploadFile, File, Query, Request
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import FileResponse, StreamingResponse
+from fastapi.responses import FileResponse, StreamingResponse, ORJSONResponse
 from pydantic import BaseModel
 from pathlib import Path
-from datetime import datetime
-from typing import Optional, List
+from datetime import datetime, date
+from typing import Iterable, Iterator, Optional, List
+import asyncio
 import base64
-import json
+import errno
+import hashlib
 import mimetypes
+from itertools import islice
 from urllib.parse import quote
 import shutil
+import tempfile
+import threading
+import time
 import os
 
+import orjson
+
 # Import du service OCR (module sibling)
-from .ocr_service import extract_text, is_ocr_supported
+from .ocr_service import extract_text, is_ocr_supported, WORD_BOX_SCALE
+from .text_store import TextStore, TEXT_STORE_DIR
+from .content_index import ContentIndex
+from .metadata_store import MetadataStore, MetadataTransaction
+from .id_registry import IdRegistry
+from .dedup_service import HashIndex, compute_hashes, NEAR_DUPLICATE_DISTANCE
+from .ingest_service import IngestPipeline, INGEST_DIR, INGEST_TARGET
+from .text_features import Vocabulary
+from .classifier_service import DocumentClassifier
+from .similarity_service import SimilarityIndex
+from .export_service import stream_zip
+from .page_cache import PageCache, PageNotFound, PAGE_CACHE_DIR, PAGE_FORMATS, DEFAULT_DPI
+from .ocr_scheduler import OcrScheduler, TrafficMeter, PRIORITY_UPLOAD, PRIORITY_MANUAL
+from .index_snapshot import SnapshotManager, SNAPSHOT_DIR
+from .field_service import FieldIndex, extract_fields
+from .facet_service import FacetSet, SearchCache
+from .item_records import ItemRecordCache
+from .folder_stats import FolderStats
+from .change_feed import ChangeFeed, CHANGES_FILE
+from .fs_jobs import JobManager
 
 # Configuration
 GED_ROOT = Path(os.environ.get("GED_ROOT", "/volume1/GED"))
 METADATA_FILE = ".ged_metadata.json"
+UPLOAD_TMP_DIR = ".ged_store/tmp"  # Uploads en cours (même volume que GED_ROOT)
+UPLOAD_CHUNK_SIZE = 1024 * 1024
+EXPORT_EXCERPT_CHARS = 300  # Longueur de l'extrait OCR dans index.csv
+SNAPSHOT_INTERVAL = 600  # Secondes entre deux instantanés des index (si modifiés)
+MODEL_REFRESH_INTERVAL = 30  # Secondes entre deux mises à jour des modèles textuels (si métadonnées modifiées)
+ID_REGISTER_DELAY = 2.0  # Secondes de regroupement des chemins vus sans ID par les lectures
+SEARCH_LIMIT = 100  # Résultats retournés par recherche
+RETAIN_CHANGES_PAGE = 5000  # Événements maximum par appel à /api/changes
+SSE_POLL_INTERVAL = 1.0  # Secondes entre deux lectures du journal des changements (flux SSE)
+SSE_HEARTBEAT = 15.0  # Secondes sans événement avant un commentaire de maintien
+
+# Textes OCR compressés, hors du fichier de métadonnées
+text_store = TextStore(GED_ROOT / TEXT_STORE_DIR)
+
+# Pages extraites pour la prévisualisation des gros documents
+page_cache = PageCache(GED_ROOT / PAGE_CACHE_DIR)
 
 # Application FastAPI
 app = FastAPI(
@@ -38,8 +81,20 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    # Lecture partielle des PDFs (Range) et pagination côté visionneuse
+    expose_headers=["Accept-Ranges", "Content-Range", "Content-Length", "X-Page-Count"],
 )
 
+# Trafic interactif, mesuré pour suspendre l'OCR de rattrapage
+api_traffic = TrafficMeter()
+UNMETERED_PATHS = ("/health", "/api/ocr/scheduler", "/api/ingest/status", "/api/jobs")
+
+@app.middleware("http")
+async def meter_traffic(request: Request, call_next):
+    if not request.url.path.startswith(UNMETERED_PATHS):
+        api_traffic.hit()
+    return await call_next(request)
+
 # ============== MODÈLES ==============
 
 class CreateFolderRequest(BaseModel):
@@ -58,10 +113,14 @@ class TagRequest(BaseModel):
 class SetTagsRequest(BaseModel):
     tags: List[str]
 
+class SuggestRequest(BaseModel):
+    ids: List[str]
+    limit: int = 3
+
 # ============== HELPERS ==============
 
 # Fichiers/dossiers à ignorer
-HIDDEN_PATTERNS = ['@eaDir', '#recycle', '.DS_Store', 'Thumbs.db', '@tmp', '#snapshot', '.ged_metadata.json']
+HIDDEN_PATTERNS = ['@eaDir', '#recycle', '.DS_Store', 'Thumbs.db', '@tmp', '#snapshot', '.ged_metadata.json', '.ged_store']
 
 def is_hidden(name: str) -> bool:
     """Vérifie si un fichier/dossier doit être caché"""
@@ -69,18 +128,48 @@ def is_hidden(name: str) -> bool:
     return any(name_lower == p.lower() or name_lower.startswith(p.lower()) for p in HIDDEN_PATTERNS)
 
 def encode_id(path: Path) -> str:
-    """Encode un chemin en ID base64"""
-    relative = path.relative_to(GED_ROOT)
-    return base64.b64encode(str(relative).encode('utf-8')).decode('utf-8')
+    """Retourne l'ID stable d'un chemin (enregistré à la première rencontre, dans une transaction)"""
+    return id_registry.id_for_path(path)
+
+def read_id(path: Path) -> str:
+    """
+    ID d'un chemin pour les requêtes de lecture, sans transaction : un chemin
+    pas encore enregistré reçoit son ancien ID base64 (alias accepté par
+    `decode_id`) et sera enregistré en tâche de fond.
+    """
+    return id_registry.peek(path) or encode_legacy_id(path)
+
+def encode_legacy_id(path: Path) -> str:
+    """Ancien ID base64 (chemin relatif) d'un chemin"""
+    return base64.b64encode(str(path.relative_to(GED_ROOT)).encode('utf-8')).decode('ascii')
+
+def decode_legacy_id(item_id: str) -> Path:
+    """Décode un ancien ID base64 (chemin relatif) en chemin"""
+    relative = base64.b64decode(item_id).decode('utf-8')
+    return GED_ROOT / relative
 
 def decode_id(item_id: str) -> Path:
-    """Décode un ID base64 en chemin"""
+    """Décode un ID en chemin (les anciens IDs base64 restent acceptés comme alias)"""
+    path = id_registry.path_for_id(item_id)
+    if path is not None:
+        return path
     try:
-        relative = base64.b64decode(item_id).decode('utf-8')
-        return GED_ROOT / relative
+        return decode_legacy_id(item_id)
     except Exception as e:
         raise HTTPException(status_code=400, detail=f"ID invalide: {str(e)}")
 
+def canonical_id(item_id: str) -> str:
+    """Convertit un alias base64 en ID stable (si l'élément existe et est déjà enregistré)"""
+    if id_registry.knows(item_id):
+        return item_id
+    try:
+        path = decode_legacy_id(item_id)
+    except Exception:
+        return item_id
+    if path != GED_ROOT and path.exists():
+        return id_registry.peek(path) or item_id
+    return item_id
+
 def get_item_type(path: Path, depth: int = 0) -> str:
     """Détermine le type d'un élément selon sa profondeur"""
     if path.is_file():
@@ -93,61 +182,126 @@ def get_depth(path: Path) -> int:
     """Calcule la profondeur d'un chemin par rapport à GED_ROOT"""
     return len(path.relative_to(GED_ROOT).parts)
 
-def path_to_item(path: Path, item_type: str = None) -> dict:
-    """Convertit un chemin en objet item"""
-    stat = path.stat()
-    depth = get_depth(path)
-    
-    if item_type is None:
-        item_type = get_item_type(path, depth - 1)
-    
-    item = {
-        "id": encode_id(path),
-        "name": path.name,
-        "type": item_type,
-        "path": str(path.relative_to(GED_ROOT)),
-        "created_at": datetime.fromtimestamp(stat.st_ctime).isoformat(),
-        "modified_at": datetime.fromtimestamp(stat.st_mtime).isoformat(),
-    }
-    
-    if path.is_file():
-        item["size"] = stat.st_size
-        item["extension"] = path.suffix[1:] if path.suffix else None
-        item["mime_type"] = mimetypes.guess_type(str(path))[0]
-        # Ajouter les tags
-        item["tags"] = get_item_tags_internal(encode_id(path))
-    else:
-        # Compter les enfants (sans les cachés)
-        try:
-            children = [c for c in path.iterdir() if not is_hidden(c.name)]
-            item["children_count"] = len(children)
-        except PermissionError:
-            item["children_count"] = 0
-    
+def find_documents(path: Path) -> List[Path]:
+    """Trouve récursivement tous les documents"""
+    return list(iter_documents(path))
+
+def iter_documents(path: Path) -> Iterator[Path]:
+    """Parcourt paresseusement les documents, dans l'ordre des chemins"""
+    try:
+        items = sorted(path.iterdir())
+    except PermissionError:
+        return
+    for item in items:
+        if is_hidden(item.name):
+            continue
+        if item.is_file():
+            yield item
+        elif item.is_dir():
+            yield from iter_documents(item)
+
+def unique_path(parent_path: Path, filename: str) -> Path:
+    """Retourne un chemin libre dans le dossier (suffixe _1, _2... si le nom existe)"""
+    file_path = parent_path / filename
+    counter = 1
+    original_stem = file_path.stem
+    while file_path.exists():
+        file_path = parent_path / f"{original_stem}_{counter}{file_path.suffix}"
+        counter += 1
+    return file_path
+
+def path_to_item(path: Path, item_type: str = None, item_tags: Optional[dict] = None,
+                 stat: Optional[os.stat_result] = None) -> dict:
+    """
+    Convertit un chemin en objet item.
+    La fiche (dates ISO, type MIME, nombre d'enfants...) vient du cache tant que le chemin n'a pas changé ;
+    `item_tags` évite de relire les métadonnées pour chaque élément d'une liste.
+    """
+    record = item_records.get(path, stat)
+    tags = None
+    if record.is_file:
+        if item_tags is None:
+            item_tags = load_metadata().get("item_tags", {})
+        tags = item_tags.get(record.id)
+    item = record.to_dict(item_type, tags)
+    if not record.is_file:
+        # Taille et nombre de documents du sous-arbre, sans le parcourir
+        item.update(folder_stats.summary(record.id, path, record.signature[1]))
     return item
 
+def paths_to_items(paths: List[Path], item_type: str = None) -> List[dict]:
+    """Convertit une liste de chemins (métadonnées lues une seule fois)"""
+    item_tags = load_metadata().get("item_tags", {})
+    return [path_to_item(p, item_type, item_tags) for p in paths]
+
 # ============== MÉTADONNÉES (Tags + Favoris) ==============
 
 def get_metadata_path() -> Path:
     """Retourne le chemin du fichier de métadonnées"""
     return GED_ROOT / METADATA_FILE
 
-def load_metadata() -> dict:
-    """Charge les métadonnées depuis le fichier JSON"""
-    metadata_path = get_metadata_path()
-    if metadata_path.exists():
-        try:
-            with open(metadata_path, 'r', encoding='utf-8') as f:
-                return json.load(f)
-        except (json.JSONDecodeError, IOError):
-            pass
-    return {"tags": {}, "item_tags": {}, "favorites": []}
+# Instantané + journal partagé entre workers uvicorn
+metadata_store = MetadataStore(get_metadata_path())
+
+# IDs stables, stockés dans la section "ids" des métadonnées
+id_registry = IdRegistry(metadata_store, GED_ROOT)
+
+# Empreintes SHA-256 / perceptuelles, section "hashes"
+hash_index = HashIndex(metadata_store)
 
-def save_metadata(metadata: dict) -> None:
-    """Sauvegarde les métadonnées dans le fichier JSON"""
-    metadata_path = get_metadata_path()
-    with open(metadata_path, 'w', encoding='utf-8') as f:
-        json.dump(metadata, f, indent=2, ensure_ascii=False)
+# Fiches des fichiers et dossiers, invalidées par mtime
+item_records = ItemRecordCache(GED_ROOT, id_registry.peek, encode_legacy_id, get_item_type, is_hidden)
+
+# Taille, documents et dernière modification cumulés par dossier, section "folder_stats"
+folder_stats = FolderStats(metadata_store, GED_ROOT, id_registry.id_for_path, id_registry.lookup,
+                           id_registry.children, is_hidden)
+
+# Vocabulaire partagé par les modèles textuels
+vocabulary = Vocabulary()
+
+# Suggestions de classement (le dossier d'import ne sert pas d'exemple)
+classifier = DocumentClassifier(
+    metadata_store,
+    vocabulary,
+    lambda entry: load_ocr_entry_text(entry),
+    lambda folder_id: id_registry.path_for_id(folder_id) == GED_ROOT / INGEST_TARGET
+)
+
+# Index TF-IDF pour « documents similaires »
+similarity_index = SimilarityIndex(metadata_store, vocabulary, lambda entry: load_ocr_entry_text(entry))
+
+# Signatures de trigrammes : la recherche ne décompresse que les textes pouvant correspondre
+content_index = ContentIndex(metadata_store, lambda entry: load_ocr_entry_text(entry))
+
+# Instantané binaire des index textuels, projeté en mémoire au démarrage
+index_snapshots = SnapshotManager(
+    GED_ROOT / SNAPSHOT_DIR / "text.idx",
+    "text",
+    {"vocabulary": vocabulary, "classifier": classifier, "similarity": similarity_index, "content": content_index}
+)
+
+# Champs structurés (dates, montants, IBAN, SIRET) extraits du texte OCR
+field_index = FieldIndex(metadata_store)
+
+# Journal des changements (synchronisation incrémentale des clients)
+change_feed = ChangeFeed(GED_ROOT / CHANGES_FILE)
+
+# Candidats des dernières recherches, pour l'exploration par facettes
+search_cache = SearchCache()
+
+# Suppressions et déplacements entre volumes exécutés en tâche de fond
+fs_jobs = JobManager(GED_ROOT)
+
+# Sections des métadonnées indexées par ID d'élément
+ITEM_SECTIONS = ("item_tags", "ocr_text", "ocr_status", "hashes", "fields", "folder_stats")
+
+def load_metadata() -> dict:
+    """
+    Retourne la vue courante des métadonnées (instantané en lecture seule,
+    parcourable sans verrou pendant que les tâches de fond écrivent).
+    Toute modification passe par `metadata_store.transaction()`.
+    """
+    return metadata_store.view()
 
 def get_item_tags_internal(item_id: str) -> List[str]:
     """Récupère les tags d'un élément (fonction interne)"""
@@ -157,28 +311,197 @@ def get_item_tags_internal(item_id: str) -> List[str]:
 def get_favorites_from_metadata() -> List[str]:
     """Récupère la liste des IDs favoris"""
     metadata = load_metadata()
-    return metadata.get('favorites', [])
+    return list(metadata.get('favorites', []))
 
-def save_favorites_to_metadata(favorites: List[str]) -> None:
-    """Sauvegarde la liste des IDs favoris"""
-    metadata = load_metadata()
-    metadata['favorites'] = favorites
-    save_metadata(metadata)
+def record_change(kind: str, item_id: Optional[str], path: Optional[Path] = None, **data) -> Optional[int]:
+    """
+    Ajoute un événement au journal des changements.
+    Un échec d'écriture est signalé sans annuler l'opération déjà faite.
+    """
+    if path is not None:
+        data["path"] = str(path.relative_to(GED_ROOT))
+        data["parent"] = id_registry.lookup(path.parent) if path.parent != GED_ROOT else None
+    try:
+        return change_feed.record(kind, item_id, **data)
+    except OSError as e:
+        print(f"Journal des changements indisponible: {e}")
+        return None
+
+def add_favorite_to_metadata(item_id: str) -> bool:
+    """
+    Ajoute un ID aux favoris (lecture et écriture dans la même transaction :
+    un ajout simultané d'un autre worker n'est pas perdu).
+
+    Returns:
+        True si l'ID n'était pas déjà favori
+    """
+    with metadata_store.transaction() as txn:
+        favorites = txn.data.get('favorites', [])
+        if item_id in favorites:
+            return False
+        txn.replace('favorites', [*favorites, item_id])
+        return True
+
+def remove_favorites_from_metadata(item_ids: Iterable[str]) -> bool:
+    """
+    Retire des IDs des favoris, dans une seule transaction.
+
+    Returns:
+        True si au moins un ID a été retiré
+    """
+    removed = set(item_ids)
+    with metadata_store.transaction() as txn:
+        favorites = txn.data.get('favorites', [])
+        if not removed.intersection(favorites):
+            return False
+        txn.replace('favorites', [f for f in favorites if f not in removed])
+        return True
 
 # ============== MÉTADONNÉES OCR ==============
 
 def save_ocr_text(item_id: str, ocr_result: dict) -> None:
-    """Sauvegarde le résultat d'extraction OCR pour un élément"""
+    """
+    Sauvegarde le résultat d'extraction OCR pour un élément.
+    Le texte part dans le magasin de blobs, les métadonnées n'en gardent que la référence.
+    """
+    entry = to_ocr_entry(ocr_result)
+    fields = extract_fields(ocr_result.get("text") or "")
+
+    with metadata_store.transaction() as txn:
+        if not ocr_blobs_exist(entry):
+            # Blob identique libéré entre-temps par une autre transaction
+            entry = to_ocr_entry(ocr_result)
+        previous = txn.data.get("ocr_text", {}).get(item_id)
+        txn.set("ocr_text", item_id, entry)
+        txn.set("ocr_status", item_id, "completed")
+        txn.set("fields", item_id, fields)
+        if previous:
+            release_ocr_blobs(txn, [previous])
+    record_change("ocr", item_id, status="completed")
+
+
+def to_ocr_entry(ocr_result: dict) -> dict:
+    """
+    Remplace le texte d'un résultat OCR par une référence vers le magasin de blobs.
+    Les boîtes des mots (même passe OCR) y sont rangées de la même façon, en JSON par colonnes.
+    """
+    entry = {k: v for k, v in ocr_result.items() if k not in ("text", "words")}
+    text = ocr_result.get("text") or ""
+    entry["text_ref"] = text_store.put(text)
+    entry["text_length"] = len(text)
+    words = ocr_result.get("words")
+    if words:
+        entry["words_ref"] = text_store.put(orjson.dumps(words).decode("utf-8"))
+    return entry
+
+
+def load_ocr_entry_words(entry: dict) -> Optional[List[dict]]:
+    """Charge les boîtes des mots d'une entrée OCR (None si l'OCR est antérieur à leur capture)"""
+    ref = entry.get("words_ref")
+    if not ref:
+        return None
+    data = text_store.get(ref)
+    return orjson.loads(data) if data else None
+
+
+def load_ocr_entry_text(entry: dict) -> str:
+    """Charge paresseusement le texte d'une entrée OCR (ou le texte inline historique)"""
+    if "text" in entry:
+        return entry["text"] or ""
+    ref = entry.get("text_ref")
+    if not ref:
+        return ""
+    return text_store.get(ref) or ""
+
+
+OCR_BLOB_KEYS = ("text_ref", "words_ref")
+
+def ocr_blobs_exist(entry: dict) -> bool:
+    """Vérifie que les blobs d'une entrée OCR sont présents (fiable sous transaction)"""
+    return all(text_store.exists(entry[k]) for k in OCR_BLOB_KEYS if entry.get(k))
+
+def release_ocr_blobs(txn: MetadataTransaction, entries: List[dict]) -> None:
+    """
+    Supprime les blobs d'entrées OCR retirées s'ils ne sont plus référencés.
+    La suppression n'a lieu qu'une fois la transaction journalisée : un arrêt
+    ou un échec d'écriture ne laisse jamais de référence vers un blob effacé.
+    """
+    refs = {e.get(k) for e in entries for k in OCR_BLOB_KEYS} - {None}
+    if not refs:
+        return
+
+    def delete_unused(metadata: dict) -> None:
+        still_used = {e.get(k) for e in metadata.get("ocr_text", {}).values() for k in OCR_BLOB_KEYS}
+        for ref in refs - still_used:
+            text_store.delete(ref)
+
+    txn.after_commit(delete_unused)
+
+
+def migrate_inline_ocr_text() -> int:
+    """Déplace les textes OCR encore stockés dans le fichier de métadonnées vers le magasin de blobs"""
+    with metadata_store.transaction() as txn:
+        inline = [(k, e) for k, e in txn.data.get("ocr_text", {}).items() if "text" in e]
+        for item_id, entry in inline:
+            txn.set("ocr_text", item_id, to_ocr_entry(entry))
+    return len(inline)
+
+
+def migrate_legacy_ids() -> int:
+    """Réindexe par ID stable les métadonnées encore indexées par d'anciens IDs base64"""
     metadata = load_metadata()
+    keys = set(metadata.get("favorites", []))
+    for section in ITEM_SECTIONS:
+        keys.update(metadata.get(section, {}))
+    legacy = [k for k in keys if not id_registry.knows(k)]
+    if not legacy:
+        return 0
+
+    with metadata_store.transaction() as txn:
+        mapping = {}
+        for old_id in legacy:
+            try:
+                path = decode_legacy_id(old_id)
+            except Exception:
+                continue
+            if path != GED_ROOT and path.exists():
+                mapping[old_id] = id_registry.id_for_path(path, txn)
 
-    if "ocr_text" not in metadata:
-        metadata["ocr_text"] = {}
-    if "ocr_status" not in metadata:
-        metadata["ocr_status"] = {}
+        for section in ITEM_SECTIONS:
+            for old_id, new_id in mapping.items():
+                if old_id in txn.data.get(section, {}):
+                    value = txn.data[section][old_id]
+                    txn.delete(section, old_id)
+                    txn.set(section, new_id, value)
 
-    metadata["ocr_text"][item_id] = ocr_result
-    metadata["ocr_status"][item_id] = "completed"
-    save_metadata(metadata)
+        favorites = txn.data.get("favorites", [])
+        if any(f in mapping for f in favorites):
+            txn.replace("favorites", [mapping.get(f, f) for f in favorites])
+
+    return len(mapping)
+
+
+# Migrations ponctuelles du stockage : (nom, fonction, message de fin)
+MIGRATIONS = (
+    ("inline_ocr_text", migrate_inline_ocr_text, f"{{}} textes OCR migrés vers {TEXT_STORE_DIR}"),
+    ("legacy_ids", migrate_legacy_ids, "{} anciens IDs base64 convertis en IDs stables"),
+)
+
+
+def run_migrations() -> None:
+    """
+    Exécute les migrations pas encore faites, puis les note dans la section
+    "migrations" : un démarrage normal ne reparcourt pas les métadonnées.
+    """
+    done = load_metadata().get("migrations", {})
+    for name, migrate, message in MIGRATIONS:
+        if name in done:
+            continue
+        migrated = migrate()
+        if migrated:
+            print(message.format(migrated))
+        with metadata_store.transaction() as txn:
+            txn.set("migrations", name, datetime.now().isoformat())
 
 
 def get_ocr_text(item_id: str) -> Optional[str]:
@@ -186,45 +509,198 @@ def get_ocr_text(item_id: str) -> Optional[str]:
     metadata = load_metadata()
     ocr_data = metadata.get("ocr_text", {}).get(item_id)
     if ocr_data:
-        return ocr_data.get("text", "")
+        return load_ocr_entry_text(ocr_data)
     return None
 
 
 def set_ocr_status(item_id: str, status: str) -> None:
     """Définit le statut de traitement OCR d'un élément"""
-    metadata = load_metadata()
-    if "ocr_status" not in metadata:
-        metadata["ocr_status"] = {}
-    metadata["ocr_status"][item_id] = status
-    save_metadata(metadata)
+    with metadata_store.transaction() as txn:
+        txn.set("ocr_status", item_id, status)
+    record_change("ocr", item_id, status=status)
 
 
 def delete_ocr_text(item_id: str) -> None:
     """Supprime les données OCR d'un élément"""
+    with metadata_store.transaction() as txn:
+        entry = txn.data.get("ocr_text", {}).get(item_id)
+        txn.delete("ocr_text", item_id)
+        txn.delete("ocr_status", item_id)
+        txn.delete("fields", item_id)
+        if entry:
+            release_ocr_blobs(txn, [entry])
+
+def backfill_fields(progress=None) -> int:
+    """Extrait les champs structurés des textes OCR antérieurs à leur indexation"""
     metadata = load_metadata()
-    modified = False
-
-    if item_id in metadata.get("ocr_text", {}):
-        del metadata["ocr_text"][item_id]
-        modified = True
-    if item_id in metadata.get("ocr_status", {}):
-        del metadata["ocr_status"][item_id]
-        modified = True
+    known = metadata.get("fields", {})
+    missing = [(k, e) for k, e in metadata.get("ocr_text", {}).items() if k not in known]
+    for done, (item_id, entry) in enumerate(missing, 1):
+        fields = extract_fields(load_ocr_entry_text(entry))
+        with metadata_store.transaction() as txn:
+            if item_id in txn.data.get("ocr_text", {}):
+                txn.set("fields", item_id, fields)
+        if progress:
+            progress(done, len(missing))
+    return len(missing)
+
+def run_ocr_job(item_id: str) -> None:
+    """Tâche de l'ordonnanceur : OCR d'un document (ignoré s'il a disparu entre-temps)"""
+    path = id_registry.path_for_id(item_id)
+    if path is None or not path.is_file():
+        return
+    try:
+        ocr_result = extract_text(path)
+        if ocr_result:
+            save_ocr_text(item_id, ocr_result)
+    except Exception:
+        set_ocr_status(item_id, "failed")
+        raise
+
+def find_ocr_backlog(limit: int) -> List[str]:
+    """Documents supportés jamais OCRisés (les échecs ne sont pas retentés automatiquement)"""
+    metadata = load_metadata()
+    ocr_text = metadata.get("ocr_text", {})
+    ocr_status = metadata.get("ocr_status", {})
+    ids = []
+    for doc_path in find_documents(GED_ROOT):
+        if not is_ocr_supported(doc_path):
+            continue
+        item_id = encode_id(doc_path)
+        if item_id in ocr_text or ocr_status.get(item_id) == "failed":
+            continue
+        ids.append(item_id)
+        if len(ids) >= limit:
+            break
+    return ids
 
-    if modified:
-        save_metadata(metadata)
+# Ordonnanceur OCR : uploads, indexation manuelle et rattrapage
+ocr_scheduler = OcrScheduler(GED_ROOT, run_ocr_job, find_ocr_backlog, api_traffic)
 
 # ============== ENDPOINTS HEALTH ==============
 
 @app.get("/health")
 async def health_check():
-    """Vérifie l'état de l'API"""
+    """Vérifie l'état de l'API (et l'avancement de la préparation des index)"""
     return {
         "status": "ok",
         "ged_root_exists": GED_ROOT.exists(),
-        "ged_root": str(GED_ROOT)
+        "ged_root": str(GED_ROOT),
+        "warmup": {**warmup, "snapshot": index_snapshots.status()}
     }
 
+# ============== ENDPOINTS SUGGESTIONS ==============
+# Déclarés avant /api/item/{item_id:path}, qui capturerait sinon le suffixe
+
+def format_suggestion(item_id: str, suggestion: dict) -> dict:
+    """Convertit une suggestion brute (IDs de dossiers) en réponse API"""
+    folders = []
+    for folder_id, score in suggestion["folders"]:
+        path = id_registry.path_for_id(folder_id)
+        if path is not None and path.is_dir():
+            folders.append({
+                "id": folder_id,
+                "name": path.name,
+                "type": get_item_type(path, get_depth(path) - 1),
+                "path": str(path.relative_to(GED_ROOT)),
+                "score": score
+            })
+    tags = [{"name": name, "score": score} for name, score in suggestion["tags"]]
+    return {"item_id": item_id, "folders": folders, "tags": tags}
+
+def require_text_indexes() -> None:
+    """Refuse (503) les requêtes des modèles textuels tant qu'aucun n'est construit ni restauré"""
+    if warmup["ready_at"] is None and index_snapshots.loaded is None:
+        raise HTTPException(status_code=503, detail="Index en cours de préparation, réessayer dans un instant")
+
+# Gestionnaires synchrones (pool de threads) : le calcul ne bloque pas la boucle d'événements
+
+@app.get("/api/item/{item_id:path}/suggest")
+def suggest_for_item(item_id: str, limit: int = Query(default=3, ge=1, le=20)):
+    """Propose des dossiers de destination et des étiquettes d'après le texte OCR"""
+    require_text_indexes()
+    item_id = canonical_id(item_id)
+    text = get_ocr_text(item_id)
+    if text is None:
+        raise HTTPException(status_code=404, detail="Aucun texte OCR pour cet élément")
+    suggestion = classifier.suggest([text], limit)[0]
+    return format_suggestion(item_id, suggestion)
+
+@app.post("/api/suggest")
+def suggest_batch(request: SuggestRequest):
+    """Classe un lot de documents en une seule passe (ex: tout le dossier d'import)"""
+    require_text_indexes()
+    ids = [canonical_id(i) for i in request.ids]
+    texts = [get_ocr_text(i) or "" for i in ids]
+    suggestions = classifier.suggest(texts, max(1, min(request.limit, 20)))
+    return [format_suggestion(i, s) for i, s in zip(ids, suggestions)]
+
+@app.get("/api/suggest/stats")
+async def get_suggest_stats():
+    """Taille du modèle de classement"""
+    return classifier.stats()
+
+@app.get("/api/item/{item_id:path}/similar")
+def get_similar_items(item_id: str, limit: int = Query(default=10, ge=1, le=50)):
+    """Documents au contenu le plus proche (similarité cosinus TF-IDF du texte OCR)"""
+    require_text_indexes()
+    item_id = canonical_id(item_id)
+    if get_ocr_text(item_id) is None:
+        raise HTTPException(status_code=404, detail="Aucun texte OCR pour cet élément")
+    results = []
+    for similar_id, score in similarity_index.similar(item_id, limit * 2):
+        path = id_registry.path_for_id(similar_id)
+        if path is None or not path.is_file():
+            continue
+        item = path_to_item(path)
+        item["score"] = score
+        results.append(item)
+        if len(results) >= limit:
+            break
+    return {"item_id": item_id, "items": results}
+
+@app.get("/api/item/{item_id:path}/fields")
+async def get_item_fields(item_id: str):
+    """Champs structurés extraits du texte OCR (dates, montants, IBAN, SIRET)"""
+    item_id = canonical_id(item_id)
+    fields = field_index.get(item_id)
+    if fields is None:
+        raise HTTPException(status_code=404, detail="Aucun champ extrait pour cet élément")
+    return {"item_id": item_id, **fields}
+
+@app.get("/api/item/{item_id:path}/words")
+async def get_item_words(
+    item_id: str,
+    page: int = Query(default=1, ge=1),
+    q: Optional[str] = Query(default=None, min_length=1, description="Ne garder que les mots contenant ce texte (surlignage)")
+):
+    """
+    Boîtes des mots d'une page, capturées lors de l'OCR (aucune nouvelle passe Tesseract).
+    Coordonnées relatives à la page (0 à 1, origine en haut à gauche), confiance de 0 à 100.
+    """
+    item_id = canonical_id(item_id)
+    entry = load_metadata().get("ocr_text", {}).get(item_id)
+    pages = load_ocr_entry_words(entry) if entry else None
+    if pages is None:
+        raise HTTPException(status_code=404, detail="Aucune position de mot pour cet élément (relancer l'OCR)")
+    if page > len(pages):
+        raise HTTPException(status_code=404, detail=f"Page {page} sans OCR ({len(pages)} pages traitées)")
+
+    columns = pages[page - 1]
+    needle = q.lower() if q else None
+    words = [
+        {"text": t, "x": x / WORD_BOX_SCALE, "y": y / WORD_BOX_SCALE,
+         "w": w / WORD_BOX_SCALE, "h": h / WORD_BOX_SCALE, "conf": c}
+        for x, y, w, h, c, t in zip(columns["x"], columns["y"], columns["w"], columns["h"], columns["c"], columns["t"])
+        if needle is None or needle in t.lower()
+    ]
+    return ORJSONResponse({"item_id": item_id, "page": page, "page_count": len(pages), "words": words})
+
+@app.get("/api/similar/stats")
+async def get_similarity_stats():
+    """Taille des index de similarité et de recherche dans le contenu"""
+    return {**similarity_index.stats(), "content": content_index.stats()}
+
 # ============== ENDPOINTS NAVIGATION ==============
 
 @app.get("/api/armoires")
@@ -233,12 +709,9 @@ async def list_armoires():
     if not GED_ROOT.exists():
         raise HTTPException(status_code=500, detail="Répertoire GED non trouvé")
     
-    armoires = []
-    for item in sorted(GED_ROOT.iterdir(), key=lambda x: x.name.lower()):
-        if item.is_dir() and not is_hidden(item.name):
-            armoires.append(path_to_item(item, "armoire"))
-    
-    return armoires
+    dirs = [item for item in sorted(GED_ROOT.iterdir(), key=lambda x: x.name.lower())
+            if item.is_dir() and not is_hidden(item.name)]
+    return ORJSONResponse(paths_to_items(dirs, "armoire"))
 
 @app.get("/api/browse/{item_id:path}")
 async def browse(item_id: str):
@@ -251,14 +724,21 @@ async def browse(item_id: str):
     if not path.is_dir():
         raise HTTPException(status_code=400, detail="L'élément n'est pas un dossier")
     
+    # scandir : type de chaque entrée connu sans stat() supplémentaire pour le tri
+    with os.scandir(path) as it:
+        entries = sorted(
+            (e for e in it if not is_hidden(e.name)),
+            key=lambda e: (not e.is_dir(), e.name.lower())
+        )
+    item_tags = load_metadata().get("item_tags", {})
     items = []
-    depth = get_depth(path)
-    
-    for item in sorted(path.iterdir(), key=lambda x: (x.is_file(), x.name.lower())):
-        if not is_hidden(item.name):
-            items.append(path_to_item(item))
-    
-    return items
+    for entry in entries:
+        try:
+            items.append(path_to_item(Path(entry.path), item_tags=item_tags, stat=entry.stat()))
+        except FileNotFoundError:
+            continue  # Supprimé pendant le listage
+
+    return ORJSONResponse(items)
 
 @app.get("/api/item/{item_id:path}")
 async def get_item(item_id: str):
@@ -275,7 +755,7 @@ async def get_tree(max_depth: int = Query(default=4, ge=1, le=10)):
     """Récupère l'arborescence complète"""
     def build_tree(path: Path, current_depth: int = 0) -> dict:
         node = {
-            "id": encode_id(path),
+            "id": read_id(path),
             "name": path.name,
             "type": get_item_type(path, current_depth),
             "path": str(path.relative_to(GED_ROOT)),
@@ -310,7 +790,10 @@ async def create_armoire(request: CreateFolderRequest):
     
     try:
         new_path.mkdir(parents=True)
-        return path_to_item(new_path, "armoire")
+        encode_id(new_path)  # Enregistré tout de suite : l'ID retourné est déjà l'ID stable
+        item = path_to_item(new_path, "armoire")
+        record_change("create", item["id"], new_path, type=item["type"])
+        return item
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Erreur création: {str(e)}")
 
@@ -329,7 +812,11 @@ async def create_folder(parent_id: str, request: CreateFolderRequest):
     
     try:
         new_path.mkdir(parents=True)
-        return path_to_item(new_path)
+        encode_id(new_path)  # Enregistré tout de suite : l'ID retourné est déjà l'ID stable
+        folder_stats.refresh([parent_path])
+        item = path_to_item(new_path)
+        record_change("create", item["id"], new_path, type=item["type"])
+        return item
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Erreur création: {str(e)}")
 
@@ -347,24 +834,11 @@ async def rename_item(item_id: str, request: RenameRequest):
         raise HTTPException(status_code=400, detail="Un élément avec ce nom existe déjà")
     
     try:
-        # Mettre à jour les tags si c'est un fichier
-        if path.is_file():
-            old_id = encode_id(path)
-            metadata = load_metadata()
-            if old_id in metadata.get("item_tags", {}):
-                tags = metadata["item_tags"].pop(old_id)
-                path.rename(new_path)
-                new_id = encode_id(new_path)
-                metadata["item_tags"][new_id] = tags
-                # Mettre à jour les favoris aussi
-                if old_id in metadata.get("favorites", []):
-                    metadata["favorites"].remove(old_id)
-                    metadata["favorites"].append(new_id)
-                save_metadata(metadata)
-            else:
-                path.rename(new_path)
-        else:
-            path.rename(new_path)
+        # L'ID est stable : tags, favoris et OCR (descendants compris) suivent sans réindexation
+        item_id = encode_id(path)
+        path.rename(new_path)
+        id_registry.rename(item_id, new_path.name)
+        record_change("rename", item_id, new_path, name=new_path.name)
         
         return path_to_item(new_path)
     except Exception as e:
@@ -399,42 +873,45 @@ async def move_item(item_id: str, request: MoveRequest):
          raise HTTPException(status_code=400, detail="Un élément avec ce nom existe déjà dans la destination")
          
     try:
-        # Mettre à jour les tags si c'est un fichier
-        if path.is_file():
-            old_id = encode_id(path)
-            metadata = load_metadata()
-            
-            # Sauvegarder les métadonnées existantes
-            tags = metadata.get("item_tags", {}).get(old_id)
-            is_fav = old_id in metadata.get("favorites", [])
-            
-            # Déplacer physiquement
-            shutil.move(str(path), str(new_path))
-            
-            # Restaurer les métadonnées avec le nouvel ID
-            if tags or is_fav:
-                new_id = encode_id(new_path)
-                
-                # Tags
-                if tags:
-                    del metadata["item_tags"][old_id]
-                    metadata["item_tags"][new_id] = tags
-                
-                # Favoris
-                if is_fav:
-                    metadata["favorites"].remove(old_id)
-                    metadata["favorites"].append(new_id)
-                
-                save_metadata(metadata)
-        else:
-            # Pour les dossiers
-            shutil.move(str(path), str(new_path))
-            
+        # L'ID est stable : seul l'enregistrement de l'élément déplacé change
+        item_id = encode_id(path)
+        try:
+            os.rename(path, new_path)
+        except OSError as e:
+            if e.errno != errno.EXDEV:
+                raise
+            # Autre volume : copie complète, en tâche de fond
+            files_total, bytes_total = item_totals(path)
+            job = fs_jobs.move(
+                path, new_path, item_id, lambda: finish_move(item_id, path, new_path),
+                files_total=files_total, bytes_total=bytes_total
+            )
+            return ORJSONResponse({"message": "Déplacement en cours", "job": job}, status_code=202)
+
+        finish_move(item_id, path, new_path)
         return path_to_item(new_path)
         
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Erreur déplacement: {str(e)}")
 
+def finish_move(item_id: str, path: Path, new_path: Path) -> None:
+    """
+    Enregistre un déplacement effectué sur disque (immédiat ou en fin de tâche).
+    Peut être rejouée à la reprise d'une tâche interrompue.
+    """
+    id_registry.move(item_id, new_path)
+    # Le sous-arbre garde ses agrégats (indexés par ID) : seuls les deux parents sont réinventoriés
+    folder_stats.refresh([path.parent, new_path.parent])
+    record_change("move", item_id, new_path)
+
+def item_totals(path: Path) -> tuple:
+    """(fichiers, octets) d'un élément, d'après les statistiques de dossiers (estimation de l'avancement)"""
+    st = path.stat()
+    if not path.is_dir():
+        return 1, st.st_size
+    stats = folder_stats.summary(encode_id(path), path, st.st_mtime_ns)
+    return stats.get("documents_count", 0), stats.get("total_size", 0)
+
 @app.delete("/api/delete/{item_id:path}")
 async def delete_item(item_id: str):
     """Supprime un élément"""
@@ -444,69 +921,192 @@ async def delete_item(item_id: str):
         raise HTTPException(status_code=404, detail="Élément non trouvé")
     
     try:
-        # Supprimer les tags, favoris et données OCR associés
-        metadata = load_metadata()
-        if item_id in metadata.get("item_tags", {}):
-            del metadata["item_tags"][item_id]
-        if item_id in metadata.get("favorites", []):
-            metadata["favorites"].remove(item_id)
-        if item_id in metadata.get("ocr_text", {}):
-            del metadata["ocr_text"][item_id]
-        if item_id in metadata.get("ocr_status", {}):
-            del metadata["ocr_status"][item_id]
-        save_metadata(metadata)
-
+        # Supprimer les tags, favoris et données OCR associés (descendants compris)
+        item_id = encode_id(path)
+        files_total, bytes_total = item_totals(path)
+        removed = [item_id] + id_registry.descendants(item_id)
+        with metadata_store.transaction() as txn:
+            ocr_entries = [txn.data.get("ocr_text", {}).get(i) for i in removed]
+            for section in ITEM_SECTIONS:
+                for removed_id in removed:
+                    txn.delete(section, removed_id)
+            favorites = txn.data.get("favorites", [])
+            removed_set = set(removed)
+            if any(f in removed_set for f in favorites):
+                txn.replace("favorites", [f for f in favorites if f not in removed_set])
+            id_registry.forget(removed, txn)
+            release_ocr_blobs(txn, [e for e in ocr_entries if e])
+
+        # Un dossier est mis à la corbeille (instantané) puis effacé en tâche de fond
+        job = None
         if path.is_file():
             path.unlink()
         else:
-            shutil.rmtree(path)
+            job = fs_jobs.delete(path, item_id, files_total, bytes_total)
+        folder_stats.refresh([path.parent])
+        record_change("delete", item_id, path, descendants=len(removed) - 1)
 
-        return {"message": "Élément supprimé", "path": str(path.relative_to(GED_ROOT))}
+        return {"message": "Élément supprimé", "path": str(path.relative_to(GED_ROOT)), "job": job}
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Erreur suppression: {str(e)}")
 
+# ============== TÂCHES DE FOND ==============
+
+@app.get("/api/jobs")
+async def list_jobs():
+    """Suppressions et déplacements en cours ou récents (tous workers)"""
+    return fs_jobs.list()
+
+@app.get("/api/jobs/{job_id}")
+async def get_job(job_id: str):
+    """Avancement d'une tâche (fichiers et octets traités)"""
+    job = fs_jobs.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Tâche non trouvée")
+    return job
+
+@app.post("/api/jobs/{job_id}/cancel")
+async def cancel_job(job_id: str):
+    """Annule un déplacement en cours (la copie partielle est effacée, l'original reste en place)"""
+    try:
+        job = fs_jobs.cancel(job_id)
+    except ValueError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    if job is None:
+        raise HTTPException(status_code=404, detail="Tâche non trouvée")
+    return {"message": "Annulation demandée", "job": job}
+
 # ============== ENDPOINTS UPLOAD/DOWNLOAD ==============
 
+def existing_duplicates(sha256: str) -> List[dict]:
+    """Documents existants ayant exactement ce contenu"""
+    items = []
+    for item_id in hash_index.exact(sha256):
+        path = id_registry.path_for_id(item_id)
+        if path is not None and path.is_file():
+            items.append(path_to_item(path))
+    return items
+
+def index_new_document(file_path: Path, sha256: Optional[str] = None) -> str:
+    """
+    Indexe un nouveau document : empreintes puis OCR (ordonnancé).
+    L'OCR d'un doublon exact déjà traité est réutilisé au lieu d'être refait.
+    """
+    item_id = encode_id(file_path)
+    hashes = compute_hashes(file_path, sha256)
+    twins = [i for i in hash_index.exact(hashes["sha256"]) if i != item_id]
+
+    with metadata_store.transaction() as txn:
+        txn.set("hashes", item_id, hashes)
+    folder_stats.refresh([file_path.parent])
+
+    # Extraction OCR si le fichier est supporté
+    if is_ocr_supported(file_path):
+        reused = False
+        with metadata_store.transaction() as txn:
+            # Relu sous verrou : l'entrée du jumeau et ses blobs doivent encore exister
+            ocr_data = txn.data.get("ocr_text", {})
+            twin = next((t for t in twins if t in ocr_data and ocr_blobs_exist(ocr_data[t])), None)
+            if twin:
+                twin_fields = txn.data.get("fields", {}).get(twin)
+                txn.set("ocr_text", item_id, dict(ocr_data[twin]))
+                txn.set("ocr_status", item_id, "completed")
+                if twin_fields is not None:
+                    txn.set("fields", item_id, twin_fields)
+                reused = True
+        if not reused:
+            # OCR en file prioritaire : l'upload répond sans attendre Tesseract
+            set_ocr_status(item_id, "pending")
+            ocr_scheduler.submit(item_id, PRIORITY_UPLOAD)
+
+    record_change("create", item_id, file_path, type="document")
+    return item_id
+
+async def save_upload(parent_path: Path, file: UploadFile, check_duplicates: bool = False) -> dict:
+    """
+    Enregistre un fichier uploadé en streaming (SHA-256 calculé au passage).
+    Avec check_duplicates, un doublon exact est refusé (409) avant d'être stocké ou OCRisé.
+    """
+    tmp_dir = GED_ROOT / UPLOAD_TMP_DIR
+    tmp_dir.mkdir(parents=True, exist_ok=True)
+    fd, tmp_name = tempfile.mkstemp(dir=tmp_dir)
+    tmp_path = Path(tmp_name)
+    digest = hashlib.sha256()
+
+    try:
+        with os.fdopen(fd, "wb") as f:
+            while chunk := await file.read(UPLOAD_CHUNK_SIZE):
+                digest.update(chunk)
+                f.write(chunk)
+        sha256 = digest.hexdigest()
+
+        if check_duplicates:
+            duplicates = existing_duplicates(sha256)
+            if duplicates:
+                raise HTTPException(
+                    status_code=409,
+                    detail={"message": "Ce document existe déjà", "duplicates": duplicates}
+                )
+
+        # Gérer les noms déjà pris
+        file_path = unique_path(parent_path, file.filename)
+        os.replace(tmp_path, file_path)
+    finally:
+        tmp_path.unlink(missing_ok=True)
+
+    item_id = index_new_document(file_path, sha256)
+    item = path_to_item(file_path, "document")
+
+    if check_duplicates:
+        phash = load_metadata().get("hashes", {}).get(item_id, {}).get("phash")
+        near = hash_index.near(int(phash, 16)) if phash else []
+        item["near_duplicates"] = [i for i, _ in near if i != item_id]
+
+    return item
+
+# Verrou du choix de nom pour les imports concurrents
+_filing_lock = threading.Lock()
+
+def file_ingested_document(source: Path, target_dir: Path, sha256: str) -> Path:
+    """Classe un fichier du dossier d'import dans la GED puis l'indexe"""
+    with _filing_lock:
+        file_path = unique_path(target_dir, source.name)
+        file_path.touch(exist_ok=False)  # Réserver le nom
+    shutil.move(str(source), str(file_path))
+    index_new_document(file_path, sha256)
+    return file_path
+
+# Dossier d'import surveillé (scanner réseau), désactivé si GED_INGEST_DIR est vide
+ingest_pipeline = (
+    IngestPipeline(Path(INGEST_DIR), GED_ROOT, file_ingested_document, existing_duplicates)
+    if INGEST_DIR else None
+)
+
 @app.post("/api/upload/{parent_id:path}")
-async def upload_file(parent_id: str, file: UploadFile = File(...)):
+async def upload_file(
+    parent_id: str,
+    file: UploadFile = File(...),
+    check_duplicates: bool = Query(default=False, description="Refuser les doublons exacts")
+):
     """Upload un fichier"""
     parent_path = decode_id(parent_id)
     
     if not parent_path.exists():
         raise HTTPException(status_code=404, detail="Dossier parent non trouvé")
     
-    file_path = parent_path / file.filename
-    
-    # Gérer les doublons
-    counter = 1
-    original_stem = file_path.stem
-    while file_path.exists():
-        file_path = parent_path / f"{original_stem}_{counter}{file_path.suffix}"
-        counter += 1
-    
     try:
-        with open(file_path, "wb") as f:
-            content = await file.read()
-            f.write(content)
-
-        # Extraction OCR si le fichier est supporté
-        item_id = encode_id(file_path)
-        if is_ocr_supported(file_path):
-            try:
-                ocr_result = extract_text(file_path)
-                if ocr_result:
-                    save_ocr_text(item_id, ocr_result)
-            except Exception as e:
-                # Log mais ne pas faire échouer l'upload
-                print(f"OCR extraction échouée: {e}")
-                set_ocr_status(item_id, "failed")
-
-        return path_to_item(file_path, "document")
+        return await save_upload(parent_path, file, check_duplicates)
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Erreur upload: {str(e)}")
 
 @app.post("/api/upload-multiple/{parent_id:path}")
-async def upload_multiple_files(parent_id: str, files: List[UploadFile] = File(...)):
+async def upload_multiple_files(
+    parent_id: str,
+    files: List[UploadFile] = File(...),
+    check_duplicates: bool = Query(default=False, description="Ignorer les doublons exacts")
+):
     """Upload plusieurs fichiers"""
     parent_path = decode_id(parent_id)
     
@@ -515,36 +1115,20 @@ async def upload_multiple_files(parent_id: str, files: List[UploadFile] = File(.
     
     uploaded = []
     for file in files:
-        file_path = parent_path / file.filename
-        
-        counter = 1
-        original_stem = file_path.stem
-        while file_path.exists():
-            file_path = parent_path / f"{original_stem}_{counter}{file_path.suffix}"
-            counter += 1
-        
         try:
-            with open(file_path, "wb") as f:
-                content = await file.read()
-                f.write(content)
-
-            # Extraction OCR si le fichier est supporté
-            item_id = encode_id(file_path)
-            if is_ocr_supported(file_path):
-                try:
-                    ocr_result = extract_text(file_path)
-                    if ocr_result:
-                        save_ocr_text(item_id, ocr_result)
-                except Exception as e:
-                    print(f"OCR extraction échouée pour {file.filename}: {e}")
-                    set_ocr_status(item_id, "failed")
-
-            uploaded.append(path_to_item(file_path, "document"))
+            uploaded.append(await save_upload(parent_path, file, check_duplicates))
         except Exception as e:
             continue
 
     return uploaded
 
+@app.get("/api/ingest/status")
+async def get_ingest_status():
+    """État du dossier d'import surveillé"""
+    if ingest_pipeline is None:
+        return {"enabled": False}
+    return ingest_pipeline.status()
+
 @app.get("/api/download/{item_id:path}")
 async def download_file(item_id: str):
     """Télécharge un fichier"""
@@ -562,6 +1146,43 @@ async def download_file(item_id: str):
         media_type=mimetypes.guess_type(str(path))[0] or "application/octet-stream"
     )
 
+# Déclaré avant /api/preview/{item_id:path}, qui capturerait sinon le suffixe
+@app.get("/api/preview/{item_id:path}/page/{page}")
+async def preview_page(
+    item_id: str,
+    page: int,
+    format: str = Query(default="pdf", pattern="^(pdf|png)$"),
+    dpi: int = Query(default=DEFAULT_DPI, ge=36, le=300)
+):
+    """
+    Prévisualise une seule page (PDF autonome ou image PNG), sans transférer le document entier.
+    Le nombre total de pages est renvoyé dans l'en-tête X-Page-Count.
+    """
+    path = decode_id(item_id)
+
+    if not path.exists():
+        raise HTTPException(status_code=404, detail="Fichier non trouvé")
+
+    if not path.is_file():
+        raise HTTPException(status_code=400, detail="L'élément n'est pas un fichier")
+
+    try:
+        cached, page_count = await asyncio.to_thread(page_cache.get, path, page, format, dpi)
+    except PageNotFound as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    except (RuntimeError, ValueError) as e:
+        raise HTTPException(status_code=400, detail=f"Extraction de page impossible: {e}")
+
+    disposition_filename = quote(f"{path.stem}_p{page}.{format}")
+    return FileResponse(
+        cached,
+        media_type=PAGE_FORMATS[format],
+        headers={
+            "Content-Disposition": f"inline; filename*=UTF-8''{disposition_filename}",
+            "X-Page-Count": str(page_count)
+        }
+    )
+
 @app.get("/api/preview/{item_id:path}")
 async def preview_file(item_id: str):
     """Prévisualise un fichier (affichage inline)"""
@@ -584,14 +1205,64 @@ async def preview_file(item_id: str):
         headers={"Content-Disposition": f"inline; filename*=UTF-8''{disposition_filename}"}
     )
 
+def export_index_row(path: Path, arcname: str) -> List[str]:
+    """Ligne de index.csv : chemin, taille, date, étiquettes, début du texte OCR"""
+    stat = path.stat()
+    item_id = id_registry.lookup(path)
+    tags = get_item_tags_internal(item_id) if item_id else []
+    text = (get_ocr_text(item_id) or "") if item_id else ""
+    excerpt = " ".join(text[:EXPORT_EXCERPT_CHARS * 2].split())[:EXPORT_EXCERPT_CHARS]
+    return [
+        arcname,
+        str(stat.st_size),
+        datetime.fromtimestamp(stat.st_mtime).isoformat(timespec="seconds"),
+        ", ".join(tags),
+        excerpt
+    ]
+
+@app.get("/api/export/{item_id:path}")
+async def export_zip(item_id: str, index: bool = Query(default=False)):
+    """
+    Exporte un élément et toute sa sous-arborescence en ZIP.
+    L'archive est produite à la volée (pas de fichier temporaire) ;
+    `index=true` ajoute un index.csv (chemins, étiquettes, extraits OCR).
+    """
+    path = decode_id(item_id)
+
+    if not path.exists():
+        raise HTTPException(status_code=404, detail="Élément non trouvé")
+
+    if path.is_file():
+        files = [(path, path.name)]
+    else:
+        # Parcours consommé par le flux : le premier octet n'attend pas la fin du parcours
+        files = ((doc, str(doc.relative_to(path.parent))) for doc in iter_documents(path))
+
+    archive_name = quote(f"{path.name}.zip")
+    return StreamingResponse(
+        stream_zip(files, export_index_row if index else None),
+        media_type="application/zip",
+        headers={"Content-Disposition": f"attachment; filename*=UTF-8''{archive_name}"}
+    )
+
 # ============== ENDPOINTS RECHERCHE ==============
 
 @app.get("/api/search")
 async def search(
-    q: str = Query(..., min_length=1),
+    q: Optional[str] = Query(default=None, min_length=1),
     type: Optional[str] = None,
     extension: Optional[str] = None,
-    content: bool = Query(default=True, description="Rechercher aussi dans le contenu des documents")
+    content: bool = Query(default=True, description="Rechercher aussi dans le contenu des documents"),
+    date_from: Optional[date] = Query(default=None, description="Document mentionnant une date à partir de ce jour"),
+    date_to: Optional[date] = Query(default=None, description="Document mentionnant une date jusqu'à ce jour"),
+    amount_min: Optional[float] = Query(default=None, ge=0, description="Montant en euros minimum"),
+    amount_max: Optional[float] = Query(default=None, ge=0, description="Montant en euros maximum"),
+    iban: Optional[str] = None,
+    siret: Optional[str] = None,
+    tag: Optional[str] = None,
+    armoire: Optional[str] = None,
+    year: Optional[int] = None,
+    facets: bool = Query(default=False, description="Retourner aussi les comptes par facette")
 ):
     """
     Recherche dans la GED.
@@ -599,13 +1270,68 @@ async def search(
     - type: Filtrer par type (armoire, rayon, classeur, dossier, intercalaire, document)
     - extension: Filtrer par extension de fichier
     - content: Si True, recherche aussi dans le contenu OCR des documents
+    - date_from, date_to, amount_min, amount_max, iban, siret: Filtres sur les
+      champs extraits du texte OCR (seuls les documents correspondants sont retournés)
+    - tag, armoire, year: Filtres par facette (étiquette, nom d'armoire, année de modification)
+    - facets: Si True, retourne {"items", "total", "facets"} au lieu de la liste seule
+
+    Les candidats d'une recherche restent en cache : changer de filtre de
+    facette (type, extension, tag, armoire, year) ne refait pas le parcours.
+    """
+    field_filters = {
+        "date_from": date_from, "date_to": date_to,
+        "amount_min": amount_min, "amount_max": amount_max,
+        "iban": iban, "siret": siret,
+    }
+    filtered = any(v is not None for v in field_filters.values())
+    if not q and not filtered:
+        raise HTTPException(status_code=400, detail="Texte à rechercher ou filtre requis")
+
+    facet_filters = {
+        "type": type,
+        "extension": extension.lower() if extension else None,
+        "tag": tag,
+        "armoire": armoire,
+        "year": str(year) if year is not None else None,
+    }
+    cache_key = (q.lower() if q else None, content, tuple(field_filters.values()))
+    metadata_store.view()  # Rattrape le journal des autres workers
+    facet_set = search_cache.get(cache_key, metadata_store.seq)
+    if facet_set is None:
+        facet_set = FacetSet(search_candidates(q, content, field_filters))
+        search_cache.put(cache_key, metadata_store.seq, facet_set)
+
+    mask = facet_set.select(facet_filters)
+    items = list(islice(facet_set.iter_items(mask), SEARCH_LIMIT))
+    if not facets:
+        return ORJSONResponse(items)
+    return ORJSONResponse({"items": items, "total": mask.bit_count(), "facets": facet_set.counts(facet_filters)})
+
+def search_candidates(q: Optional[str], content: bool, field_filters: dict) -> List[dict]:
+    """
+    Tous les éléments correspondant au texte et aux filtres de champs, triés.
+    Les filtres de facette sont appliqués ensuite, sur le résultat en cache.
     """
     results = []
-    query = q.lower()
+    query = q.lower() if q else None
 
     # Charger les données OCR pour la recherche de contenu
-    metadata = load_metadata() if content else {}
+    metadata = load_metadata()
     ocr_data = metadata.get("ocr_text", {}) if content else {}
+    item_tags = metadata.get("item_tags", {})
+    # Textes dont la signature exclut la requête : inutile de les décompresser
+    ruled_out = content_index.ruled_out(query) if content and query else set()
+
+    def match(item: Path, item_id: str) -> List[str]:
+        """Types de correspondance avec q (nom et/ou contenu)"""
+        match_type = []
+        if query in item.name.lower():
+            match_type.append("filename")
+        if content and item.is_file():
+            item_ocr = ocr_data.get(item_id)
+            if item_ocr and item_ocr.get("text_ref") not in ruled_out and query in load_ocr_entry_text(item_ocr).lower():
+                match_type.append("content")
+        return match_type
 
     def search_recursive(path: Path):
         try:
@@ -613,41 +1339,14 @@ async def search(
                 if is_hidden(item.name):
                     continue
 
-                name_lower = item.name.lower()
-                item_id = encode_id(item)
-
-                # Vérifier correspondance dans le nom
-                name_match = query in name_lower
+                item_id = read_id(item)
+                match_type = match(item, item_id)
 
-                # Vérifier correspondance dans le contenu (pour les documents)
-                content_match = False
-                if content and item.is_file():
-                    item_ocr = ocr_data.get(item_id, {})
-                    item_text = item_ocr.get("text", "").lower()
-                    content_match = query in item_text
-
-                if name_match or content_match:
-                    item_data = path_to_item(item)
+                if match_type:
+                    item_data = path_to_item(item, item_tags=item_tags)
 
                     # Ajouter l'indicateur de type de correspondance
-                    item_data["match_type"] = []
-                    if name_match:
-                        item_data["match_type"].append("filename")
-                    if content_match:
-                        item_data["match_type"].append("content")
-
-                    # Filtrer par type
-                    if type and item_data["type"] != type:
-                        if item.is_dir():
-                            search_recursive(item)
-                        continue
-
-                    # Filtrer par extension
-                    if extension and item_data.get("extension", "").lower() != extension.lower():
-                        if item.is_dir():
-                            search_recursive(item)
-                        continue
-
+                    item_data["match_type"] = match_type
                     results.append(item_data)
 
                 if item.is_dir():
@@ -655,7 +1354,21 @@ async def search(
         except PermissionError:
             pass
 
-    search_recursive(GED_ROOT)
+    if any(v is not None for v in field_filters.values()):
+        # Les index de champs donnent directement les candidats : pas de parcours de l'arborescence
+        for item_id in field_index.query(**field_filters):
+            path = id_registry.path_for_id(item_id)
+            if path is None or not path.is_file() or is_hidden(path.name):
+                continue
+            match_type = match(path, item_id) if query else ["fields"]
+            if not match_type:
+                continue
+            item_data = path_to_item(path, item_tags=item_tags)
+            item_data["match_type"] = match_type
+            item_data["fields"] = field_index.get(item_id)
+            results.append(item_data)
+    else:
+        search_recursive(GED_ROOT)
 
     # Trier: correspondances contenu d'abord (plus pertinentes), puis par nom
     def sort_key(x):
@@ -663,8 +1376,7 @@ async def search(
         return (not has_content, x["type"] == "document", x["name"].lower())
 
     results.sort(key=sort_key)
-
-    return results[:100]  # Limiter à 100 résultats
+    return results
 
 @app.get("/api/stats")
 async def get_stats():
@@ -714,38 +1426,24 @@ async def batch_ocr_processing(
     force: bool = Query(default=False, description="Retraiter les fichiers déjà traités")
 ):
     """
-    Traite l'OCR pour les documents existants.
+    Traite l'OCR pour les documents existants, via l'ordonnanceur (priorité manuelle).
     Appeler cet endpoint plusieurs fois pour traiter tous les documents.
 
     - limit: Nombre de documents à traiter (1-100)
     - force: Si True, retraite les fichiers déjà traités
     """
     metadata = load_metadata()
-    ocr_text = metadata.get("ocr_text", {})
+    ocr_text = set(metadata.get("ocr_text", {}))
 
     processed = []
     failed = []
 
-    def find_documents(path: Path):
-        """Trouve récursivement tous les documents."""
-        docs = []
-        try:
-            for item in path.iterdir():
-                if is_hidden(item.name):
-                    continue
-                if item.is_file():
-                    docs.append(item)
-                elif item.is_dir():
-                    docs.extend(find_documents(item))
-        except PermissionError:
-            pass
-        return docs
-
     all_docs = find_documents(GED_ROOT)
 
-    count = 0
+    # Mise en file prioritaire : le débit suit le budget de charge de l'ordonnanceur
+    jobs = []
     for doc_path in all_docs:
-        if count >= limit:
+        if len(jobs) >= limit:
             break
 
         item_id = encode_id(doc_path)
@@ -758,16 +1456,15 @@ async def batch_ocr_processing(
         if not is_ocr_supported(doc_path):
             continue
 
+        jobs.append((doc_path, ocr_scheduler.submit(item_id, PRIORITY_MANUAL)))
+
+    for doc_path, future in jobs:
         try:
-            ocr_result = extract_text(doc_path)
-            if ocr_result:
-                save_ocr_text(item_id, ocr_result)
-                processed.append(doc_path.name)
-            count += 1
+            await asyncio.wrap_future(future)
+            processed.append(doc_path.name)
         except Exception as e:
             failed.append({"file": doc_path.name, "error": str(e)})
-            set_ocr_status(item_id, "failed")
-            count += 1
+    count = len(jobs)
 
     # Compter les documents restants
     remaining = 0
@@ -823,6 +1520,83 @@ async def get_ocr_status():
 
     return stats
 
+@app.get("/api/ocr/scheduler")
+async def get_ocr_scheduler_status():
+    """État de l'ordonnanceur OCR (file, charge, plage horaire, pause)"""
+    return ocr_scheduler.status()
+
+# ============== ENDPOINTS DOUBLONS ==============
+
+@app.post("/api/duplicates/scan")
+def scan_duplicates(limit: int = Query(default=50, ge=1, le=1000)):
+    """
+    Calcule les empreintes des documents existants qui n'en ont pas encore.
+    Appeler cet endpoint plusieurs fois pour traiter tous les documents.
+    Exécuté dans le pool de threads : le hachage et le rendu bloquent.
+    """
+    hashed = set(load_metadata().get("hashes", {}))
+    processed = 0
+    failed = []
+    remaining = 0
+
+    for doc_path in find_documents(GED_ROOT):
+        item_id = encode_id(doc_path)
+        if item_id in hashed:
+            continue
+        if processed >= limit:
+            remaining += 1
+            continue
+        try:
+            hashes = compute_hashes(doc_path)
+            with metadata_store.transaction() as txn:
+                txn.set("hashes", item_id, hashes)
+        except Exception as e:
+            failed.append({"file": doc_path.name, "error": str(e)})
+        processed += 1
+
+    return {"processed": processed, "failed": failed, "remaining": remaining}
+
+@app.get("/api/duplicates")
+def get_duplicates(
+    near: bool = Query(default=True, description="Inclure les quasi-doublons (rescans)"),
+    max_distance: int = Query(default=NEAR_DUPLICATE_DISTANCE, ge=0, le=7)
+):
+    """Rapport des doublons exacts et des quasi-doublons (calculé dans le pool de threads)"""
+    metadata = load_metadata()
+    hashes = metadata.get("hashes", {})
+    item_tags = metadata.get("item_tags", {})
+
+    def to_items(ids: List[str]) -> List[dict]:
+        items = []
+        for item_id in ids:
+            path = id_registry.path_for_id(item_id)
+            if path is not None and path.is_file():
+                items.append(path_to_item(path, item_tags=item_tags))
+        return items
+
+    exact = []
+    wasted = 0
+    for ids in hash_index.exact_groups():
+        items = to_items(ids)
+        if len(items) > 1:
+            size = hashes[ids[0]].get("size", 0)
+            wasted += size * (len(items) - 1)
+            exact.append({"sha256": hashes[ids[0]]["sha256"], "size": size, "items": items})
+
+    near_groups = []
+    if near:
+        for ids in hash_index.near_groups(max_distance):
+            items = to_items(ids)
+            if len(items) > 1:
+                near_groups.append({"items": items})
+
+    return {
+        "hashed_documents": len(hashes),
+        "exact": exact,
+        "near": near_groups,
+        "wasted_bytes": wasted
+    }
+
 # ============== ENDPOINTS TAGS ==============
 
 @app.get("/api/tags")
@@ -851,42 +1625,36 @@ async def list_tags():
 @app.post("/api/tags")
 async def create_tag(request: TagRequest):
     """Crée une nouvelle étiquette"""
-    metadata = load_metadata()
-    
-    if "tags" not in metadata:
-        metadata["tags"] = {}
-    
-    if request.name in metadata["tags"]:
-        raise HTTPException(status_code=400, detail="Cette étiquette existe déjà")
-    
-    metadata["tags"][request.name] = {"color": request.color}
-    save_metadata(metadata)
+    with metadata_store.transaction() as txn:
+        if request.name in txn.data.get("tags", {}):
+            raise HTTPException(status_code=400, detail="Cette étiquette existe déjà")
+        
+        txn.set("tags", request.name, {"color": request.color})
     
     return {"name": request.name, "color": request.color, "count": 0}
 
 @app.delete("/api/tags/{tag_name}")
 async def delete_tag(tag_name: str):
     """Supprime une étiquette"""
-    metadata = load_metadata()
-    
-    if tag_name not in metadata.get("tags", {}):
-        raise HTTPException(status_code=404, detail="Étiquette non trouvée")
-    
-    # Supprimer l'étiquette
-    del metadata["tags"][tag_name]
-    
-    # Retirer l'étiquette de tous les éléments
-    for item_id in metadata.get("item_tags", {}):
-        if tag_name in metadata["item_tags"][item_id]:
-            metadata["item_tags"][item_id].remove(tag_name)
+    with metadata_store.transaction() as txn:
+        if tag_name not in txn.data.get("tags", {}):
+            raise HTTPException(status_code=404, detail="Étiquette non trouvée")
+        
+        # Supprimer l'étiquette
+        txn.delete("tags", tag_name)
+        
+        # Retirer l'étiquette de tous les éléments
+        tagged = [(i, t) for i, t in txn.data.get("item_tags", {}).items() if tag_name in t]
+        for item_id, item_tags in tagged:
+            txn.set("item_tags", item_id, [t for t in item_tags if t != tag_name])
+    record_change("untag", None, tag=tag_name, items=[i for i, _ in tagged])
     
-    save_metadata(metadata)
     return {"message": "Étiquette supprimée"}
 
 @app.get("/api/item/{item_id:path}/tags")
 async def get_item_tags(item_id: str):
     """Récupère les étiquettes d'un élément"""
-    return get_item_tags_internal(item_id)
+    return get_item_tags_internal(canonical_id(item_id))
 
 @app.put("/api/item/{item_id:path}/tags")
 async def set_item_tags(item_id: str, request: SetTagsRequest):
@@ -895,13 +1663,10 @@ async def set_item_tags(item_id: str, request: SetTagsRequest):
     if not path.exists():
         raise HTTPException(status_code=404, detail="Élément non trouvé")
     
-    metadata = load_metadata()
-    
-    if "item_tags" not in metadata:
-        metadata["item_tags"] = {}
-    
-    metadata["item_tags"][item_id] = request.tags
-    save_metadata(metadata)
+    item_id = encode_id(path)
+    with metadata_store.transaction() as txn:
+        txn.set("item_tags", item_id, request.tags)
+    record_change("tags", item_id, tags=request.tags)
     
     return request.tags
 
@@ -912,54 +1677,54 @@ async def add_tag_to_item(item_id: str, tag_name: str):
     if not path.exists():
         raise HTTPException(status_code=404, detail="Élément non trouvé")
     
-    metadata = load_metadata()
-    
-    # Créer l'étiquette si elle n'existe pas
-    if "tags" not in metadata:
-        metadata["tags"] = {}
-    if tag_name not in metadata["tags"]:
-        metadata["tags"][tag_name] = {"color": "#3b82f6"}
-    
-    if "item_tags" not in metadata:
-        metadata["item_tags"] = {}
-    
-    if item_id not in metadata["item_tags"]:
-        metadata["item_tags"][item_id] = []
-    
-    if tag_name not in metadata["item_tags"][item_id]:
-        metadata["item_tags"][item_id].append(tag_name)
+    item_id = encode_id(path)
+    with metadata_store.transaction() as txn:
+        # Créer l'étiquette si elle n'existe pas
+        if tag_name not in txn.data.get("tags", {}):
+            txn.set("tags", tag_name, {"color": "#3b82f6"})
+        
+        item_tags = list(txn.data.get("item_tags", {}).get(item_id, []))
+        added = tag_name not in item_tags
+        if added:
+            item_tags.append(tag_name)
+            txn.set("item_tags", item_id, item_tags)
+    if added:
+        record_change("tag", item_id, tag=tag_name)
     
-    save_metadata(metadata)
-    return {"tags": metadata["item_tags"][item_id]}
+    return {"tags": item_tags}
 
 @app.delete("/api/item/{item_id:path}/tags/{tag_name}")
 async def remove_tag_from_item(item_id: str, tag_name: str):
     """Retire une étiquette d'un élément"""
-    metadata = load_metadata()
-    
-    if item_id in metadata.get("item_tags", {}):
-        if tag_name in metadata["item_tags"][item_id]:
-            metadata["item_tags"][item_id].remove(tag_name)
-            save_metadata(metadata)
-    
-    return {"tags": metadata.get("item_tags", {}).get(item_id, [])}
+    item_id = canonical_id(item_id)
+    with metadata_store.transaction() as txn:
+        item_tags = txn.data.get("item_tags", {}).get(item_id, [])
+        removed = tag_name in item_tags
+        if removed:
+            item_tags = [t for t in item_tags if t != tag_name]
+            txn.set("item_tags", item_id, item_tags)
+    if removed:
+        record_change("untag", item_id, tag=tag_name)
+    
+    return {"tags": item_tags}
 
 @app.get("/api/tags/{tag_name}/items")
 async def get_items_by_tag(tag_name: str):
     """Récupère tous les éléments ayant une étiquette"""
     metadata = load_metadata()
+    item_tags = metadata.get("item_tags", {})
     items = []
     
-    for item_id, tags in metadata.get("item_tags", {}).items():
+    for item_id, tags in item_tags.items():
         if tag_name in tags:
             try:
                 path = decode_id(item_id)
                 if path.exists():
-                    items.append(path_to_item(path))
+                    items.append(path_to_item(path, item_tags=item_tags))
             except:
                 continue
     
-    return items
+    return ORJSONResponse(items)
 
 # ============== ENDPOINTS FAVORIS ==============
 
@@ -967,21 +1732,23 @@ async def get_items_by_tag(tag_name: str):
 async def get_favorites():
     """Récupère la liste des favoris avec leurs métadonnées"""
     favorite_ids = get_favorites_from_metadata()
+    item_tags = load_metadata().get("item_tags", {})
     favorites = []
-    valid_favorites = []
+    invalid_favorites = []
     
     for item_id in favorite_ids:
         try:
             path = decode_id(item_id)
             if path.exists() and path.is_file():
-                valid_favorites.append(item_id)
-                favorites.append(path_to_item(path))
+                favorites.append(path_to_item(path, item_tags=item_tags))
+                continue
         except Exception:
-            continue
+            pass
+        invalid_favorites.append(item_id)
     
-    # Nettoyer les favoris invalides
-    if len(valid_favorites) != len(favorite_ids):
-        save_favorites_to_metadata(valid_favorites)
+    # Nettoyer les favoris invalides (seulement eux : un ajout concurrent est préservé)
+    if invalid_favorites:
+        remove_favorites_from_metadata(invalid_favorites)
     
     return favorites
 
@@ -993,33 +1760,182 @@ async def add_favorite(item_id: str):
     if not path.exists():
         raise HTTPException(status_code=404, detail="Élément non trouvé")
     
-    favorites = get_favorites_from_metadata()
-    
-    if item_id not in favorites:
-        favorites.append(item_id)
-        save_favorites_to_metadata(favorites)
+    item_id = encode_id(path)
+    if add_favorite_to_metadata(item_id):
+        record_change("favorite", item_id)
     
-    return {
-        "message": "Favori ajouté",
-        "favorites": await get_favorites()
-    }
+    # Pas de liste recalculée : le client applique le changement (voir /api/changes)
+    return {"message": "Favori ajouté", "id": item_id, "favorite": True, "seq": change_feed.seq}
 
 @app.delete("/api/favorites/{item_id:path}")
 async def remove_favorite(item_id: str):
     """Retire un document des favoris"""
-    favorites = get_favorites_from_metadata()
-    
-    if item_id in favorites:
-        favorites.remove(item_id)
-        save_favorites_to_metadata(favorites)
+    item_id = canonical_id(item_id)
+    if remove_favorites_from_metadata([item_id]):
+        record_change("unfavorite", item_id)
     
-    return {
-        "message": "Favori retiré",
-        "favorites": await get_favorites()
-    }
+    return {"message": "Favori retiré", "id": item_id, "favorite": False, "seq": change_feed.seq}
+
+# ============== ENDPOINTS CHANGEMENTS ==============
+
+@app.get("/api/changes")
+async def get_changes(
+    since: Optional[int] = Query(default=None, ge=0, description="Jeton retourné par l'appel précédent"),
+    limit: int = Query(default=1000, ge=1, le=RETAIN_CHANGES_PAGE)
+):
+    """
+    Événements depuis un jeton (création, renommage, déplacement, suppression,
+    étiquettes, favoris, OCR). Sans `since`, retourne seulement le jeton courant.
+    `reset: true` : jeton trop ancien, le client doit tout recharger.
+    """
+    if since is None:
+        return {"events": [], "next": change_feed.seq, "reset": False}
+    events, next_token, reset = change_feed.since(since, limit)
+    return ORJSONResponse({"events": events, "next": next_token, "reset": reset})
+
+@app.get("/api/changes/stream")
+async def stream_changes(request: Request, since: Optional[int] = Query(default=None, ge=0)):
+    """
+    Flux Server-Sent Events des changements (reprise via `since` ou l'en-tête Last-Event-ID).
+    """
+    last_event_id = request.headers.get("last-event-id")
+    token = since if since is not None else int(last_event_id) if (last_event_id or "").isdigit() else change_feed.seq
+
+    async def events():
+        nonlocal token
+        idle = 0.0
+        while not await request.is_disconnected():
+            batch, token, reset = change_feed.since(token)
+            if reset:
+                yield f"event: reset\nid: {token}\ndata: {{}}\n\n"
+            for event in batch:
+                yield f"id: {event['seq']}\nevent: change\ndata: {orjson.dumps(event).decode()}\n\n"
+            if batch or reset:
+                idle = 0.0
+            elif idle >= SSE_HEARTBEAT:
+                yield ": keep-alive\n\n"  # Garde la connexion ouverte derrière les proxys
+                idle = 0.0
+            await asyncio.sleep(SSE_POLL_INTERVAL)
+            idle += SSE_POLL_INTERVAL
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
 
 # ============== DÉMARRAGE ==============
 
+# Avancement de la préparation des index, exposé par /health
+warmup = {"phase": "pending", "done": 0, "total": 0, "started_at": None, "ready_at": None}
+
+def set_warmup_phase(phase: str) -> None:
+    warmup.update(phase=phase, done=0, total=0)
+
+def report_warmup(done: int, total: int) -> None:
+    warmup.update(done=done, total=total)
+
+def prepare_indexes():
+    """
+    Prépare les index en arrière-plan : restauration de l'instantané,
+    rapprochement des dossiers modifiés (statistiques et IDs), des index
+    textuels, puis instantanés périodiques.
+    """
+    warmup["started_at"] = datetime.now().isoformat()
+    saved_seq = None
+    try:
+        set_warmup_phase("snapshot")
+        if index_snapshots.load():
+            saved_seq = metadata_store.seq
+        set_warmup_phase("folders")
+        # Seuls les dossiers dont la mtime a changé sont relistés
+        rescanned = folder_stats.reconcile(report_warmup)
+        if len(rescanned) > 1:
+            print(f"{len(rescanned) - 1} dossiers réinventoriés")
+        set_warmup_phase("ids")
+        registered = id_registry.register_tree(is_hidden, rescanned)
+        if registered:
+            print(f"{registered} éléments enregistrés dans le registre d'IDs")
+        set_warmup_phase("fields")
+        extracted = backfill_fields(report_warmup)
+        if extracted:
+            print(f"Champs structurés extraits de {extracted} documents")
+        set_warmup_phase("classifier")
+        changed = classifier.refresh(report_warmup)
+        set_warmup_phase("similarity")
+        changed += similarity_index.refresh(report_warmup)
+        set_warmup_phase("content")
+        changed += content_index.refresh(report_warmup)
+        if changed:
+            index_snapshots.save()
+            saved_seq = metadata_store.seq
+        set_warmup_phase("ready")
+        warmup["ready_at"] = datetime.now().isoformat()
+        refreshed_seq = metadata_store.seq
+    except Exception as e:
+        # Les index restent servis et la boucle ci-dessous retente leur mise à jour
+        warmup["phase"] = "failed"
+        refreshed_seq = None
+        print(f"Préparation des index échouée: {e}")
+
+    # Les requêtes servent le dernier modèle construit : il est tenu à jour ici
+    last_snapshot = time.monotonic()
+    while True:
+        time.sleep(MODEL_REFRESH_INTERVAL)
+        try:
+            folder_stats.refresh_stale()  # Dossiers modifiés hors de l'API, vus par une requête
+            metadata_store.view()  # Rattrape le journal des autres workers
+            seq = metadata_store.seq
+            if seq != refreshed_seq:
+                classifier.refresh()
+                similarity_index.refresh()
+                content_index.refresh()
+                refreshed_seq = seq
+                if warmup["ready_at"] is None:
+                    set_warmup_phase("ready")
+                    warmup["ready_at"] = datetime.now().isoformat()
+            if refreshed_seq != saved_seq and time.monotonic() - last_snapshot >= SNAPSHOT_INTERVAL:
+                last_snapshot = time.monotonic()
+                if index_snapshots.save():
+                    saved_seq = refreshed_seq
+        except Exception as e:
+            print(f"Mise à jour des index échouée: {e}")
+
+def register_pending_ids():
+    """Enregistre par lots, hors des requêtes, les chemins que les lectures ont vus sans ID"""
+    while True:
+        id_registry.wait_pending()
+        time.sleep(ID_REGISTER_DELAY)  # Regroupe les dossiers d'une même navigation
+        try:
+            id_registry.register_pending(is_hidden)
+        except Exception as e:
+            print(f"Enregistrement des IDs échoué: {e}")
+
+@app.on_event("startup")
+async def startup():
+    """Prépare le stockage au lancement de l'API"""
+    if GED_ROOT.exists():
+        run_migrations()
+        index_snapshots.hold()  # Les index attendent la restauration plutôt que de tout reconstruire
+        threading.Thread(target=prepare_indexes, daemon=True).start()
+        threading.Thread(target=register_pending_ids, daemon=True).start()
+        resumed = fs_jobs.resume(
+            lambda job: finish_move(job.item_id, GED_ROOT / job.path, GED_ROOT / job.destination)
+        )
+        if resumed:
+            print(f"{resumed} tâches de fond interrompues reprises")
+        ocr_scheduler.start()
+        if ingest_pipeline is not None and not ingest_pipeline.start():
+            print("Dossier d'import déjà surveillé par un autre worker")
+
+@app.on_event("shutdown")
+async def shutdown():
+    """Arrête les tâches de fond"""
+    await asyncio.to_thread(ocr_scheduler.stop)
+    await asyncio.to_thread(fs_jobs.stop)
+    if ingest_pipeline is not None and ingest_pipeline.running:
+        await ingest_pipeline.stop()
+
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run(app, host="0.0.0.0", port=8001)
@@ -0,0 +1,351 @@
+"""
+Stockage des métadonnées pour Ma GED Perso
+Instantané JSON + journal de modifications en ajout seul, partagé entre workers
+"""
+
+from pathlib import Path
+from contextlib import contextmanager
+from typing import Callable, Iterator, List, Optional
+import fcntl
+import json
+import logging
+import os
+import tempfile
+import threading
+
+# Configuration
+JOURNAL_SUFFIX = ".journal"
+LOCK_SUFFIX = ".lock"
+COMPACT_EVERY = 500  # Nombre de transactions avant compaction du journal
+
+logger = logging.getLogger(__name__)
+
+Listener = Callable[[Optional[dict]], None]
+
+
+def empty_metadata() -> dict:
+    """Structure de métadonnées vide"""
+    return {"tags": {}, "item_tags": {}, "favorites": []}
+
+
+def apply_op(data: dict, op: dict) -> None:
+    """
+    Applique une opération du journal sur les métadonnées en mémoire.
+
+    Opérations supportées :
+        {"op": "set", "section": s, "key": k, "value": v}
+        {"op": "del", "section": s, "key": k}
+        {"op": "replace", "section": s, "value": v}
+    """
+    kind = op["op"]
+    section = op["section"]
+    if kind == "set":
+        data.setdefault(section, {})[op["key"]] = op["value"]
+    elif kind == "del":
+        data.get(section, {}).pop(op["key"], None)
+    elif kind == "replace":
+        data[section] = op["value"]
+    else:
+        raise ValueError(f"Opération inconnue: {kind}")
+
+
+def apply_op_cow(data: dict, op: dict, copied: set) -> None:
+    """
+    Applique une opération sans toucher aux sections publiées : chaque section
+    est copiée à sa première modification (une seule fois par lot d'opérations).
+    `data` doit déjà être une copie du dictionnaire publié.
+    """
+    section = op["section"]
+    if op["op"] != "replace" and section not in copied:
+        current = data.get(section)
+        data[section] = dict(current) if current is not None else {}
+    copied.add(section)
+    apply_op(data, op)
+
+
+class MetadataTransaction:
+    """
+    Modification atomique des métadonnées.
+
+    `data` est une copie de travail de l'état le plus récent (tous workers
+    confondus) : les opérations y sont appliquées immédiatement (écouteurs
+    compris), journalisées à la sortie du bloc `with`, puis la copie est
+    publiée. Les lecteurs de `view()` ne voient donc jamais un dictionnaire
+    modifié pendant qu'ils le parcourent.
+    """
+
+    def __init__(self, data: dict, notify: Listener):
+        self.data = dict(data)
+        self.ops: List[dict] = []
+        self._notify = notify
+        self._copied: set = set()
+        self._after_commit: List[Callable[[dict], None]] = []
+
+    def set(self, section: str, key: str, value) -> None:
+        """Définit une entrée d'une section dictionnaire"""
+        self._record({"op": "set", "section": section, "key": key, "value": value})
+
+    def delete(self, section: str, key: str) -> None:
+        """Supprime une entrée d'une section dictionnaire (si présente)"""
+        if key in self.data.get(section, {}):
+            self._record({"op": "del", "section": section, "key": key})
+
+    def replace(self, section: str, value) -> None:
+        """Remplace une section entière"""
+        self._record({"op": "replace", "section": section, "value": value})
+
+    def after_commit(self, fn: Callable[[dict], None]) -> None:
+        """
+        Programme une action à exécuter une fois les opérations journalisées
+        (fsync fait), toujours sous verrou exclusif, avec les métadonnées publiées.
+        Sert aux effets hors métadonnées irréversibles (suppression de fichiers).
+        """
+        self._after_commit.append(fn)
+
+    def _record(self, op: dict) -> None:
+        apply_op_cow(self.data, op, self._copied)
+        self.ops.append(op)
+        self._notify(op)
+
+
+class MetadataStore:
+    """
+    Métadonnées partagées entre plusieurs processus (uvicorn --workers N).
+
+    Chaque mutation est ajoutée au journal sous verrou exclusif (flock) ;
+    chaque worker rejoue la fin du journal pour garder sa vue en mémoire à
+    jour. Le journal est périodiquement compacté dans l'instantané JSON.
+    """
+
+    def __init__(self, snapshot_path: Path):
+        self.snapshot_path = snapshot_path
+        self.journal_path = snapshot_path.with_name(snapshot_path.name + JOURNAL_SUFFIX)
+        self.lock_path = snapshot_path.with_name(snapshot_path.name + LOCK_SUFFIX)
+
+        # Verrou des threads du processus ; les index dérivés l'utilisent aussi
+        self.mutex = threading.RLock()
+        self._lock_fd: Optional[int] = None
+        self._listeners: List[Listener] = []
+        self._active: Optional[MetadataTransaction] = None
+
+        self._data: Optional[dict] = None
+        self._seq = 0  # Dernière transaction appliquée
+        self._journal_key = None  # (inode, taille) du journal déjà lu
+        self._offset = 0
+        self._pending = 0  # Transactions dans le journal depuis l'instantané
+
+    # ---------- API publique ----------
+
+    def view(self) -> dict:
+        """
+        Retourne la vue courante des métadonnées.
+        Le dictionnaire retourné est un instantané immuable (les modifications
+        produisent de nouvelles sections) : il peut être parcouru sans verrou,
+        mais ne doit pas être modifié directement.
+        """
+        with self.mutex:
+            # Pendant une transaction du même thread, la vue inclut ses opérations
+            if self._active is not None:
+                return self._active.data
+            self._refresh()
+            return self._data
+
+    @property
+    def seq(self) -> int:
+        """Numéro de la dernière transaction appliquée"""
+        return self._seq
+
+    @contextmanager
+    def transaction(self) -> Iterator[MetadataTransaction]:
+        """
+        Ouvre une transaction exclusive (tous workers confondus).
+        Une transaction ouverte dans une autre du même thread s'y joint.
+        """
+        with self.mutex:
+            if self._active is not None:
+                yield self._active
+                return
+            with self._file_lock(fcntl.LOCK_EX):
+                self._refresh(locked=True)
+                txn = MetadataTransaction(self._data, self._notify)
+                self._active = txn
+                try:
+                    yield txn
+                except BaseException:
+                    # Copie de travail abandonnée ; les écouteurs ont vu ses opérations
+                    if txn.ops:
+                        self._notify(None)
+                    raise
+                finally:
+                    self._active = None
+                if txn.ops:
+                    try:
+                        self._append(txn.ops)
+                    except BaseException:
+                        self._notify(None)
+                        raise
+                    self._data = txn.data
+                    if self._pending >= COMPACT_EVERY:
+                        self._compact()
+                for fn in txn._after_commit:
+                    try:
+                        fn(self._data)
+                    except Exception as e:
+                        logger.error(f"Action après transaction en erreur: {e}")
+
+    def add_listener(self, listener: Listener) -> None:
+        """
+        Enregistre une fonction appelée pour chaque opération appliquée
+        (locale ou venant d'un autre worker), ou avec None après un rechargement complet.
+        """
+        self._listeners.append(listener)
+
+    def compact(self) -> None:
+        """Force la compaction du journal dans l'instantané"""
+        with self.mutex, self._file_lock(fcntl.LOCK_EX):
+            self._refresh(locked=True)
+            self._compact()
+
+    # ---------- Interne ----------
+
+    @contextmanager
+    def _file_lock(self, mode: int):
+        if self._lock_fd is None:
+            self._lock_fd = os.open(self.lock_path, os.O_RDWR | os.O_CREAT, 0o644)
+        fcntl.flock(self._lock_fd, mode)
+        try:
+            yield
+        finally:
+            fcntl.flock(self._lock_fd, fcntl.LOCK_UN)
+
+    def _journal_stat(self):
+        try:
+            st = os.stat(self.journal_path)
+            return st.st_ino, st.st_size
+        except FileNotFoundError:
+            return None
+
+    def _refresh(self, locked: bool = False) -> None:
+        """Rattrape les transactions des autres workers"""
+        key = self._journal_stat()
+        if self._data is not None and key == self._journal_key:
+            return  # Chemin rapide : rien de nouveau
+
+        if locked:
+            self._catch_up()
+        else:
+            with self._file_lock(fcntl.LOCK_SH):
+                self._catch_up()
+
+    def _catch_up(self) -> None:
+        key = self._journal_stat()
+        if (
+            self._data is None
+            or key is None
+            or self._journal_key is None
+            or key[0] != self._journal_key[0]
+            or key[1] < self._offset
+        ):
+            # Premier chargement ou journal compacté par un autre worker
+            self._reload()
+            return
+        self._read_journal()
+
+    def _reload(self) -> None:
+        data = empty_metadata()
+        seq = 0
+        if self.snapshot_path.exists():
+            try:
+                with open(self.snapshot_path, "r", encoding="utf-8") as f:
+                    data = json.load(f)
+                seq = data.pop("journal_seq", 0)
+            except (json.JSONDecodeError, IOError) as e:
+                logger.error(f"Lecture des métadonnées échouée: {e}")
+        self._data = data
+        self._seq = seq
+        self._offset = 0
+        self._pending = 0
+        self._journal_key = None
+        self._read_journal(notify=False)
+        self._notify(None)
+
+    def _read_journal(self, notify: bool = True) -> None:
+        try:
+            with open(self.journal_path, "rb") as f:
+                st = os.fstat(f.fileno())
+                f.seek(self._offset)
+                chunk = f.read()
+        except FileNotFoundError:
+            self._journal_key = None
+            self._offset = 0
+            return
+
+        # Ne consommer que les lignes complètes, appliquées sur une copie (les vues déjà distribuées restent intactes)
+        end = chunk.rfind(b"\n") + 1
+        data = dict(self._data)
+        copied: set = set()
+        self._data = data  # Les écouteurs qui relisent la vue voient les opérations rejouées
+        for line in chunk[:end].splitlines():
+            if not line.strip():
+                continue
+            try:
+                entry = json.loads(line)
+            except json.JSONDecodeError:
+                logger.error("Entrée de journal illisible ignorée")
+                continue
+            if entry["seq"] <= self._seq:
+                continue
+            for op in entry["ops"]:
+                apply_op_cow(data, op, copied)
+                if notify:
+                    self._notify(op)
+            self._seq = entry["seq"]
+            self._pending += 1
+
+        self._offset += end
+        self._journal_key = (st.st_ino, self._offset)
+
+    def _append(self, ops: List[dict]) -> None:
+        seq = self._seq + 1
+        line = json.dumps({"seq": seq, "ops": ops}, ensure_ascii=False) + "\n"
+        fd = os.open(self.journal_path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+        try:
+            os.write(fd, line.encode("utf-8"))
+            os.fsync(fd)
+            st = os.fstat(fd)
+        finally:
+            os.close(fd)
+        self._seq = seq
+        self._offset = st.st_size
+        self._journal_key = (st.st_ino, st.st_size)
+        self._pending += 1
+
+    def _compact(self) -> None:
+        snapshot = dict(self._data)
+        snapshot["journal_seq"] = self._seq
+        self._atomic_write(self.snapshot_path, json.dumps(snapshot, indent=2, ensure_ascii=False))
+        # Nouveau journal vide (nouvel inode : les autres workers rechargeront l'instantané)
+        self._atomic_write(self.journal_path, "")
+        st = os.stat(self.journal_path)
+        self._journal_key = (st.st_ino, 0)
+        self._offset = 0
+        self._pending = 0
+
+    def _atomic_write(self, path: Path, content: str) -> None:
+        fd, tmp_name = tempfile.mkstemp(dir=path.parent, prefix=f".{path.name}.tmp-")
+        try:
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                f.write(content)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_name, path)
+        except Exception:
+            Path(tmp_name).unlink(missing_ok=True)
+            raise
+
+    def _notify(self, op: Optional[dict]) -> None:
+        for listener in self._listeners:
+            try:
+                listener(op)
+            except Exception as e:
+                logger.error(f"Écouteur de métadonnées en erreur: {e}")
@@ -0,0 +1,355 @@
+"""
+Ordonnanceur OCR pour Ma GED Perso
+Priorités, budget de charge CPU, plages horaires et pause pendant l'activité de l'API
+"""
+
+from collections import deque
+from concurrent.futures import Future
+from dataclasses import dataclass, field
+from datetime import datetime, time as dtime
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Tuple
+import fcntl
+import heapq
+import itertools
+import logging
+import os
+import threading
+import time
+
+# Configuration
+OCR_WORKERS = int(os.environ.get("GED_OCR_WORKERS", "1"))
+# Charge (load average 1 min) tolérée hors OCR ; par défaut la moitié des cœurs
+OCR_MAX_LOAD = float(os.environ.get("GED_OCR_MAX_LOAD", max(1.0, (os.cpu_count() or 2) / 2)))
+# Plages du rattrapage automatique, "HH:MM-HH:MM[,…]" ; vide = toujours, "off" = jamais
+OCR_BACKLOG_WINDOW = os.environ.get("GED_OCR_BACKLOG_WINDOW", "01:00-06:00")
+OCR_PAUSE_RPS = float(os.environ.get("GED_OCR_PAUSE_RPS", "2"))  # Requêtes/s au-delà desquelles le rattrapage attend
+OCR_NICE = int(os.environ.get("GED_OCR_NICE", "10"))  # Priorité système des threads OCR (et de Tesseract)
+INTERACTIVE_MAX_DELAY = 30.0  # Attente max d'un upload quand la charge dépasse le budget
+CHECK_INTERVAL = 2.0  # Secondes entre deux vérifications quand le travail est suspendu
+TRAFFIC_WINDOW = 10.0  # Fenêtre de mesure du trafic de l'API
+BACKLOG_BATCH = 50  # Documents ajoutés à la file par passe de rattrapage
+BACKLOG_RESCAN = 900.0  # Délai avant de rechercher à nouveau des documents non traités
+
+# Priorités (plus petit = plus urgent)
+PRIORITY_UPLOAD = 0  # Document tout juste déposé
+PRIORITY_MANUAL = 1  # Indexation demandée depuis l'interface
+PRIORITY_BACKLOG = 2  # Rattrapage automatique
+PRIORITY_NAMES = {PRIORITY_UPLOAD: "upload", PRIORITY_MANUAL: "manual", PRIORITY_BACKLOG: "backlog"}
+
+logger = logging.getLogger(__name__)
+
+ProcessDocument = Callable[[str], None]
+FindBacklog = Callable[[int], List[str]]
+
+
+def parse_windows(spec: str) -> Optional[List[Tuple[dtime, dtime]]]:
+    """
+    Lit une liste de plages horaires "HH:MM-HH:MM", éventuellement à cheval sur minuit.
+
+    Returns:
+        Liste de (début, fin), [] si désactivé ("off"), None si toujours ouvert (vide)
+    """
+    spec = spec.strip().lower()
+    if not spec:
+        return None
+    if spec == "off":
+        return []
+    windows = []
+    for part in spec.split(","):
+        start, end = part.strip().split("-")
+        windows.append((dtime.fromisoformat(start.strip()), dtime.fromisoformat(end.strip())))
+    return windows
+
+
+def in_windows(windows: Optional[List[Tuple[dtime, dtime]]], now: Optional[datetime] = None) -> bool:
+    """Indique si l'heure courante tombe dans une des plages"""
+    if windows is None:
+        return True
+    current = (now or datetime.now()).time()
+    for start, end in windows:
+        if start <= end and start <= current < end:
+            return True
+        if start > end and (current >= start or current < end):
+            return True
+    return False
+
+
+class TrafficMeter:
+    """Débit de requêtes interactives sur une fenêtre glissante"""
+
+    def __init__(self, window: float = TRAFFIC_WINDOW):
+        self.window = window
+        self._hits: deque = deque()
+        self._lock = threading.Lock()
+
+    def hit(self) -> None:
+        now = time.monotonic()
+        with self._lock:
+            self._hits.append(now)
+            self._trim(now)
+
+    def rate(self) -> float:
+        """Requêtes par seconde"""
+        with self._lock:
+            self._trim(time.monotonic())
+            return len(self._hits) / self.window
+
+    def _trim(self, now: float) -> None:
+        while self._hits and self._hits[0] < now - self.window:
+            self._hits.popleft()
+
+
+@dataclass(order=True)
+class _Job:
+    priority: int
+    seq: int
+    item_id: str = field(compare=False)
+    submitted: float = field(compare=False)
+    future: Future = field(compare=False)
+    started: bool = field(default=False, compare=False)
+
+
+class OcrScheduler:
+    """
+    File d'attente OCR à priorités devant `extract_text`.
+
+    Les documents déposés passent avant l'indexation manuelle, elle-même
+    avant le rattrapage automatique. Chaque tâche attend que ses conditions
+    soient réunies :
+
+    - upload / manuel : charge système sous le budget, ou INTERACTIVE_MAX_DELAY écoulé ;
+    - rattrapage : plage horaire ouverte, charge sous le budget et trafic de
+      l'API sous OCR_PAUSE_RPS.
+
+    La charge comparée au budget exclut les workers OCR eux-mêmes (load
+    average moins les tâches en cours), sinon l'OCR se freinerait seul.
+    Le rattrapage (recherche des documents non traités) ne tourne que dans
+    un worker uvicorn, désigné par un verrou fichier.
+    """
+
+    def __init__(self, root: Path, process: ProcessDocument, find_backlog: FindBacklog,
+                 traffic: TrafficMeter, workers: int = OCR_WORKERS):
+        self.root = root
+        self.process = process
+        self.find_backlog = find_backlog
+        self.traffic = traffic
+        self.workers = workers
+        self.max_load = OCR_MAX_LOAD
+        self.windows = parse_windows(OCR_BACKLOG_WINDOW)
+
+        self._heap: List[_Job] = []
+        self._jobs: Dict[str, _Job] = {}
+        self._seq = itertools.count()
+        self._cond = threading.Condition()
+        self._threads: List[threading.Thread] = []
+        self._stopping = False
+        self._lock_fd: Optional[int] = None
+        self._backlog_checked: Optional[float] = None  # Dernier parcours sans résultat
+        self._refilling = False
+
+        self.active: Dict[str, str] = {}  # ID → priorité des tâches en cours
+        self.paused_reason: Optional[str] = None
+        self.done = 0
+        self.failed = 0
+        self.recent: deque = deque(maxlen=20)
+
+    # ---------- Cycle de vie ----------
+
+    def start(self) -> None:
+        """Démarre les threads OCR"""
+        self._stopping = False
+        self._acquire_backlog_leadership()
+        for i in range(self.workers):
+            thread = threading.Thread(target=self._run, name=f"ocr-{i}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def stop(self) -> None:
+        """Arrête les threads après la tâche en cours"""
+        with self._cond:
+            self._stopping = True
+            self._cond.notify_all()
+        for thread in self._threads:
+            thread.join(timeout=5)
+        self._threads = []
+        if self._lock_fd is not None:
+            os.close(self._lock_fd)
+            self._lock_fd = None
+
+    # ---------- Soumission ----------
+
+    def submit(self, item_id: str, priority: int = PRIORITY_UPLOAD) -> Future:
+        """
+        Ajoute un document à la file (sans doublon).
+
+        Returns:
+            Future résolue à la fin du traitement
+        """
+        with self._cond:
+            job = self._jobs.get(item_id)
+            if job is not None:
+                if not job.started and priority < job.priority:
+                    # Promotion : nouvelle entrée, l'ancienne sera ignorée au dépilage
+                    job = _Job(priority, next(self._seq), item_id, job.submitted, job.future)
+                    self._jobs[item_id] = job
+                    heapq.heappush(self._heap, job)
+                    self._cond.notify()
+                return job.future
+            job = _Job(priority, next(self._seq), item_id, time.monotonic(), Future())
+            self._jobs[item_id] = job
+            heapq.heappush(self._heap, job)
+            self._cond.notify()
+            return job.future
+
+    def status(self) -> dict:
+        """État courant de l'ordonnanceur"""
+        with self._cond:
+            queued = {name: 0 for name in PRIORITY_NAMES.values()}
+            for job in self._jobs.values():
+                if not job.started:
+                    queued[PRIORITY_NAMES[job.priority]] += 1
+            active = dict(self.active)
+        return {
+            "workers": self.workers,
+            "running": bool(self._threads),
+            "paused_reason": self.paused_reason,
+            "backlog_leader": self._lock_fd is not None,
+            "backlog_window": OCR_BACKLOG_WINDOW or "always",
+            "backlog_window_open": in_windows(self.windows),
+            "load": round(self._load(), 2),
+            "external_load": round(self._external_load(), 2),
+            "max_load": self.max_load,
+            "api_rps": round(self.traffic.rate(), 2),
+            "pause_rps": OCR_PAUSE_RPS,
+            "queued": queued,
+            "active": active,
+            "done": self.done,
+            "failed": self.failed,
+            "recent": list(self.recent),
+        }
+
+    # ---------- Boucle de travail ----------
+
+    def _run(self) -> None:
+        try:
+            os.setpriority(os.PRIO_PROCESS, threading.get_native_id(), OCR_NICE)
+        except (AttributeError, OSError):
+            pass
+        while True:
+            job = self._next_job()
+            if job is None:
+                return
+            self._execute(job)
+
+    def _next_job(self) -> Optional[_Job]:
+        """Attend la prochaine tâche dont les conditions sont réunies"""
+        with self._cond:
+            while not self._stopping:
+                self._drop_stale()
+                if not self._heap:
+                    self._refill_backlog()
+                if self._heap:
+                    job = self._heap[0]
+                    reason = self._blocked(job)
+                    if reason is None:
+                        heapq.heappop(self._heap)
+                        job.started = True
+                        self.active[job.item_id] = PRIORITY_NAMES[job.priority]
+                        self.paused_reason = None
+                        return job
+                    self.paused_reason = reason
+                else:
+                    self.paused_reason = None
+                self._cond.wait(CHECK_INTERVAL)
+            return None
+
+    def _execute(self, job: _Job) -> None:
+        started = time.monotonic()
+        event = {"id": job.item_id, "priority": PRIORITY_NAMES[job.priority], "at": datetime.now().isoformat()}
+        try:
+            self.process(job.item_id)
+            self.done += 1
+            event["status"] = "done"
+            job.future.set_result(True)
+        except Exception as e:
+            logger.error(f"OCR de {job.item_id} échoué: {e}")
+            self.failed += 1
+            event["status"] = "failed"
+            event["error"] = str(e)
+            job.future.set_exception(e)
+        finally:
+            event["seconds"] = round(time.monotonic() - started, 2)
+            self.recent.appendleft(event)
+            with self._cond:
+                self.active.pop(job.item_id, None)
+                if self._jobs.get(job.item_id) is job:
+                    del self._jobs[job.item_id]
+                self._cond.notify_all()
+
+    def _drop_stale(self) -> None:
+        """Retire du sommet les entrées remplacées par une promotion"""
+        while self._heap and self._jobs.get(self._heap[0].item_id) is not self._heap[0]:
+            heapq.heappop(self._heap)
+
+    def _blocked(self, job: _Job) -> Optional[str]:
+        """Raison pour laquelle la tâche doit attendre, None si elle peut partir"""
+        over_budget = self._external_load() > self.max_load
+        if job.priority < PRIORITY_BACKLOG:
+            if over_budget and time.monotonic() - job.submitted < INTERACTIVE_MAX_DELAY:
+                return "load"
+            return None
+        if not in_windows(self.windows):
+            return "window"
+        if over_budget:
+            return "load"
+        if self.traffic.rate() > OCR_PAUSE_RPS:
+            return "traffic"
+        return None
+
+    def _refill_backlog(self) -> None:
+        """Ajoute des documents non traités quand la file est vide (worker désigné uniquement)"""
+        if self._lock_fd is None or self._refilling or not in_windows(self.windows):
+            return
+        if self._backlog_checked is not None and time.monotonic() - self._backlog_checked < BACKLOG_RESCAN:
+            return
+        self._refilling = True
+        self._cond.release()  # Parcours de l'arborescence hors verrou
+        try:
+            ids = self.find_backlog(BACKLOG_BATCH)
+        except Exception as e:
+            logger.error(f"Recherche des documents à OCRiser échouée: {e}")
+            ids = []
+        finally:
+            self._cond.acquire()
+            self._refilling = False
+        if not ids:
+            self._backlog_checked = time.monotonic()
+        for item_id in ids:
+            if item_id not in self._jobs:
+                job = _Job(PRIORITY_BACKLOG, next(self._seq), item_id, time.monotonic(), Future())
+                self._jobs[item_id] = job
+                heapq.heappush(self._heap, job)
+
+    # ---------- Charge ----------
+
+    def _load(self) -> float:
+        try:
+            return os.getloadavg()[0]
+        except OSError:
+            return 0.0
+
+    def _external_load(self) -> float:
+        """Load average hors tâches OCR en cours"""
+        return max(0.0, self._load() - len(self.active))
+
+    def _acquire_backlog_leadership(self) -> None:
+        lock_path = self.root / ".ged_store" / "ocr.lock"
+        lock_path.parent.mkdir(parents=True, exist_ok=True)
+        fd = os.open(lock_path, os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            os.close(fd)
+            return
+        self._lock_fd = fd
@@ -5,44 +5,220 @@ Extraction de texte depuis PDFs et images avec Tesseract OCR
 
 import pytesseract
 from pdf2image import convert_from_path
-from PIL import Image
+from PIL import Image, ImageOps, ImageSequence, features
 import fitz  # PyMuPDF
 from pathlib import Path
 from datetime import datetime
-from typing import Optional, Tuple
+from functools import lru_cache
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+import csv
+import io
 import logging
+import mimetypes
+import os
+
+from .language_service import detect_languages
 
 # Configuration
-OCR_LANGUAGE = "fra+eng"  # Français + Anglais
-SUPPORTED_IMAGE_EXTENSIONS = {'.png', '.jpg', '.jpeg', '.tiff', '.bmp', '.gif'}
+OCR_LANGUAGE = os.environ.get("GED_OCR_FALLBACK_LANGUAGE", "fra+eng")  # Si la langue n'a pas pu être détectée
+OCR_LANGUAGES = [l.strip() for l in os.environ.get("GED_OCR_LANGUAGES", "fra,eng,deu,spa").split(",") if l.strip()]
+LANGUAGE_PROBE_DPI = 150  # Première page rendue en basse résolution pour détecter la langue
+LANGUAGE_PROBE_MAX_SIDE = 1600  # Images réduites à cette taille (pixels) pour la détection
+SUPPORTED_IMAGE_EXTENSIONS = set()  # Rempli par register_image_format
 SUPPORTED_PDF_EXTENSIONS = {'.pdf'}
 MAX_PDF_PAGES = 50  # Limite pour performance
+MAX_IMAGE_FRAMES = 500  # Pages d'une image multi-pages (TIFF de fax), traitées une à une
+OCR_IMAGE_MODES = {"1", "L", "RGB"}  # Autres modes (CMYK, 16 bits, palette...) convertis avant l'OCR
 MIN_TEXT_LENGTH = 100  # Seuil pour considérer qu'un PDF contient du texte natif
+WORD_BOX_SCALE = 10000  # Coordonnées des mots en 1/10000 de la largeur/hauteur de page
 
 logger = logging.getLogger(__name__)
 
+ImageOpener = Callable[[Path], Image.Image]
+IMAGE_OPENERS: Dict[str, ImageOpener] = {}
+
+
+def register_image_format(extensions: Iterable[str], opener: ImageOpener = Image.open,
+                          mime_type: Optional[str] = None) -> None:
+    """
+    Rend des extensions d'image éligibles à l'OCR.
 
-def extract_text_from_image(image_path: Path) -> Tuple[str, str]:
+    Args:
+        extensions: Extensions en minuscules, avec le point
+        opener: Ouvre un fichier en image PIL (paresseusement : une page à la fois)
+        mime_type: Type MIME à déclarer s'il est inconnu du système
+    """
+    for extension in extensions:
+        IMAGE_OPENERS[extension] = opener
+        SUPPORTED_IMAGE_EXTENSIONS.add(extension)
+        if mime_type:
+            mimetypes.add_type(mime_type, extension)
+
+
+register_image_format({'.png', '.jpg', '.jpeg', '.tif', '.tiff', '.bmp', '.gif'})
+if features.check("webp"):
+    register_image_format({'.webp'}, mime_type="image/webp")
+try:
+    import pillow_heif  # Optionnel : photos de téléphone (HEIC/HEIF)
+    pillow_heif.register_heif_opener()
+    register_image_format({'.heic', '.heif'}, mime_type="image/heic")
+except ImportError:
+    pass
+
+
+def empty_page_words() -> dict:
+    """Boîtes des mots d'une page, en colonnes (x, y, largeur, hauteur, confiance, texte)"""
+    return {"x": [], "y": [], "w": [], "h": [], "c": [], "t": []}
+
+
+@lru_cache(maxsize=1)
+def candidate_languages() -> Tuple[str, ...]:
+    """Langues configurées dont le modèle Tesseract est installé"""
+    try:
+        installed = set(pytesseract.get_languages())
+    except Exception as e:
+        logger.warning(f"Modèles Tesseract installés inconnus: {e}")
+        return tuple(OCR_LANGUAGES)
+    missing = [l for l in OCR_LANGUAGES if l not in installed]
+    if missing:
+        logger.warning(f"Modèles Tesseract absents, ignorés: {', '.join(missing)}")
+    return tuple(l for l in OCR_LANGUAGES if l in installed)
+
+
+def choose_language(text: str) -> Tuple[str, List[str]]:
+    """
+    Langues Tesseract à utiliser pour un document d'après un échantillon de son texte.
+
+    Returns:
+        Tuple (chaîne -l pour Tesseract, langues retenues) ; repli sur OCR_LANGUAGE si indécidable
+    """
+    candidates = list(candidate_languages())
+    languages = detect_languages(text, candidates) if text else None
+    if not languages:
+        return OCR_LANGUAGE, OCR_LANGUAGE.split("+")
+    return "+".join(languages), languages
+
+
+def probe_language(image: Image.Image) -> Tuple[str, List[str]]:
+    """
+    OCR rapide d'une image réduite avec toutes les langues candidates, puis détection.
+    Le coût est celui d'une page basse résolution, contre un modèle de moins sur tout le document :
+    l'OCR pleine résolution n'utilise ensuite que les langues retenues (ou le repli OCR_LANGUAGE).
+    """
+    candidates = candidate_languages()
+    if len(candidates) <= 1:
+        return choose_language("")
+    probe = image.copy()
+    try:
+        probe.thumbnail((LANGUAGE_PROBE_MAX_SIDE, LANGUAGE_PROBE_MAX_SIDE))
+        text = pytesseract.image_to_string(probe, lang="+".join(candidates))
+    finally:
+        probe.close()
+    return choose_language(text)
+
+
+def ocr_image(image: Image.Image, lang: str = OCR_LANGUAGE) -> Tuple[str, dict]:
+    """
+    Une seule passe Tesseract produisant le texte et les boîtes des mots (sorties txt + tsv).
+
+    Returns:
+        Tuple (texte, mots de la page)
+    """
+    if hasattr(pytesseract, "run_and_get_multiple_output"):
+        text, tsv = pytesseract.run_and_get_multiple_output(image, extensions=["txt", "tsv"], lang=lang)
+    else:
+        # pytesseract < 0.3.13 : deux passes
+        text = pytesseract.image_to_string(image, lang=lang)
+        tsv = pytesseract.image_to_data(image, lang=lang)
+    return text, parse_tsv_words(tsv, image.width, image.height)
+
+
+def parse_tsv_words(tsv: str, width: int, height: int) -> dict:
+    """
+    Convertit la sortie TSV de Tesseract en boîtes de mots normalisées.
+    Seules les lignes de niveau mot (5) avec un texte non vide sont gardées.
+    """
+    words = empty_page_words()
+    for row in csv.DictReader(io.StringIO(tsv), delimiter="\t", quoting=csv.QUOTE_NONE):
+        text = (row.get("text") or "").strip()
+        if row.get("level") != "5" or not text:
+            continue
+        words["x"].append(int(row["left"]) * WORD_BOX_SCALE // width)
+        words["y"].append(int(row["top"]) * WORD_BOX_SCALE // height)
+        words["w"].append(int(row["width"]) * WORD_BOX_SCALE // width)
+        words["h"].append(int(row["height"]) * WORD_BOX_SCALE // height)
+        words["c"].append(max(0, round(float(row["conf"]))))
+        words["t"].append(text)
+    return words
+
+
+def native_page_words(page: fitz.Page) -> dict:
+    """Boîtes des mots du texte natif d'une page PDF (sans OCR, confiance 100)"""
+    words = empty_page_words()
+    rect = page.rect
+    for x0, y0, x1, y1, text, *_ in page.get_text("words"):
+        words["x"].append(int((x0 - rect.x0) * WORD_BOX_SCALE / rect.width))
+        words["y"].append(int((y0 - rect.y0) * WORD_BOX_SCALE / rect.height))
+        words["w"].append(int((x1 - x0) * WORD_BOX_SCALE / rect.width))
+        words["h"].append(int((y1 - y0) * WORD_BOX_SCALE / rect.height))
+        words["c"].append(100)
+        words["t"].append(text)
+    return words
+
+
+def _prepare_frame(frame: Image.Image) -> Image.Image:
+    """Page courante redressée (EXIF) et dans un mode accepté par Tesseract"""
+    frame = ImageOps.exif_transpose(frame)
+    if frame.mode not in OCR_IMAGE_MODES:
+        frame = frame.convert("RGB")
+    return frame
+
+
+def extract_text_from_image(image_path: Path) -> Tuple[str, str, int, List[dict], List[str]]:
     """
     Extrait le texte d'une image avec Tesseract OCR.
+    Les images multi-pages (TIFF de fax...) sont lues et OCRisées page par page :
+    une seule page décodée en mémoire à la fois.
 
     Args:
         image_path: Chemin vers l'image
 
     Returns:
-        Tuple (texte_extrait, methode)
+        Tuple (texte_extrait, methode, nombre_pages, mots par page, langues)
     """
     try:
-        image = Image.open(image_path)
-        text = pytesseract.image_to_string(image, lang=OCR_LANGUAGE)
-        image.close()
-        return text.strip(), "tesseract"
+        opener = IMAGE_OPENERS.get(image_path.suffix.lower(), Image.open)
+        with opener(image_path) as image:
+            frame_count = min(getattr(image, "n_frames", 1), MAX_IMAGE_FRAMES)
+            texts = []
+            words = []
+            lang, languages = None, None
+            for index, frame in enumerate(ImageSequence.Iterator(image)):
+                if index >= MAX_IMAGE_FRAMES:
+                    logger.warning(f"{image_path.name}: pages au-delà de {MAX_IMAGE_FRAMES} ignorées")
+                    break
+                page = _prepare_frame(frame)
+                try:
+                    if lang is None:
+                        lang, languages = probe_language(page)  # Détectée sur la première page
+                    page_text, page_words = ocr_image(page, lang)
+                finally:
+                    if page is not frame:
+                        page.close()
+                texts.append(page_text)
+                words.append(page_words)
+
+        if frame_count == 1:
+            return texts[0].strip(), "tesseract", 1, words, languages
+        # Marqueurs de page comme pour les PDF scannés
+        text = "".join(f"\n--- Page {i + 1} ---\n{t}" for i, t in enumerate(texts))
+        return text.strip(), "tesseract", frame_count, words, languages
     except Exception as e:
         logger.error(f"OCR échoué pour l'image {image_path}: {e}")
         raise
 
 
-def extract_text_from_pdf(pdf_path: Path) -> Tuple[str, str, int]:
+def extract_text_from_pdf(pdf_path: Path) -> Tuple[str, str, int, List[dict], List[str]]:
     """
     Extrait le texte d'un PDF.
     Essaie d'abord l'extraction native (PyMuPDF), sinon utilise l'OCR.
@@ -51,7 +227,7 @@ def extract_text_from_pdf(pdf_path: Path) -> Tuple[str, str, int]:
         pdf_path: Chemin vers le PDF
 
     Returns:
-        Tuple (texte_extrait, methode, nombre_pages)
+        Tuple (texte_extrait, methode, nombre_pages, mots par page, langues)
     """
     try:
         # Essayer l'extraction native avec PyMuPDF
@@ -59,18 +235,32 @@ def extract_text_from_pdf(pdf_path: Path) -> Tuple[str, str, int]:
         page_count = len(doc)
 
         native_text = ""
+        native_words = []
         for page in doc:
             native_text += page.get_text()
-
-        doc.close()
+            native_words.append(native_page_words(page))
 
         # Si l'extraction native a donné du texte substantiel, l'utiliser
         if len(native_text.strip()) > MIN_TEXT_LENGTH:
-            return native_text.strip(), "pymupdf", page_count
+            doc.close()
+            _, languages = choose_language(native_text)
+            return native_text.strip(), "pymupdf", page_count, native_words, languages
 
         # Sinon, c'est un PDF scanné, utiliser l'OCR
         logger.info(f"PDF {pdf_path.name} semble scanné, utilisation de l'OCR")
 
+        # Le peu de texte natif (en-tête, tampon...) suffit parfois à choisir la langue ;
+        # sinon, détection sur la première page en basse résolution
+        languages = detect_languages(native_text, list(candidate_languages()))
+        if languages:
+            lang = "+".join(languages)
+        elif page_count:
+            pix = doc[0].get_pixmap(dpi=LANGUAGE_PROBE_DPI, colorspace=fitz.csGRAY)
+            lang, languages = probe_language(Image.frombytes("L", (pix.width, pix.height), pix.samples))
+        else:
+            lang, languages = OCR_LANGUAGE, OCR_LANGUAGE.split("+")
+        doc.close()
+
         # Convertir les pages PDF en images
         images = convert_from_path(
             pdf_path,
@@ -79,15 +269,17 @@ def extract_text_from_pdf(pdf_path: Path) -> Tuple[str, str, int]:
         )
 
         ocr_text = ""
+        ocr_words = []
         for i, image in enumerate(images):
-            page_text = pytesseract.image_to_string(image, lang=OCR_LANGUAGE)
+            page_text, page_words = ocr_image(image, lang)
             ocr_text += f"\n--- Page {i + 1} ---\n{page_text}"
+            ocr_words.append(page_words)
             image.close()
 
         # Libérer la mémoire
         del images
 
-        return ocr_text.strip(), "tesseract", page_count
+        return ocr_text.strip(), "tesseract", page_count, ocr_words, languages
 
     except Exception as e:
         logger.error(f"Extraction de texte échouée pour {pdf_path}: {e}")
@@ -102,31 +294,36 @@ def extract_text(file_path: Path) -> Optional[dict]:
         file_path: Chemin vers le fichier
 
     Returns:
-        Dictionnaire avec les résultats d'extraction, ou None si non supporté
+        Dictionnaire avec les résultats d'extraction, ou None si non supporté.
+        "words" contient, page par page, les boîtes des mots (voir `empty_page_words`).
     """
     suffix = file_path.suffix.lower()
 
     result = {
         "extracted_at": datetime.now().isoformat(),
-        "language": OCR_LANGUAGE,
     }
 
     try:
         if suffix in SUPPORTED_IMAGE_EXTENSIONS:
-            text, method = extract_text_from_image(file_path)
+            text, method, page_count, words, languages = extract_text_from_image(file_path)
             result["text"] = text
             result["method"] = method
-            result["page_count"] = 1
+            result["page_count"] = page_count
+            result["words"] = words
 
         elif suffix in SUPPORTED_PDF_EXTENSIONS:
-            text, method, page_count = extract_text_from_pdf(file_path)
+            text, method, page_count, words, languages = extract_text_from_pdf(file_path)
             result["text"] = text
             result["method"] = method
             result["page_count"] = page_count
+            result["words"] = words
 
         else:
             return None  # Type de fichier non supporté
 
+        # Langues retenues (détectées, ou repli) ; "language" garde le format historique fra+eng
+        result["languages"] = languages
+        result["language"] = "+".join(languages)
         return result
 
     except Exception as e:
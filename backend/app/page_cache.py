@@ -0,0 +1,133 @@
+"""
+Pages isolées pour Ma GED Perso
+Extraction d'une page (PDF autonome ou PNG) via PyMuPDF, mise en cache sur disque
+"""
+
+import fitz  # PyMuPDF
+from pathlib import Path
+from typing import Tuple
+import hashlib
+import logging
+import os
+import tempfile
+import threading
+
+# Configuration
+PAGE_CACHE_DIR = ".ged_store/pages"  # Relatif à GED_ROOT
+PAGE_FORMATS = {"pdf": "application/pdf", "png": "image/png"}
+DEFAULT_DPI = 110
+MAX_CACHE_BYTES = 512 * 1024 * 1024  # Au-delà, les pages les plus anciennes sont supprimées
+
+logger = logging.getLogger(__name__)
+
+
+class PageNotFound(Exception):
+    """Numéro de page hors du document"""
+
+
+class PageCache:
+    """
+    Cache disque des pages extraites.
+
+    La clé d'une page combine le chemin, la taille et la date de modification
+    du document source : un document modifié produit de nouvelles clés, les
+    anciennes disparaissent avec la purge par ancienneté.
+
+    PyMuPDF ne lit que la table des objets et les objets de la page demandée :
+    ouvrir la page 250 d'un scan de 300 pages coûte une page d'E/S.
+    """
+
+    def __init__(self, root: Path, max_bytes: int = MAX_CACHE_BYTES):
+        self.root = root
+        self.max_bytes = max_bytes
+        self._size = None  # Taille totale, calculée au premier ajout
+        self._lock = threading.Lock()
+
+    def get(self, source: Path, page: int, fmt: str = "pdf", dpi: int = DEFAULT_DPI) -> Tuple[Path, int]:
+        """
+        Retourne le fichier d'une page, en l'extrayant si nécessaire.
+
+        Args:
+            source: Document source
+            page: Numéro de page (à partir de 1)
+            fmt: "pdf" ou "png"
+            dpi: Résolution du rendu PNG
+
+        Returns:
+            (chemin du fichier en cache, nombre de pages du document)
+
+        Raises:
+            PageNotFound: Si la page n'existe pas
+        """
+        stat = source.stat()
+        key = f"{source}|{stat.st_size}|{stat.st_mtime_ns}|{page}|{fmt}|{dpi if fmt == 'png' else ''}"
+        digest = hashlib.sha1(key.encode("utf-8")).hexdigest()
+        cached = self.root / digest[:2] / f"{digest}.{fmt}"
+
+        with fitz.open(source) as doc:
+            page_count = doc.page_count
+            try:
+                os.utime(cached)  # Récemment utilisé : épargné par la purge
+                return cached, page_count
+            except FileNotFoundError:
+                pass
+            if not 1 <= page <= page_count:
+                raise PageNotFound(f"Page {page} hors du document ({page_count} pages)")
+            data = self._extract(doc, page - 1, fmt, dpi)
+
+        self._write(cached, data)
+        return cached, page_count
+
+    def _extract(self, doc: fitz.Document, index: int, fmt: str, dpi: int) -> bytes:
+        if fmt == "png":
+            return doc[index].get_pixmap(dpi=dpi).tobytes("png")
+        if doc.is_pdf:
+            out = fitz.open()
+            out.insert_pdf(doc, from_page=index, to_page=index)
+        else:
+            out = fitz.open("pdf", doc.convert_to_pdf(index, index))
+        try:
+            return out.tobytes(garbage=3, deflate=True)
+        finally:
+            out.close()
+
+    def _write(self, path: Path, data: bytes) -> None:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        fd, tmp_name = tempfile.mkstemp(dir=path.parent, prefix=".tmp-")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(data)
+            os.replace(tmp_name, path)
+        except Exception:
+            Path(tmp_name).unlink(missing_ok=True)
+            raise
+
+        with self._lock:
+            if self._size is None:
+                self._size = sum(f.stat().st_size for f in self._files())
+            else:
+                self._size += len(data)
+            if self._size > self.max_bytes:
+                self._evict()
+
+    def _evict(self) -> None:
+        """Supprime les pages les moins récemment servies jusqu'à 80 % du budget"""
+        entries = []
+        for f in self._files():
+            try:
+                st = f.stat()
+            except FileNotFoundError:
+                continue
+            entries.append((st.st_mtime, st.st_size, f))
+        entries.sort()
+        total = sum(size for _, size, _ in entries)
+        for _, size, f in entries:
+            if total <= self.max_bytes * 0.8:
+                break
+            f.unlink(missing_ok=True)
+            total -= size
+        self._size = total
+
+    def _files(self):
+        for fmt in PAGE_FORMATS:
+            yield from self.root.glob(f"*/*.{fmt}")
@@ -0,0 +1,334 @@
+"""
+Documents similaires pour Ma GED Perso
+Index TF-IDF creux (CSR NumPy + delta incrémental) et similarité cosinus top-k
+"""
+
+from typing import Callable, Dict, List, Optional, Set, Tuple
+import logging
+import math
+import threading
+
+import numpy as np
+
+from .metadata_store import MetadataStore
+from .text_features import Vocabulary
+
+# Configuration
+MIN_DELTA_POSTINGS = 200_000  # Delta fusionné dans la CSR au-delà de max(ce seuil, moitié de la CSR)
+MAX_DEAD_RATIO = 0.2  # Proportion de documents supprimés déclenchant un compactage
+COMMON_TERM_RATIO = 0.5  # Termes présents dans plus de la moitié des documents ignorés en requête
+COMMON_TERM_MIN_DOCS = 100  # ... à partir de cette taille de corpus
+NORM_DRIFT = 0.1  # Croissance du corpus avant recalcul des normes (IDF globale)
+PROGRESS_EVERY = 500  # Documents entre deux rapports de progression
+
+logger = logging.getLogger(__name__)
+
+LoadText = Callable[[dict], str]
+Progress = Callable[[int, int], None]
+
+
+class SimilarityIndex:
+    """
+    Index inversé TF-IDF pour la recherche « documents similaires ».
+
+    Les postings (document, 1 + log tf) sont stockés en CSR par terme ; les
+    documents ajoutés depuis la dernière fusion vont dans un delta par terme.
+    Les poids IDF sont appliqués à la requête, les normes des documents sont
+    recalculées (vectorisé) à chaque fusion. Une requête rassemble les
+    postings de ses termes et calcule tous les produits scalaires avec un
+    seul `np.bincount`.
+
+    La matrice CSR est immuable entre deux fusions : restaurée depuis un
+    instantané, elle reste projetée en mémoire sans copie.
+    """
+
+    SNAPSHOT_SCHEMA = 1
+
+    def __init__(self, store: MetadataStore, vocabulary: Vocabulary, load_text: LoadText):
+        self.store = store
+        self.vocabulary = vocabulary
+        self.load_text = load_text
+
+        self._lock = threading.RLock()
+        self.refresh_lock = threading.Lock()
+        # Documents : ordinal ↔ ID
+        self._ord: Dict[str, int] = {}
+        self._ids: List[Optional[str]] = []
+        self._refs: List[Optional[str]] = []
+        self._norms = np.zeros(0, dtype=np.float64)
+        self._alive = np.zeros(0, dtype=bool)
+        self._df = np.zeros(0, dtype=np.float64)
+        self._dead = 0
+        # Postings fusionnés (CSR) et delta
+        self._ptr = np.zeros(1, dtype=np.int64)
+        self._docs = np.zeros(0, dtype=np.int32)
+        self._weights = np.zeros(0, dtype=np.float32)
+        self._delta: Dict[int, Tuple[List[int], List[float]]] = {}
+        self._delta_size = 0
+        self._merged_docs = 0  # Taille du corpus lors du dernier calcul des normes
+
+        self._pending: Set[str] = set()
+        self._full_rescan = True
+        store.add_listener(self._on_change)
+
+    # ---------- Mise à jour ----------
+
+    def refresh(self, progress: Optional[Progress] = None) -> int:
+        """
+        Indexe les documents dont l'OCR a changé depuis le dernier appel.
+
+        Args:
+            progress: Appelé avec (traités, total) pendant les longues mises à jour
+
+        Returns:
+            Nombre de documents ajoutés, modifiés ou retirés
+        """
+        with self.refresh_lock:
+            with self.store.mutex:
+                ocr_data = self.store.view().get("ocr_text", {})
+                if self._full_rescan:
+                    self._pending = set(ocr_data) | set(self._ord)
+                    self._full_rescan = False
+                pending, self._pending = self._pending, set()
+                work = [(doc_id, ocr_data.get(doc_id)) for doc_id in pending]
+
+            changed = 0
+            for done, (doc_id, entry) in enumerate(work, 1):
+                if progress and done % PROGRESS_EVERY == 0:
+                    progress(done, len(work))
+                ref = entry.get("text_ref") if entry else None
+                with self._lock:
+                    current = self._ord.get(doc_id)
+                    if current is not None and entry is not None and self._refs[current] == ref:
+                        continue
+                    if current is not None:
+                        self._remove(current)
+                        changed += 1
+                if entry is not None:
+                    indices, counts = self.vocabulary.vectorize(self.load_text(entry))
+                    with self._lock:
+                        self._add(doc_id, ref, indices, counts)
+                    changed += current is None
+
+            with self._lock:
+                if self._needs_merge():
+                    self._merge()
+            return changed
+
+    def _needs_merge(self) -> bool:
+        """Delta trop gros, trop de documents supprimés, ou IDF (donc normes) trop changées"""
+        return (
+            self._delta_size > max(MIN_DELTA_POSTINGS, self._docs.size // 2)
+            or self._dead > MAX_DEAD_RATIO * max(len(self._ids), 1)
+            or len(self._ord) > self._merged_docs * (1 + NORM_DRIFT) + 10
+        )
+
+    def _on_change(self, op: Optional[dict]) -> None:
+        if op is None:
+            self._full_rescan = True
+        elif op["section"] == "ocr_text" or (op["section"] == "ids" and op["op"] == "del"):
+            if op["op"] == "replace":
+                self._full_rescan = True
+            else:
+                self._pending.add(op["key"])
+
+    def _add(self, doc_id: str, ref: Optional[str], indices: np.ndarray, counts: np.ndarray) -> None:
+        ordinal = len(self._ids)
+        self._ids.append(doc_id)
+        self._refs.append(ref)
+        self._ord[doc_id] = ordinal
+        self._grow(ordinal + 1, len(self.vocabulary))
+
+        weights = 1.0 + np.log(counts)
+        self._df[indices] += 1
+        for term, weight in zip(indices.tolist(), weights.tolist()):
+            docs, values = self._delta.setdefault(term, ([], []))
+            docs.append(ordinal)
+            values.append(weight)
+        self._delta_size += len(indices)
+
+        idf = self._idf(indices)
+        self._norms[ordinal] = math.sqrt(float(((weights * idf) ** 2).sum())) or 1.0
+        self._alive[ordinal] = True
+
+    def _remove(self, ordinal: int) -> None:
+        doc_id = self._ids[ordinal]
+        self._alive[ordinal] = False
+        self._ids[ordinal] = None
+        self._refs[ordinal] = None
+        del self._ord[doc_id]
+        self._dead += 1
+        # Les postings restent jusqu'au prochain compactage ; df est corrigé à ce moment-là
+
+    def _grow(self, docs: int, terms: int) -> None:
+        if docs > self._alive.shape[0]:
+            size = max(docs, self._alive.shape[0] * 2, 64)
+            self._alive = np.concatenate([self._alive, np.zeros(size - self._alive.shape[0], dtype=bool)])
+            self._norms = np.concatenate([self._norms, np.ones(size - self._norms.shape[0])])
+        if terms > self._df.shape[0]:
+            size = max(terms, self._df.shape[0] * 2, 1024)
+            self._df = np.concatenate([self._df, np.zeros(size - self._df.shape[0])])
+
+    def _merge(self) -> None:
+        """Fusionne le delta dans la CSR, retire les documents supprimés, recalcule df et normes"""
+        terms_main = np.repeat(np.arange(len(self._ptr) - 1, dtype=np.int64), np.diff(self._ptr))
+        delta_terms, delta_docs, delta_weights = [], [], []
+        for term, (docs, values) in self._delta.items():
+            delta_terms.append(np.full(len(docs), term, dtype=np.int64))
+            delta_docs.append(np.array(docs, dtype=np.int32))
+            delta_weights.append(np.array(values, dtype=np.float32))
+
+        terms = np.concatenate([terms_main] + delta_terms)
+        docs = np.concatenate([self._docs] + delta_docs)
+        weights = np.concatenate([self._weights] + delta_weights)
+
+        # Renumérotation des documents vivants
+        alive = np.flatnonzero(self._alive[: len(self._ids)])
+        remap = np.full(len(self._ids), -1, dtype=np.int64)
+        remap[alive] = np.arange(alive.size)
+        keep = remap[docs] >= 0
+        terms, docs, weights = terms[keep], remap[docs[keep]].astype(np.int32), weights[keep]
+
+        order = np.lexsort((docs, terms))
+        terms, docs, weights = terms[order], docs[order], weights[order]
+        vocab_size = max(len(self.vocabulary), int(terms.max()) + 1 if terms.size else 0)
+        self._ptr = np.concatenate([[0], np.cumsum(np.bincount(terms, minlength=vocab_size))]).astype(np.int64)
+        self._docs, self._weights = docs, weights
+        self._delta, self._delta_size = {}, 0
+
+        self._ids = [self._ids[i] for i in alive]
+        self._refs = [self._refs[i] for i in alive]
+        self._ord = {doc_id: i for i, doc_id in enumerate(self._ids)}
+        self._alive = np.ones(alive.size, dtype=bool)
+        self._dead = 0
+        self._df = np.bincount(terms, minlength=vocab_size).astype(np.float64)
+
+        idf = self._idf()
+        contributions = (weights * idf[terms]) ** 2
+        norms = np.sqrt(np.bincount(docs, weights=contributions, minlength=alive.size))
+        norms[norms == 0] = 1.0
+        self._norms = norms
+        self._merged_docs = alive.size
+
+    def _idf(self, indices: Optional[np.ndarray] = None) -> np.ndarray:
+        n = max(len(self._ord), 1)
+        df = self._df if indices is None else self._df[indices]
+        return np.log((n + 1) / (df + 1)) + 1.0
+
+    # ---------- Instantané ----------
+
+    def snapshot_state(self) -> Tuple[Dict[str, np.ndarray], dict]:
+        """Index fusionné (CSR) et correspondance ordinal → document"""
+        with self._lock:
+            if self._delta_size or self._dead or self._merged_docs != len(self._ids):
+                self._merge()
+            arrays = {
+                "ptr": self._ptr,
+                "docs": self._docs,
+                "weights": self._weights,
+                "norms": self._norms,
+                "df": self._df,
+            }
+            return arrays, {"ids": list(self._ids), "refs": list(self._refs)}
+
+    def restore_state(self, arrays: Dict[str, np.ndarray], state: dict) -> None:
+        ids = state["ids"]
+        if len(ids) != len(state["refs"]) or arrays["norms"].shape[0] != len(ids):
+            raise ValueError("Index de similarité incohérent")
+        with self._lock:
+            self._ptr, self._docs, self._weights = arrays["ptr"], arrays["docs"], arrays["weights"]
+            self._norms = np.array(arrays["norms"])  # Copies : modifiées sur place
+            self._df = np.array(arrays["df"])
+            self._ids = list(ids)
+            self._refs = list(state["refs"])
+            self._ord = {doc_id: i for i, doc_id in enumerate(self._ids)}
+            self._alive = np.ones(len(self._ids), dtype=bool)
+            self._dead = 0
+            self._delta, self._delta_size = {}, 0
+            self._merged_docs = len(self._ids)
+            self._full_rescan = True  # Rapprochement avec les métadonnées au prochain refresh()
+
+    def reset(self) -> None:
+        with self._lock:
+            self._ord, self._ids, self._refs = {}, [], []
+            self._norms = np.zeros(0, dtype=np.float64)
+            self._alive = np.zeros(0, dtype=bool)
+            self._df = np.zeros(0, dtype=np.float64)
+            self._dead = 0
+            self._ptr = np.zeros(1, dtype=np.int64)
+            self._docs = np.zeros(0, dtype=np.int32)
+            self._weights = np.zeros(0, dtype=np.float32)
+            self._delta, self._delta_size = {}, 0
+            self._merged_docs = 0
+            self._full_rescan = True
+
+    # ---------- Requêtes ----------
+
+    def similar(self, item_id: str, limit: int = 10) -> List[Tuple[str, float]]:
+        """
+        Documents les plus proches d'un document indexé, d'après le dernier index
+        construit (tenu à jour en tâche de fond par `refresh()`, jamais ici).
+
+        Returns:
+            Liste de (id, score cosinus) triée par score décroissant
+        """
+        entry = self.store.view().get("ocr_text", {}).get(item_id)
+        if entry is None:
+            return []
+        indices, counts = self.vocabulary.vectorize(self.load_text(entry), grow=False)
+        return self.query(indices, counts, limit, exclude=item_id)
+
+    def query(self, indices: np.ndarray, counts: np.ndarray, limit: int = 10,
+              exclude: Optional[str] = None) -> List[Tuple[str, float]]:
+        """Top-k cosinus pour un vecteur de comptages creux"""
+        with self._lock:
+            n = len(self._ids)
+            if n == 0 or indices.size == 0:
+                return []
+            self._grow(n, len(self.vocabulary))  # Vocabulaire agrandi par le classement
+            idf = self._idf()
+            query = (1.0 + np.log(counts)) * idf[indices]
+            query_norm = math.sqrt(float((query ** 2).sum())) or 1.0
+
+            max_df = COMMON_TERM_RATIO * n if n >= COMMON_TERM_MIN_DOCS else math.inf
+            parts_docs, parts_weights = [], []
+            for term, weight in zip(indices.tolist(), query.tolist()):
+                if self._df[term] > max_df:
+                    continue
+                if term + 1 < len(self._ptr):
+                    start, end = self._ptr[term], self._ptr[term + 1]
+                    if end > start:
+                        parts_docs.append(self._docs[start:end])
+                        parts_weights.append(self._weights[start:end] * (weight * idf[term]))
+                if term in self._delta:
+                    docs, values = self._delta[term]
+                    parts_docs.append(np.array(docs, dtype=np.int32))
+                    parts_weights.append(np.array(values, dtype=np.float32) * (weight * idf[term]))
+            if not parts_docs:
+                return []
+
+            scores = np.bincount(
+                np.concatenate(parts_docs),
+                weights=np.concatenate(parts_weights),
+                minlength=n
+            )[:n]
+            scores /= self._norms[:n] * query_norm
+            scores[~self._alive[:n]] = 0.0
+            if exclude is not None and exclude in self._ord:
+                scores[self._ord[exclude]] = 0.0
+
+            k = min(limit, n)
+            top = np.argpartition(-scores, k - 1)[:k]
+            top = top[np.argsort(-scores[top])]
+            # Normes calculées avec une IDF légèrement antérieure : borner à 1
+            return [(self._ids[i], round(min(float(scores[i]), 1.0), 4)) for i in top if scores[i] > 0]
+
+    def stats(self) -> dict:
+        """Taille de l'index"""
+        with self._lock:
+            return {
+                "documents": len(self._ord),
+                "postings": int(self._docs.size) + self._delta_size,
+                "pending_merge": self._delta_size,
+                "vocabulary": len(self.vocabulary),
+            }
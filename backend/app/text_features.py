@@ -0,0 +1,101 @@
+"""
+Extraction de caractéristiques textuelles pour Ma GED Perso
+Tokenisation du texte OCR et vocabulaire partagé (classement, similarité)
+"""
+
+from collections import Counter
+from typing import Dict, List, Tuple
+import re
+import threading
+import unicodedata
+
+import numpy as np
+
+# Configuration
+MIN_TOKEN_LENGTH = 3
+MAX_TOKEN_LENGTH = 25
+MAX_TEXT_CHARS = 200_000  # Au-delà, le texte est tronqué (documents de centaines de pages)
+
+TOKEN_RE = re.compile(r"[a-z]{%d,%d}|(?:19|20)\d\d" % (MIN_TOKEN_LENGTH, MAX_TOKEN_LENGTH))
+
+STOPWORDS = frozenset("""
+les des une est pour par dans sur avec sans que qui quoi dont son ses sont aux ette cette ces
+leur leurs nous vous ils elles mais plus moins tout tous toute toutes etre avoir fait faire
+ete entre vers chez ainsi comme page date votre notre vos nos pas ceci cela
+the and for with from this that are was were you your our has have not but all any can
+""".split())
+
+
+def normalize(text: str) -> str:
+    """Minuscules, sans accents"""
+    text = unicodedata.normalize("NFKD", text[:MAX_TEXT_CHARS].lower())
+    return text.encode("ascii", "ignore").decode("ascii")
+
+
+def tokenize(text: str) -> List[str]:
+    """
+    Découpe un texte OCR en termes (mots de 3+ lettres et années).
+
+    Args:
+        text: Texte brut
+
+    Returns:
+        Liste des termes, mots vides exclus
+    """
+    return [t for t in TOKEN_RE.findall(normalize(text)) if t not in STOPWORDS]
+
+
+class Vocabulary:
+    """Association terme → indice de colonne, partagée et croissante"""
+
+    SNAPSHOT_SCHEMA = 1
+
+    def __init__(self):
+        self._index: Dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._index)
+
+    def snapshot_state(self) -> Tuple[Dict[str, np.ndarray], dict]:
+        """Termes dans l'ordre des colonnes, séparés par des sauts de ligne"""
+        with self._lock:
+            terms = sorted(self._index, key=self._index.get)
+        data = "\n".join(terms).encode("ascii")
+        return {"terms": np.frombuffer(data, dtype=np.uint8)}, {"size": len(terms)}
+
+    def restore_state(self, arrays: Dict[str, np.ndarray], state: dict) -> None:
+        terms = arrays["terms"].tobytes().decode("ascii").split("\n") if state["size"] else []
+        if len(terms) != state["size"]:
+            raise ValueError("Vocabulaire incohérent")
+        with self._lock:
+            if self._index:
+                raise ValueError("Vocabulaire déjà utilisé")
+            self._index = {term: i for i, term in enumerate(terms)}
+
+    def reset(self) -> None:
+        with self._lock:
+            self._index = {}
+
+    def vectorize(self, text: str, grow: bool = True) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Convertit un texte en vecteur creux de comptages.
+
+        Args:
+            text: Texte brut
+            grow: Ajouter les termes inconnus au vocabulaire
+
+        Returns:
+            (indices triés int32, comptages float32)
+        """
+        counts = Counter(tokenize(text))
+        if grow:
+            with self._lock:
+                for term in counts:
+                    if term not in self._index:
+                        self._index[term] = len(self._index)
+        pairs = sorted((self._index[t], c) for t, c in counts.items() if t in self._index)
+        if not pairs:
+            return np.zeros(0, dtype=np.int32), np.zeros(0, dtype=np.float32)
+        indices, values = zip(*pairs)
+        return np.array(indices, dtype=np.int32), np.array(values, dtype=np.float32)
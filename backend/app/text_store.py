@@ -0,0 +1,94 @@
+"""
+Stockage des textes OCR pour Ma GED Perso
+Blobs compressés (gzip) adressés par leur contenu (SHA-256)
+"""
+
+from pathlib import Path
+from functools import lru_cache
+from typing import Optional
+import gzip
+import hashlib
+import logging
+import os
+import tempfile
+
+# Configuration
+TEXT_STORE_DIR = ".ged_store/text"  # Relatif à GED_ROOT
+COMPRESSION_LEVEL = 6
+CACHE_SIZE = 128  # Nombre de textes décompressés gardés en mémoire
+
+logger = logging.getLogger(__name__)
+
+
+class TextStore:
+    """
+    Magasin de textes compressés, un blob par contenu.
+
+    Chaque texte est identifié par le SHA-256 de son contenu UTF-8 et stocké
+    dans `<racine>/ab/cd/<hash>.gz`. Deux documents identiques partagent
+    donc le même blob.
+    """
+
+    def __init__(self, root: Path):
+        self.root = root
+        self._get_cached = lru_cache(maxsize=CACHE_SIZE)(self._read)
+
+    def blob_path(self, ref: str) -> Path:
+        """Retourne le chemin du blob pour une référence"""
+        return self.root / ref[:2] / ref[2:4] / f"{ref}.gz"
+
+    def put(self, text: str) -> str:
+        """
+        Enregistre un texte et retourne sa référence.
+
+        Args:
+            text: Texte à stocker
+
+        Returns:
+            Référence (SHA-256 hexadécimal) du texte
+        """
+        data = text.encode("utf-8")
+        ref = hashlib.sha256(data).hexdigest()
+        path = self.blob_path(ref)
+        if path.exists():
+            return ref
+
+        path.parent.mkdir(parents=True, exist_ok=True)
+        # Écriture atomique : fichier temporaire puis renommage
+        fd, tmp_name = tempfile.mkstemp(dir=path.parent, prefix=".tmp-")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(gzip.compress(data, compresslevel=COMPRESSION_LEVEL))
+            os.replace(tmp_name, path)
+        except Exception:
+            Path(tmp_name).unlink(missing_ok=True)
+            raise
+        return ref
+
+    def get(self, ref: str) -> Optional[str]:
+        """
+        Charge un texte depuis sa référence.
+
+        Args:
+            ref: Référence retournée par `put`
+
+        Returns:
+            Le texte, ou None si le blob est absent ou illisible
+        """
+        try:
+            return self._get_cached(ref)
+        except (OSError, EOFError, UnicodeDecodeError) as e:
+            logger.error(f"Lecture du texte {ref} échouée: {e}")
+            return None
+
+    def exists(self, ref: str) -> bool:
+        """Vérifie si un blob existe"""
+        return self.blob_path(ref).exists()
+
+    def delete(self, ref: str) -> None:
+        """Supprime un blob (à n'appeler que s'il n'est plus référencé)"""
+        self.blob_path(ref).unlink(missing_ok=True)
+
+    def _read(self, ref: str) -> str:
+        with open(self.blob_path(ref), "rb") as f:
+            return gzip.decompress(f.read()).decode("utf-8")
@@ -0,0 +1,341 @@
+"""
+Banc d'essai OCR pour Ma GED Perso
+Corpus synthétique généré hors ligne (texte connu), passé dans la chaîne d'extraction :
+pages/s, pic de mémoire (RSS) et taux d'erreur caractère (CER) par configuration
+
+Usage (depuis backend/) :
+    python benchmarks/ocr_benchmark.py
+    python benchmarks/ocr_benchmark.py --dpis 150,300 --noise 0,0.03 --skew 0,2 --json resultats.json
+    python benchmarks/ocr_benchmark.py --compare resultats.json  # Code de sortie 1 en cas de régression
+
+Configurations :
+    native        PDF avec couche texte (extraction PyMuPDF, sans OCR)
+    scan-<dpi>    PDF image rendu à <dpi>, bruit poivre et sel et inclinaison donnés
+    tiff-<dpi>    Même rendu en TIFF multi-pages (chemin image)
+"""
+
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Dict, List, Optional
+import argparse
+import io
+import itertools
+import json
+import multiprocessing
+import random
+import re
+import resource
+import sys
+import tempfile
+import time
+import unicodedata
+
+import fitz  # PyMuPDF
+import numpy as np
+from PIL import Image
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+# Configuration
+DEFAULT_DOCS = 2
+DEFAULT_PAGES = 2
+DEFAULT_DPIS = "150,300"
+DEFAULT_NOISE = "0,0.02"  # Part des pixels remplacés par du bruit poivre et sel
+DEFAULT_SKEW = "0,1.5"  # Inclinaison en degrés
+FONT_SIZE = 11
+PAGE_MARGIN = 56  # Points
+MAX_SPEED_DROP = 0.15  # Régression : pages/s en baisse de plus de 15 %
+MAX_CER_RISE = 0.01  # Régression : CER en hausse de plus d'un point
+
+WORDS = (
+    "facture relevé compte banque assurance contrat échéance montant total client numéro "
+    "période règlement prélèvement attestation impôts revenus déclaration avis taxe foncière "
+    "électricité gaz eau abonnement résiliation mutuelle remboursement santé garantie sinistre "
+    "véhicule habitation loyer quittance bail agence référence dossier courrier madame monsieur "
+    "veuillez trouver ci-joint votre notre le la les des du de et pour dans par sur avec au "
+    "janvier février mars avril mai juin juillet août septembre octobre novembre décembre"
+).split()
+PAGE_MARKER_RE = re.compile(r"-{3} Page \d+ -{3}")
+
+
+# ---------- Corpus ----------
+
+def make_sentence(rng: random.Random) -> str:
+    words = [rng.choice(WORDS) for _ in range(rng.randint(6, 14))]
+    if rng.random() < 0.5:
+        words.insert(rng.randint(0, len(words)), f"{rng.randint(1, 28):02d}/{rng.randint(1, 12):02d}/20{rng.randint(10, 25)}")
+    if rng.random() < 0.4:
+        words.append(f"{rng.randint(10, 9999)},{rng.randint(0, 99):02d} EUR")
+    return " ".join(words).capitalize() + "."
+
+
+def make_page_text(rng: random.Random, lines: int = 28) -> str:
+    return "\n".join(make_sentence(rng) for _ in range(lines))
+
+
+def build_native_pdf(pages: List[str]) -> bytes:
+    """PDF avec couche texte, une page A4 par texte"""
+    doc = fitz.open()
+    for text in pages:
+        page = doc.new_page(width=595, height=842)
+        rect = fitz.Rect(PAGE_MARGIN, PAGE_MARGIN, 595 - PAGE_MARGIN, 842 - PAGE_MARGIN)
+        page.insert_textbox(rect, text, fontsize=FONT_SIZE, fontname="helv")
+    data = doc.tobytes()
+    doc.close()
+    return data
+
+
+def render_scans(native_pdf: bytes, dpi: int, noise: float, skew: float, seed: int) -> List[Image.Image]:
+    """Pages du PDF natif « scannées » : rendu en niveaux de gris, inclinaison, bruit"""
+    rng = np.random.default_rng(seed)
+    images = []
+    with fitz.open("pdf", native_pdf) as doc:
+        for page in doc:
+            pix = page.get_pixmap(dpi=dpi, colorspace=fitz.csGRAY)
+            image = Image.frombytes("L", (pix.width, pix.height), pix.samples)
+            if skew:
+                image = image.rotate(skew, resample=Image.BILINEAR, fillcolor=255)
+            if noise:
+                pixels = np.array(image)
+                mask = rng.random(pixels.shape) < noise
+                pixels[mask] = rng.choice(np.array([0, 255], dtype=np.uint8), size=int(mask.sum()))
+                image = Image.fromarray(pixels)
+            images.append(image)
+    return images
+
+
+def build_scanned_pdf(images: List[Image.Image], dpi: int) -> bytes:
+    """PDF sans couche texte, une image par page"""
+    doc = fitz.open()
+    for image in images:
+        buffer = io.BytesIO()
+        image.save(buffer, format="PNG")
+        width, height = image.width * 72 / dpi, image.height * 72 / dpi
+        page = doc.new_page(width=width, height=height)
+        page.insert_image(page.rect, stream=buffer.getvalue())
+    data = doc.tobytes(deflate=True)
+    doc.close()
+    return data
+
+
+def generate_corpus(root: Path, configs: List[dict], docs: int, pages: int, seed: int) -> Dict[str, List[str]]:
+    """
+    Écrit un dossier par configuration et retourne le texte de référence de chaque document.
+    Le même texte est décliné dans toutes les configurations (comparaison à contenu égal).
+    """
+    rng = random.Random(seed)
+    references = {}
+    natives = {}
+    for d in range(docs):
+        name = f"doc{d + 1:02d}"
+        texts = [make_page_text(rng) for _ in range(pages)]
+        references[name] = texts
+        natives[name] = build_native_pdf(texts)
+
+    for config in configs:
+        folder = root / config["name"]
+        folder.mkdir(parents=True, exist_ok=True)
+        for d, (name, native) in enumerate(natives.items()):
+            if config["kind"] == "native":
+                (folder / f"{name}.pdf").write_bytes(native)
+                continue
+            images = render_scans(native, config["dpi"], config["noise"], config["skew"], seed + d)
+            if config["kind"] == "scan":
+                (folder / f"{name}.pdf").write_bytes(build_scanned_pdf(images, config["dpi"]))
+            else:
+                images[0].save(
+                    folder / f"{name}.tiff", save_all=True, append_images=images[1:],
+                    compression="tiff_deflate", dpi=(config["dpi"], config["dpi"])
+                )
+            for image in images:
+                image.close()
+    return references
+
+
+# ---------- Mesures ----------
+
+def normalize(text: str) -> str:
+    """Texte comparable : sans marqueurs de page, espaces fusionnés, NFC"""
+    text = PAGE_MARKER_RE.sub(" ", unicodedata.normalize("NFC", text))
+    return " ".join(text.split())
+
+
+def levenshtein(a: str, b: str) -> int:
+    """Distance d'édition (algorithme bit-parallèle de Myers, entiers Python comme vecteurs de bits)"""
+    if not a:
+        return len(b)
+    if not b:
+        return len(a)
+    peq: Dict[str, int] = {}
+    for i, char in enumerate(a):
+        peq[char] = peq.get(char, 0) | (1 << i)
+    mask = (1 << len(a)) - 1
+    last = 1 << (len(a) - 1)
+    pv, mv, score = mask, 0, len(a)
+    for char in b:
+        eq = peq.get(char, 0)
+        xv = eq | mv
+        xh = (((eq & pv) + pv) ^ pv) | eq
+        ph = mv | ~(xh | pv)
+        mh = pv & xh
+        if ph & last:
+            score += 1
+        elif mh & last:
+            score -= 1
+        ph = (ph << 1) | 1
+        mh <<= 1
+        pv = (mh | ~(xv | ph)) & mask
+        mv = ph & xv & mask
+    return score
+
+
+def character_error_rate(reference: str, hypothesis: str) -> float:
+    reference, hypothesis = normalize(reference), normalize(hypothesis)
+    if not reference:
+        return 0.0 if not hypothesis else 1.0
+    return levenshtein(reference, hypothesis) / len(reference)
+
+
+def run_configuration(folder: str, references: Dict[str, List[str]]) -> dict:
+    """
+    Passe les documents d'une configuration dans `extract_text`.
+    Exécutée dans un processus neuf : les pics RSS mesurés lui sont propres.
+    """
+    from app.ocr_service import extract_text
+
+    pages = 0
+    errors = 0
+    cers = []
+    methods = set()
+    languages = set()
+    elapsed = 0.0
+    for path in sorted(Path(folder).iterdir()):
+        reference = "\n".join(references[path.stem])
+        start = time.perf_counter()
+        result = extract_text(path)
+        elapsed += time.perf_counter() - start
+        if result is None:
+            errors += 1
+            cers.append(1.0)
+            continue
+        pages += result.get("page_count", 0)
+        methods.add(result.get("method"))
+        languages.update(result.get("languages") or [])
+        cers.append(character_error_rate(reference, result.get("text", "")))
+
+    own = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    children = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss  # Tesseract, pdftoppm
+    return {
+        "pages": pages,
+        "seconds": round(elapsed, 3),
+        "pages_per_second": round(pages / elapsed, 3) if elapsed and pages else 0.0,
+        "peak_rss_mb": round(own / 1024, 1),  # ru_maxrss est en Ko sous Linux
+        "peak_child_rss_mb": round(children / 1024, 1),
+        "cer": round(sum(cers) / len(cers), 4) if cers else None,
+        "errors": errors,
+        "methods": sorted(m for m in methods if m),
+        "languages": sorted(languages),
+    }
+
+
+# ---------- Programme ----------
+
+def parse_floats(value: str) -> List[float]:
+    return [float(v) for v in value.split(",") if v.strip()]
+
+
+def build_configs(kinds: List[str], dpis: List[int], noises: List[float], skews: List[float]) -> List[dict]:
+    configs = []
+    if "native" in kinds:
+        configs.append({"name": "native", "kind": "native", "dpi": None, "noise": 0.0, "skew": 0.0})
+    for kind in ("scan", "tiff"):
+        if kind not in kinds:
+            continue
+        for dpi, noise, skew in itertools.product(dpis, noises, skews):
+            configs.append({
+                "name": f"{kind}-{dpi}dpi-n{noise:g}-s{skew:g}",
+                "kind": kind, "dpi": dpi, "noise": noise, "skew": skew,
+            })
+    return configs
+
+
+def print_table(results: List[dict]) -> None:
+    header = f"{'configuration':<28} {'pages':>5} {'pages/s':>8} {'RSS Mo':>7} {'RSS outils':>10} {'CER':>7} {'err':>4}"
+    print(header)
+    print("-" * len(header))
+    for r in results:
+        cer = f"{r['cer'] * 100:6.2f}%" if r["cer"] is not None else "     -"
+        print(
+            f"{r['name']:<28} {r['pages']:>5} {r['pages_per_second']:>8.2f} {r['peak_rss_mb']:>7.0f} "
+            f"{r['peak_child_rss_mb']:>10.0f} {cer:>7} {r['errors']:>4}"
+        )
+
+
+def compare(results: List[dict], baseline_path: Path) -> List[str]:
+    """Régressions par rapport à un précédent résultat JSON"""
+    baseline = {r["name"]: r for r in json.loads(baseline_path.read_text(encoding="utf-8"))["results"]}
+    regressions = []
+    for r in results:
+        before = baseline.get(r["name"])
+        if before is None:
+            continue
+        if before["pages_per_second"] and r["pages_per_second"] < before["pages_per_second"] * (1 - MAX_SPEED_DROP):
+            regressions.append(f"{r['name']}: {before['pages_per_second']} → {r['pages_per_second']} pages/s")
+        if before["cer"] is not None and r["cer"] is not None and r["cer"] > before["cer"] + MAX_CER_RISE:
+            regressions.append(f"{r['name']}: CER {before['cer']:.2%} → {r['cer']:.2%}")
+        if r["errors"] > before["errors"]:
+            regressions.append(f"{r['name']}: {before['errors']} → {r['errors']} échecs")
+    return regressions
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Banc d'essai de la chaîne OCR sur un corpus synthétique")
+    parser.add_argument("--docs", type=int, default=DEFAULT_DOCS, help="Documents par configuration")
+    parser.add_argument("--pages", type=int, default=DEFAULT_PAGES, help="Pages par document")
+    parser.add_argument("--kinds", default="native,scan", help="native, scan et/ou tiff")
+    parser.add_argument("--dpis", default=DEFAULT_DPIS, help="Résolutions de numérisation simulées")
+    parser.add_argument("--noise", default=DEFAULT_NOISE, help="Niveaux de bruit (part des pixels)")
+    parser.add_argument("--skew", default=DEFAULT_SKEW, help="Inclinaisons en degrés")
+    parser.add_argument("--seed", type=int, default=42, help="Graine du corpus (reproductible)")
+    parser.add_argument("--corpus", type=Path, help="Dossier du corpus (conservé ; temporaire sinon)")
+    parser.add_argument("--json", type=Path, help="Écrit les résultats dans ce fichier")
+    parser.add_argument("--compare", type=Path, help="Résultats JSON de référence (régression → code 1)")
+    args = parser.parse_args(argv)
+
+    configs = build_configs(
+        [k.strip() for k in args.kinds.split(",")],
+        [int(d) for d in parse_floats(args.dpis)],
+        parse_floats(args.noise),
+        parse_floats(args.skew),
+    )
+    with tempfile.TemporaryDirectory(prefix="ocr-bench-") as tmp:
+        root = args.corpus or Path(tmp)
+        print(f"Corpus : {len(configs)} configurations × {args.docs} documents × {args.pages} pages ({root})")
+        references = generate_corpus(root, configs, args.docs, args.pages, args.seed)
+
+        results = []
+        context = multiprocessing.get_context("spawn")
+        for config in configs:
+            with ProcessPoolExecutor(max_workers=1, mp_context=context) as pool:
+                metrics = pool.submit(run_configuration, str(root / config["name"]), references).result()
+            results.append({**config, **metrics})
+            print(f"  {config['name']}: {metrics['pages_per_second']} pages/s, CER {metrics['cer']}")
+
+    print()
+    print_table(results)
+    if args.json:
+        args.json.write_text(json.dumps({
+            "created_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "params": {"docs": args.docs, "pages": args.pages, "seed": args.seed},
+            "results": results,
+        }, indent=2, ensure_ascii=False), encoding="utf-8")
+    if args.compare:
+        regressions = compare(results, args.compare)
+        for line in regressions:
+            print(f"RÉGRESSION {line}")
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,17 @@
+"""
+Fixtures partagées des tests
+"""
+
+import importlib
+
+import pytest
+
+
+@pytest.fixture(scope="session")
+def main(tmp_path_factory):
+    """Module de l'API, importé une seule fois sur une GED vide (sans lancer les tâches de démarrage)"""
+    patch = pytest.MonkeyPatch()
+    patch.setenv("GED_ROOT", str(tmp_path_factory.mktemp("ged")))
+    patch.setenv("GED_INGEST_DIR", "")
+    yield importlib.import_module("app.main")
+    patch.undo()
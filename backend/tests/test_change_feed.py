@@ -0,0 +1,62 @@
+"""
+Tests du journal des changements : numérotation, reprise par jeton, remise à zéro
+"""
+
+from app.change_feed import ChangeFeed
+
+
+def test_events_are_numbered_and_resumable(tmp_path):
+    feed = ChangeFeed(tmp_path / "changes.log")
+    assert feed.seq == 0
+    assert feed.record("create", "a", path="A") == 1
+    assert feed.record("tag", "a", tags=["x"]) == 2
+
+    events, token, reset = feed.since(0)
+    assert [e["seq"] for e in events] == [1, 2]
+    assert events[1]["kind"] == "tag" and events[1]["tags"] == ["x"]
+    assert (token, reset) == (2, False)
+
+    assert feed.since(token) == ([], 2, False)
+
+
+def test_limit_returns_next_token(tmp_path):
+    feed = ChangeFeed(tmp_path / "changes.log")
+    for i in range(5):
+        feed.record("create", str(i))
+    events, token, reset = feed.since(0, limit=2)
+    assert [e["seq"] for e in events] == [1, 2] and token == 2 and not reset
+    events, token, _ = feed.since(token, limit=10)
+    assert [e["seq"] for e in events] == [3, 4, 5] and token == 5
+
+
+def test_events_are_shared_between_workers(tmp_path):
+    first, second = ChangeFeed(tmp_path / "changes.log"), ChangeFeed(tmp_path / "changes.log")
+    first.record("create", "a")
+    assert second.record("rename", "a", path="B") == 2
+    events, token, _ = first.since(0)
+    assert [e["kind"] for e in events] == ["create", "rename"] and token == 2
+
+
+def test_unknown_token_requires_reset(tmp_path):
+    feed = ChangeFeed(tmp_path / "changes.log")
+    feed.record("create", "a")
+    assert feed.since(42) == ([], 1, True)
+
+
+def test_compaction_keeps_sequence_and_resets_old_tokens(tmp_path):
+    path = tmp_path / "changes.log"
+    feed = ChangeFeed(path, retain=3)
+    other = ChangeFeed(path, retain=3)
+    for i in range(7):
+        feed.record("create", str(i))  # Compaction à 2 × retain lignes
+
+    assert len(path.read_text().splitlines()) < 7
+    assert feed.record("delete", "0") == 8
+
+    events, token, reset = feed.since(6)
+    assert [e["seq"] for e in events] == [7, 8] and token == 8 and not reset
+    # Événements suivant le jeton déjà compactés : le client doit tout recharger
+    assert feed.since(1) == ([], 8, True)
+    # Un autre worker relit le fichier compacté (nouvel inode) sans perdre la numérotation
+    assert other.seq == 8
+    assert [e["seq"] for e in other.since(6)[0]] == [7, 8]
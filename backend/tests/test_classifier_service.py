@@ -0,0 +1,102 @@
+"""
+Tests des suggestions de classement : bayésien naïf vectorisé comparé à un calcul à la main
+"""
+
+from collections import Counter
+import math
+
+import pytest
+
+from app.classifier_service import ALPHA, DocumentClassifier
+from app.metadata_store import MetadataStore
+from app.text_features import Vocabulary, tokenize
+
+CORPUS = {
+    "d1": ("banque", "Relevé de compte : solde banque", ["finance"]),
+    "d2": ("banque", "Virement banque vers compte épargne", []),
+    "d3": ("impots", "Avis d'impôt sur le revenu", ["fisc"]),
+    "d4": ("impots", "Impôt taxe foncière, revenu cadastral", ["fisc", "finance"]),
+    "d5": ("import", "Compte revenu impôt à classer", []),  # Dossier exclu : pas un exemple
+}
+QUERY = "Compte banque, impôt foncier, taxe foncière sur le revenu"
+
+
+@pytest.fixture
+def classifier(tmp_path):
+    store = MetadataStore(tmp_path / "metadata.json")
+    with store.transaction() as txn:
+        for doc_id, (folder, text, tags) in CORPUS.items():
+            txn.set("ids", doc_id, {"parent": folder, "name": f"{doc_id}.pdf", "ino": None})
+            txn.set("ocr_text", doc_id, {"text": text})
+            if tags:
+                txn.set("item_tags", doc_id, tags)
+    classifier = DocumentClassifier(store, Vocabulary(), lambda entry: entry["text"], lambda f: f == "import")
+    classifier.refresh()
+    return classifier
+
+
+def hand_computed():
+    """Bayésien naïf multinomial écrit terme à terme"""
+    examples = {k: v for k, v in CORPUS.items() if v[0] != "import"}
+    vocab = {t for _, text, _ in CORPUS.values() for t in tokenize(text)}
+    size = len(vocab)
+    query = Counter(t for t in tokenize(QUERY) if t in vocab)
+    length = sum(query.values())
+
+    def counts(docs):
+        total = Counter()
+        for _, text, _ in docs:
+            total.update(tokenize(text))
+        return total
+
+    def log_likelihood(counter, term):
+        return math.log((counter[term] + ALPHA) / (sum(counter.values()) + ALPHA * size))
+
+    folders = {}
+    for folder in ("banque", "impots"):
+        docs = [v for v in examples.values() if v[0] == folder]
+        counter = counts(docs)
+        prior = math.log(len(docs) / len(examples))
+        folders[folder] = sum(n * log_likelihood(counter, t) for t, n in query.items()) / length + prior
+    top = max(folders.values())
+    norm = sum(math.exp(s - top) for s in folders.values())
+    folders = {f: math.exp(s - top) / norm for f, s in folders.items()}
+
+    background = counts(CORPUS.values())  # Le fond inclut les documents non classés
+    tags = {}
+    for tag in ("finance", "fisc"):
+        counter = counts([v for v in CORPUS.values() if tag in v[2]])
+        tags[tag] = sum(
+            n * (log_likelihood(counter, t) - log_likelihood(background, t)) for t, n in query.items()
+        ) / length
+    return folders, tags
+
+
+def test_suggestions_match_hand_computed_naive_bayes(classifier):
+    folders, tags = hand_computed()
+    suggestion = classifier.suggest([QUERY])[0]
+
+    assert [f for f, _ in suggestion["folders"]] == sorted(folders, key=folders.get, reverse=True)
+    for folder, score in suggestion["folders"]:
+        assert score == pytest.approx(folders[folder], abs=1e-4)
+    expected_tags = {t: s for t, s in tags.items() if s > 0}
+    assert expected_tags and len(expected_tags) < len(tags)
+    assert {t for t, _ in suggestion["tags"]} == set(expected_tags)
+    for tag, score in suggestion["tags"]:
+        assert score == pytest.approx(expected_tags[tag], abs=1e-4)
+
+
+def test_batch_scoring_equals_one_by_one(classifier):
+    texts = [QUERY, "banque solde", "taxe foncière", "mot inconnu"]
+    assert classifier.suggest(texts) == [classifier.suggest([t])[0] for t in texts]
+    assert classifier.suggest(["mot inconnu"])[0] == {"folders": [], "tags": []}
+
+
+def test_moved_document_is_recounted(classifier):
+    before = classifier.suggest(["avis revenu"])[0]["folders"][0]
+    with classifier.store.transaction() as txn:
+        for doc_id in ("d3", "d4"):
+            txn.set("ids", doc_id, {"parent": "banque", "name": f"{doc_id}.pdf", "ino": None})
+    assert classifier.refresh() == 2
+    assert before[0] == "impots"
+    assert classifier.suggest(["avis revenu"])[0]["folders"] == [("banque", 1.0)]
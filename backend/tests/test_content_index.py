@@ -0,0 +1,89 @@
+"""
+Tests de l'index de contenu : jamais de faux négatif, filtrage effectif, suivi des métadonnées
+"""
+
+import random
+
+import pytest
+
+from app.content_index import ContentIndex
+from app.index_snapshot import read_snapshot, write_snapshot
+from app.metadata_store import MetadataStore
+
+WORDS = "facture relevé compte banque impôts échéance assurance contrat loyer salaire électricité".split()
+
+
+@pytest.fixture
+def store(tmp_path):
+    return MetadataStore(tmp_path / "metadata.json")
+
+
+def fill(store, texts):
+    with store.transaction() as txn:
+        for item_id, text in texts.items():
+            txn.set("ocr_text", item_id, {"text_ref": f"ref-{item_id}", "text": text})
+
+
+def load_text(entry):
+    return entry["text"]
+
+
+@pytest.fixture
+def texts():
+    rng = random.Random(3)
+    return {f"d{i}": " ".join(rng.choice(WORDS) + str(rng.randint(0, 99)) for _ in range(60)) for i in range(200)}
+
+
+def test_matching_texts_are_never_ruled_out(store, texts):
+    fill(store, texts)
+    index = ContentIndex(store, load_text)
+    assert index.refresh() == len(texts)
+
+    rng = random.Random(5)
+    for _ in range(200):
+        text = rng.choice(list(texts.values()))
+        start = rng.randrange(len(text) - 12)
+        query = text[start:start + rng.randint(3, 12)].lower()
+        ruled_out = index.ruled_out(query)
+        assert all(f"ref-{k}" not in ruled_out for k, t in texts.items() if query in t.lower())
+
+
+def test_unrelated_query_rules_out_every_text(store, texts):
+    fill(store, texts)
+    index = ContentIndex(store, load_text)
+    index.refresh()
+    assert len(index.ruled_out("quittance")) == len(texts)
+    assert index.ruled_out("qu") == set()  # Trop court pour être filtré
+
+
+def test_refresh_follows_metadata_changes(store, texts):
+    fill(store, {"a": "facture eau", "b": "contrat gaz"})
+    index = ContentIndex(store, load_text)
+    index.refresh()
+    assert index.ruled_out("gaz") == {"ref-a"}
+
+    with store.transaction() as txn:
+        txn.delete("ocr_text", "a")
+    fill(store, {"c": "facture gaz"})
+    assert index.refresh() == 2
+    assert index.ruled_out("gaz") == set()
+    assert index.ruled_out("facture") == {"ref-b"}
+
+
+def test_snapshot_round_trip(store, texts, tmp_path):
+    fill(store, texts)
+    index = ContentIndex(store, load_text)
+    index.refresh()
+    with store.transaction() as txn:
+        txn.delete("ocr_text", "d0")
+    index.refresh()
+
+    arrays, state = index.snapshot_state()
+    write_snapshot(tmp_path / "content.idx", "content", "v1", arrays, state)
+    restored = ContentIndex(store, load_text)
+    restored.restore_state(*read_snapshot(tmp_path / "content.idx", "content", "v1", verify=True))
+    assert restored.ruled_out("facture") == index.ruled_out("facture")
+    assert restored.refresh() == 0
+    fill(store, {"new": "quittance de loyer"})
+    assert restored.refresh() == 1  # La matrice projetée est copiée avant d'être agrandie
+    assert "ref-new" not in restored.ruled_out("quittance")
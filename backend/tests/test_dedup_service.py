@@ -0,0 +1,118 @@
+"""
+Tests de la détection des doublons : empreintes, groupes exacts et quasi-doublons
+"""
+
+import hashlib
+import random
+
+import pytest
+from PIL import Image, ImageDraw
+
+from app.dedup_service import HashIndex, compute_hashes, hamming, perceptual_hash, sha256_file
+from app.metadata_store import MetadataStore
+
+
+@pytest.fixture
+def store(tmp_path):
+    return MetadataStore(tmp_path / "metadata.json")
+
+
+def drawing(size):
+    image = Image.new("L", size, 255)
+    draw = ImageDraw.Draw(image)
+    draw.rectangle((size[0] // 10, size[1] // 8, size[0] // 2, size[1] // 3), fill=0)
+    draw.ellipse((size[0] // 2, size[1] // 2, size[0] - 5, size[1] - 5), fill=90)
+    return image
+
+
+def test_sha256_file_streams_whole_content(tmp_path):
+    path = tmp_path / "doc.bin"
+    data = random.Random(1).randbytes(3 * 1024 * 1024 + 17)
+    path.write_bytes(data)
+    assert sha256_file(path) == hashlib.sha256(data).hexdigest()
+
+
+def test_rescan_has_close_perceptual_hash(tmp_path):
+    drawing((800, 1100)).save(tmp_path / "scan.png")
+    drawing((1600, 2200)).convert("RGB").save(tmp_path / "rescan.jpg", quality=70)
+    Image.new("L", (800, 1100), 255).save(tmp_path / "blank.tif")
+
+    scan, rescan = perceptual_hash(tmp_path / "scan.png"), perceptual_hash(tmp_path / "rescan.jpg")
+    assert hamming(scan, rescan) <= 6
+    assert hamming(scan, perceptual_hash(tmp_path / "blank.tif")) > 6
+    assert perceptual_hash(tmp_path / "notes.txt") is None
+
+    hashes = compute_hashes(tmp_path / "scan.png")
+    assert hashes["phash"] == f"{scan:016x}" and hashes["size"] == (tmp_path / "scan.png").stat().st_size
+
+
+def put(store, entries):
+    with store.transaction() as txn:
+        for item_id, (sha, phash) in entries.items():
+            txn.set("hashes", item_id, {"sha256": sha, "phash": f"{phash:016x}" if phash is not None else None})
+
+
+def test_exact_groups_follow_metadata_changes(store):
+    index = HashIndex(store)
+    put(store, {"a": ("s1", None), "b": ("s1", None), "c": ("s2", None)})
+    assert index.exact("s1") == ["a", "b"]
+    assert index.exact_groups() == [["a", "b"]]
+
+    with store.transaction() as txn:
+        txn.delete("hashes", "b")
+    assert index.exact_groups() == []
+
+
+def test_near_groups_exclude_exact_duplicates(store):
+    index = HashIndex(store)
+    base = 0x0123456789ABCDEF
+    put(store, {
+        "scan": ("s1", base),
+        "rescan": ("s2", base ^ 0b10110),  # 3 bits de différence
+        "copy": ("s1", base),  # Doublon exact de "scan"
+        "other": ("s3", ~base & (2**64 - 1)),
+    })
+    assert sorted(index.near(base)) == [("copy", 0), ("rescan", 3), ("scan", 0)]
+    # "scan" et "copy" ne sont reliés que par leur proximité commune avec "rescan"
+    assert index.near_groups() == [["copy", "rescan", "scan"]]
+
+    with store.transaction() as txn:
+        txn.delete("hashes", "rescan")
+    assert index.near_groups() == []
+
+
+def brute_force_groups(entries, max_distance):
+    ids = sorted(entries)
+    parent = {i: i for i in ids}
+
+    def find(x):
+        while parent[x] != x:
+            x = parent[x]
+        return x
+
+    for k, a in enumerate(ids):
+        for b in ids[k + 1:]:
+            (sa, ha), (sb, hb) = entries[a], entries[b]
+            if sa != sb and hamming(ha, hb) <= max_distance:
+                parent[find(b)] = find(a)
+    groups = {}
+    for i in ids:
+        groups.setdefault(find(i), []).append(i)
+    return sorted(sorted(g) for g in groups.values() if len(g) > 1)
+
+
+@pytest.mark.parametrize("max_distance", [0, 3, 6, 7])
+def test_near_groups_match_brute_force(store, max_distance):
+    rng = random.Random(max_distance)
+    entries = {}
+    for cluster in range(40):
+        center = rng.getrandbits(64)
+        for member in range(rng.randint(1, 4)):
+            flips = rng.sample(range(64), rng.randint(0, 9))
+            value = center
+            for bit in flips:
+                value ^= 1 << bit
+            entries[f"d{cluster}-{member}"] = (f"sha{rng.randint(0, 150)}", value)
+    put(store, entries)
+
+    assert sorted(HashIndex(store).near_groups(max_distance)) == brute_force_groups(entries, max_distance)
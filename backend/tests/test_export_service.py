@@ -0,0 +1,58 @@
+"""
+Tests de l'export ZIP en flux : contenu, fichiers illisibles, lecture interrompue
+"""
+
+import builtins
+import csv
+import io
+import zipfile
+
+import pytest
+
+from app.export_service import INDEX_NAME, ExportAborted, stream_zip
+
+
+@pytest.fixture
+def files(tmp_path):
+    for name in ("a.pdf", "b.txt"):
+        (tmp_path / name).write_bytes(name.encode() * 500)
+    return [(tmp_path / "a.pdf", "Dossier/a.pdf"), (tmp_path / "absent.txt", "Dossier/absent.txt"),
+            (tmp_path / "b.txt", "Dossier/b.txt")]
+
+
+def index_row(path, arcname):
+    return [arcname, str(path.stat().st_size), "", "", ""]
+
+
+def test_archive_contains_files_and_index(files):
+    archive = zipfile.ZipFile(io.BytesIO(b"".join(stream_zip(iter(files), index_row))))
+    assert archive.namelist() == ["Dossier/a.pdf", "Dossier/b.txt", INDEX_NAME]
+    assert archive.getinfo("Dossier/a.pdf").compress_type == zipfile.ZIP_STORED
+    assert archive.getinfo("Dossier/b.txt").compress_type == zipfile.ZIP_DEFLATED
+    assert archive.read("Dossier/b.txt") == b"b.txt" * 500
+
+    rows = list(csv.reader(io.StringIO(archive.read(INDEX_NAME).decode("utf-8-sig")), delimiter=";"))
+    assert rows[1][:2] == ["Dossier/a.pdf", "2500"] and rows[1][-1] == ""
+    # Fichier ignoré : signalé dans l'index, sans le chemin du serveur
+    assert rows[2][0] == "Dossier/absent.txt" and rows[2][-1] == "No such file or directory"
+
+
+def test_read_error_aborts_export(files, monkeypatch):
+    real_open = builtins.open
+
+    class FailingFile(io.RawIOBase):
+        def readinto(self, buffer):
+            raise OSError(5, "Input/output error")
+
+    def fake_open(path, mode="r", *args, **kwargs):
+        if str(path).endswith("b.txt") and "b" in mode:
+            return FailingFile()
+        return real_open(path, mode, *args, **kwargs)
+
+    monkeypatch.setattr(builtins, "open", fake_open)
+    chunks = []
+    with pytest.raises(ExportAborted, match="Dossier/b.txt"):
+        for chunk in stream_zip(iter(files), index_row):
+            chunks.append(chunk)
+    with pytest.raises(zipfile.BadZipFile):
+        zipfile.ZipFile(io.BytesIO(b"".join(chunks)))  # Pas d'archive tronquée d'apparence valide
@@ -0,0 +1,58 @@
+"""
+Tests des facettes : bitsets construits en une passe, filtres et comptes
+"""
+
+import random
+
+from app.facet_service import FACETS, FacetSet, bitset, facet_values
+
+
+def make_items(count, seed=7):
+    rng = random.Random(seed)
+    return [{
+        "type": rng.choice(["file", "folder"]),
+        "extension": rng.choice([".pdf", ".PDF", ".jpg", None]),
+        "tags": rng.sample(["banque", "impôts", "santé", "maison"], rng.randint(0, 3)),
+        "path": f"{rng.choice(['Perso', 'Pro', 'Maison'])}/doc{i}",
+        "modified_at": f"{rng.randint(2019, 2024)}-01-01T00:00:00",
+    } for i in range(count)]
+
+
+def test_bitset():
+    assert bitset([0]) == 1
+    assert bitset([1, 3, 64]) == (1 << 1) | (1 << 3) | (1 << 64)
+    assert bitset([5, 5]) == 1 << 5  # Étiquette répétée
+
+
+def test_postings_match_item_by_item_construction():
+    items = make_items(3000)
+    facet_set = FacetSet(items)
+
+    expected = {facet: {} for facet in FACETS}
+    for ordinal, item in enumerate(items):
+        for facet, values in facet_values(item).items():
+            for value in values:
+                expected[facet][value] = expected[facet].get(value, 0) | (1 << ordinal)
+    assert facet_set.postings == expected
+    assert facet_set.all.bit_count() == 3000
+
+
+def test_select_counts_and_iteration():
+    items = make_items(500)
+    facet_set = FacetSet(items)
+    filters = {"extension": ".pdf", "tag": "banque", "year": None}
+
+    matching = [i for i in items if (i["extension"] or "").lower() == ".pdf" and "banque" in i["tags"]]
+    assert list(facet_set.iter_items(facet_set.select(filters))) == matching
+
+    counts = facet_set.counts(filters)
+    pdf_items = [i for i in items if (i["extension"] or "").lower() == ".pdf"]
+    tag_counts = {c["value"]: c["count"] for c in counts["tag"]}  # Sous le seul filtre d'extension
+    assert tag_counts == {t: sum(t in i["tags"] for i in pdf_items) for t in ["banque", "impôts", "santé", "maison"]}
+    assert sum(c["count"] for c in counts["year"]) == len(matching)
+
+
+def test_empty_results():
+    facet_set = FacetSet([])
+    assert facet_set.all == 0
+    assert facet_set.counts({}) == {facet: [] for facet in FACETS}
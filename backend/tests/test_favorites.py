@@ -0,0 +1,30 @@
+"""
+Tests des favoris partagés entre workers (deux processus sur la même GED)
+"""
+
+import multiprocessing
+import os
+
+from app.metadata_store import MetadataStore
+
+
+def add_favorites(root, prefix, count):
+    os.environ["GED_ROOT"] = root
+    os.environ["GED_INGEST_DIR"] = ""
+    from app import main
+    for i in range(count):
+        main.add_favorite_to_metadata(f"{prefix}{i}")
+    main.remove_favorites_from_metadata([f"{prefix}0"])
+
+
+def test_concurrent_favorite_adds_are_kept(tmp_path):
+    context = multiprocessing.get_context("spawn")  # Chaque worker a son propre MetadataStore
+    workers = [context.Process(target=add_favorites, args=(str(tmp_path), p, 30)) for p in "ab"]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join(60)
+        assert worker.exitcode == 0
+
+    store = MetadataStore(tmp_path / ".ged_metadata.json")  # METADATA_FILE de main
+    assert sorted(store.view()["favorites"]) == sorted(f"{p}{i}" for p in "ab" for i in range(1, 30))
@@ -0,0 +1,69 @@
+"""
+Tests des champs structurés : extraction (dates, montants, IBAN, SIRET) et index par plage
+"""
+
+from datetime import date
+
+import pytest
+
+from app.field_service import FieldIndex, extract_fields, siret_is_valid
+from app.metadata_store import MetadataStore
+
+INVOICE = """Facture du 1er mars 2024, échéance 15/04/24. Total : 1 234,56 € dont EUR 12.50 et 1.234 €.
+Date invalide 31/02/2024, 42 pommes. IBAN FR76 3000 6000 0112 3456 7890 189 ou FR76 3000 6000 0112 3456 7890 188.
+SIRET 732 829 320 00074, SIRET 73282932000075"""
+
+
+def test_extract_fields_from_french_invoice():
+    assert extract_fields(INVOICE) == {
+        "dates": ["2024-03-01", "2024-04-15"],  # 31/02 écarté
+        "amounts": [12.5, 1234.0, 1234.56],  # "42" sans mention euro ignoré
+        "ibans": ["FR7630006000011234567890189"],  # Clé modulo 97 invalide écartée
+        "sirets": ["73282932000074"],  # Clé de Luhn invalide écartée
+    }
+
+
+@pytest.mark.parametrize("siret, valid", [
+    ("73282932000074", True),
+    ("73282932000075", False),
+    ("35600000000048", False),
+    ("35600000000001", True),  # La Poste : somme des chiffres multiple de 5
+    ("00000000000000", False),
+])
+def test_siret_validation(siret, valid):
+    assert siret_is_valid(siret) is valid
+
+
+@pytest.fixture
+def store(tmp_path):
+    store = MetadataStore(tmp_path / "metadata.json")
+    with store.transaction() as txn:
+        txn.set("fields", "a", {"dates": ["2023-12-31", "2024-03-01"], "amounts": [99.99], "ibans": [], "sirets": []})
+        txn.set("fields", "b", {"dates": ["2024-06-15"], "amounts": [100.0, 1500.0],
+                                "ibans": ["FR7630006000011234567890189"], "sirets": []})
+        txn.set("fields", "c", {"dates": [], "amounts": [], "ibans": [], "sirets": ["73282932000074"]})
+    return store
+
+
+def test_range_queries_are_inclusive_and_combined(store):
+    index = FieldIndex(store)
+    assert index.query(date_from=date(2024, 3, 1), date_to=date(2024, 6, 15)) == {"a", "b"}
+    assert index.query(date_from=date(2024, 3, 2)) == {"b"}
+    assert index.query(amount_min=100) == {"b"}
+    assert index.query(amount_max=99.99) == {"a"}
+    assert index.query(date_to=date(2024, 12, 31), amount_min=1000) == {"b"}
+    assert index.query(iban="fr76 3000 6000 0112 3456 7890 189") == {"b"}
+    assert index.query(siret="732 829 320 00074") == {"c"}
+    assert index.query() == {"a", "b", "c"}
+
+
+def test_index_follows_metadata_changes(store):
+    index = FieldIndex(store)
+    assert index.query(amount_min=1000) == {"b"}
+    with store.transaction() as txn:
+        txn.set("fields", "c", {"dates": [], "amounts": [2000.0], "ibans": ["FR7630006000011234567890189"], "sirets": []})
+        txn.delete("fields", "b")
+    assert index.query(amount_min=1000) == {"c"}
+    assert index.query(iban="FR7630006000011234567890189") == {"c"}
+    assert index.query(siret="73282932000074") == set()
+    assert index.get("b") is None and index.get("c")["amounts"] == [2000.0]
@@ -0,0 +1,91 @@
+"""
+Tests des statistiques de dossiers : cumuls, consultation sans écriture, rapprochement incrémental
+"""
+
+import os
+import time
+
+import pytest
+
+from app.folder_stats import FolderStats
+from app.id_registry import IdRegistry
+from app.metadata_store import MetadataStore
+
+
+def is_hidden(name):
+    return name.startswith(".")
+
+
+@pytest.fixture
+def root(tmp_path):
+    for a in range(2):
+        for b in range(3):
+            folder = tmp_path / f"A{a}" / f"B{b}" / "C"
+            folder.mkdir(parents=True)
+            for f in range(4):
+                (folder / f"f{f}.txt").write_bytes(b"x" * 100)
+    (tmp_path / ".ged_store").mkdir()
+    return tmp_path
+
+
+@pytest.fixture
+def registry(root):
+    return IdRegistry(MetadataStore(root / ".ged_store" / "metadata.json"), root)
+
+
+@pytest.fixture
+def stats(root, registry):
+    return FolderStats(registry.store, root, registry.id_for_path, registry.lookup, registry.children, is_hidden)
+
+
+def totals(stats, registry, path):
+    summary = stats.summary(registry.lookup(path), path, path.stat().st_mtime_ns)
+    return summary["total_size"], summary["documents_count"]
+
+
+def touch_later(path):
+    """Écrit un fichier avec une mtime de dossier distincte (résolution grossière de certains FS)"""
+    time.sleep(0.01)
+    path.write_bytes(b"y" * 1000)
+    st = path.parent.stat()
+    os.utime(path.parent, ns=(st.st_atime_ns, st.st_mtime_ns + 1_000_000))
+
+
+def test_reconcile_computes_recursive_totals(root, registry, stats):
+    rescanned = stats.reconcile()
+    assert len(rescanned) == 1 + 2 * (1 + 3 * 2)  # Racine, armoires, B*, C
+    assert totals(stats, registry, root / "A0") == (1200, 12)
+    assert totals(stats, registry, root / "A1" / "B2") == (400, 4)
+
+
+def test_reconcile_skips_unchanged_directories(root, registry, stats, monkeypatch):
+    stats.reconcile()
+    listed = []
+    scandir = os.scandir
+    monkeypatch.setattr(os, "scandir", lambda path: (listed.append(path), scandir(path))[1])
+    assert stats.reconcile() == [root]
+    assert listed == []
+
+    touch_later(root / "A1" / "B0" / "C" / "nouveau.txt")
+    assert stats.reconcile() == [root, root / "A1" / "B0" / "C"]
+    assert totals(stats, registry, root / "A1") == (2200, 13)
+
+
+def test_summary_does_not_write(root, registry, stats):
+    stats.reconcile()
+    seq = registry.store.seq
+    touch_later(root / "A0" / "B1" / "C" / "nouveau.txt")
+
+    assert totals(stats, registry, root / "A0" / "B1" / "C") == (400, 4)  # Valeur connue
+    assert registry.store.seq == seq
+    assert stats.refresh_stale() == 1
+    assert totals(stats, registry, root / "A0" / "B1" / "C") == (1400, 5)
+    assert totals(stats, registry, root / "A0") == (2200, 13)  # Écart propagé
+    assert stats.refresh_stale() == 0
+
+
+def test_refresh_after_api_change_propagates(root, registry, stats):
+    stats.reconcile()
+    (root / "A0" / "B0" / "C" / "f0.txt").unlink()
+    stats.refresh([root / "A0" / "B0" / "C"])
+    assert totals(stats, registry, root / "A0") == (1100, 11)
@@ -0,0 +1,179 @@
+"""
+Tests des tâches de fond : suppression, déplacement, annulation et reprise après arrêt
+"""
+
+import errno
+import os
+import threading
+import time
+
+import pytest
+
+from app import fs_jobs
+from app.fs_jobs import Job, JobManager
+
+
+@pytest.fixture
+def root(tmp_path):
+    for name in ("A", "B"):
+        (tmp_path / name).mkdir()
+    folder = tmp_path / "A" / "Dossier"
+    (folder / "sous").mkdir(parents=True)
+    for i in range(10):
+        (folder / "sous" / f"f{i}.txt").write_bytes(b"x" * 1000)
+    (folder / "note.txt").write_text("note")
+    return tmp_path
+
+
+@pytest.fixture
+def manager(root, monkeypatch):
+    monkeypatch.setattr(fs_jobs, "PROGRESS_INTERVAL", 0.0)
+    manager = JobManager(root)
+    yield manager
+    manager.stop()
+
+
+def wait(manager, job_id, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        job = manager.get(job_id)
+        if job["state"] not in fs_jobs.ACTIVE_STATES:
+            return job
+        time.sleep(0.01)
+    raise AssertionError(f"Tâche {job_id} toujours active")
+
+
+def test_delete_removes_item_at_once_then_purges(manager, root):
+    job = manager.delete(root / "A" / "Dossier", "id1", files_total=11)
+    assert not (root / "A" / "Dossier").exists()  # Retiré avant la réponse
+    assert job["kind"] == "delete" and not job["cancellable"]
+    assert "work_path" not in job
+
+    job = wait(manager, job["id"])
+    assert job["state"] == "completed"
+    assert job["files_done"] == 11 and job["bytes_done"] == 10 * 1000 + 4
+    assert os.listdir(root / fs_jobs.TRASH_DIR) == []
+
+
+def test_delete_across_volumes_uses_sibling_trash(manager, root, monkeypatch):
+    real_rename = os.rename
+
+    def rename(source, target):
+        if fs_jobs.TRASH_DIR in str(target):
+            raise OSError(errno.EXDEV, "autre volume")
+        return real_rename(source, target)
+
+    monkeypatch.setattr(fs_jobs.os, "rename", rename)
+    job = manager.delete(root / "A" / "Dossier", "id1")
+    assert not (root / "A" / "Dossier").exists()
+    assert wait(manager, job["id"])["state"] == "completed"
+    assert os.listdir(root / "A") == []
+
+
+def test_move_copies_then_swaps(manager, root):
+    done = threading.Event()
+    job = manager.move(root / "A" / "Dossier", root / "B" / "Dossier", "id1", done.set, files_total=11)
+    job = wait(manager, job["id"])
+    assert job["state"] == "completed" and done.is_set()
+    assert not (root / "A" / "Dossier").exists()
+    assert sorted(os.listdir(root / "B" / "Dossier" / "sous")) == sorted(f"f{i}.txt" for i in range(10))
+    assert os.listdir(root / "B") == ["Dossier"]
+
+
+def test_cancelled_move_keeps_original(manager, root, monkeypatch):
+    started = threading.Event()
+    copy_file = JobManager._copy_file
+
+    def slow_copy(self, source, target, progress):
+        started.set()
+        time.sleep(0.05)
+        copy_file(self, source, target, progress)
+
+    monkeypatch.setattr(JobManager, "_copy_file", slow_copy)
+    on_done = []
+    job = manager.move(root / "A" / "Dossier", root / "B" / "Dossier", "id1", lambda: on_done.append(1))
+    assert started.wait(5)
+    assert manager.cancel(job["id"])["id"] == job["id"]
+
+    job = wait(manager, job["id"])
+    assert job["state"] == "cancelled" and on_done == []
+    assert len(os.listdir(root / "A" / "Dossier" / "sous")) == 10
+    assert os.listdir(root / "B") == []  # Copie partielle effacée
+    with pytest.raises(ValueError):
+        manager.cancel(job["id"])
+
+
+def test_purge_is_not_cancellable(manager, root, monkeypatch):
+    release = threading.Event()
+    unlink = JobManager._unlink
+    monkeypatch.setattr(JobManager, "_unlink", lambda self, p, pr: (release.wait(5), unlink(self, p, pr)))
+    job = manager.delete(root / "A" / "Dossier", "id1")
+    with pytest.raises(ValueError):
+        manager.cancel(job["id"])
+    release.set()
+    assert wait(manager, job["id"])["state"] == "completed"
+    assert manager.cancel("inconnue") is None
+
+
+def test_interrupted_jobs_are_resumed(root):
+    """Tâches restées actives après un arrêt : la purge continue, la copie partielle est effacée"""
+    stale = JobManager(root)
+    trashed = root / fs_jobs.TRASH_DIR / "j1" / "Dossier"
+    trashed.parent.mkdir(parents=True)
+    os.rename(root / "A" / "Dossier", trashed)
+    partial = root / "B" / f"{fs_jobs.MOVE_TMP_PREFIX}j2"
+    (partial / "sous").mkdir(parents=True)
+    (partial / "sous" / "f0.txt").write_bytes(b"x")
+    stale._save(Job("j1", "delete", "id1", "A/Dossier", state="running", phase="purge", work_path=str(trashed)))
+    stale._save(Job("j2", "move", "id2", "A/Autre", "B/Autre", state="running", phase="copy",
+                    cancellable=True, work_path=str(partial)))
+
+    manager = JobManager(root)
+    try:
+        # Aucun worker ne les verrouille : vues comme interrompues
+        assert {j["id"]: j["state"] for j in manager.list()} == {"j1": "interrupted", "j2": "interrupted"}
+        assert manager.resume() == 2
+        assert wait(manager, "j1")["state"] == "completed"
+        assert wait(manager, "j2")["state"] == "interrupted"
+        assert os.listdir(root / fs_jobs.TRASH_DIR) == []
+        assert os.listdir(root / "B") == []
+        assert manager.resume() == 0
+    finally:
+        manager.stop()
+
+
+def test_move_stopped_after_swap_replays_on_done(root):
+    """Arrêt entre la bascule et la fin de on_done : la reprise rejoue on_done puis efface l'original"""
+    trashed = root / fs_jobs.TRASH_DIR / "j3" / "Dossier"
+    trashed.parent.mkdir(parents=True)
+    os.rename(root / "A" / "Dossier", trashed)
+    (root / "B" / "Dossier").mkdir()  # Copie déjà en place
+    JobManager(root)._save(Job("j3", "move", "id3", "A/Dossier", "B/Dossier", state="running",
+                               phase="finish", work_path=str(trashed)))
+
+    finished = []
+    manager = JobManager(root)
+    try:
+        assert manager.resume(finished.append) == 1
+        job = wait(manager, "j3")
+        assert job["state"] == "completed" and job["phase"] == "cleanup"
+        assert [(j.item_id, j.path, j.destination) for j in finished] == [("id3", "A/Dossier", "B/Dossier")]
+        assert os.listdir(root / fs_jobs.TRASH_DIR) == []
+    finally:
+        manager.stop()
+
+
+def test_running_job_is_not_resumed_by_another_worker(manager, root, monkeypatch):
+    release = threading.Event()
+    unlink = JobManager._unlink
+    monkeypatch.setattr(JobManager, "_unlink", lambda self, p, pr: (release.wait(5), unlink(self, p, pr)))
+    job = manager.delete(root / "A" / "Dossier", "id1")
+
+    other = JobManager(root)
+    try:
+        assert other.get(job["id"])["state"] in fs_jobs.ACTIVE_STATES  # Verrouillée par son worker
+        assert other.resume() == 0
+    finally:
+        release.set()
+        other.stop()
+    assert wait(manager, job["id"])["state"] == "completed"
@@ -0,0 +1,100 @@
+"""
+Tests du registre d'IDs : stabilité aux renommages et rattachement par inode
+"""
+
+import os
+
+import pytest
+
+from app.id_registry import IdRegistry
+from app.metadata_store import MetadataStore
+
+
+@pytest.fixture
+def root(tmp_path):
+    root = tmp_path / "ged"
+    (root / "Banque" / "Releves").mkdir(parents=True)
+    (root / "Banque" / "Releves" / "janvier.pdf").write_bytes(b"%PDF")
+    (root / ".ged_store").mkdir()
+    return root
+
+
+@pytest.fixture
+def registry(root):
+    return IdRegistry(MetadataStore(root / ".ged_store" / "metadata.json"), root)
+
+
+def test_ids_are_stable_and_resolvable(registry, root):
+    doc = root / "Banque" / "Releves" / "janvier.pdf"
+    item_id = registry.id_for_path(doc)
+    assert registry.id_for_path(doc) == item_id
+    assert registry.path_for_id(item_id) == doc
+    assert registry.lookup(root / "Banque" / "inconnu") is None
+
+
+def test_rename_through_api_keeps_descendant_ids(registry, root):
+    doc_id = registry.id_for_path(root / "Banque" / "Releves" / "janvier.pdf")
+    folder_id = registry.lookup(root / "Banque")
+    os.rename(root / "Banque", root / "Banques")
+    registry.rename(folder_id, "Banques")
+    assert registry.path_for_id(doc_id) == root / "Banques" / "Releves" / "janvier.pdf"
+
+
+def test_out_of_band_rename_reattaches_by_inode(registry, root):
+    """Renommage hors de l'API (SMB, File Station) : même inode, même parent"""
+    doc_id = registry.id_for_path(root / "Banque" / "Releves" / "janvier.pdf")
+    os.rename(root / "Banque" / "Releves" / "janvier.pdf", root / "Banque" / "Releves" / "2024-01.pdf")
+    assert registry.id_for_path(root / "Banque" / "Releves" / "2024-01.pdf") == doc_id
+
+
+def test_out_of_band_move_reattaches_by_inode(registry, root):
+    """Déplacement hors de l'API : même inode, même nom"""
+    folder_id = registry.id_for_path(root / "Banque" / "Releves")
+    (root / "Archives").mkdir()
+    os.rename(root / "Banque" / "Releves", root / "Archives" / "Releves")
+    assert registry.id_for_path(root / "Archives" / "Releves") == folder_id
+
+
+def test_same_inode_with_old_path_present_gets_new_id(registry, root):
+    """Lien physique (même inode, même nom) : l'ancien chemin existe encore, pas de rattachement"""
+    doc = root / "Banque" / "Releves" / "janvier.pdf"
+    doc_id = registry.id_for_path(doc)
+    other = root / "Banque" / "janvier.pdf"
+    os.link(doc, other)
+    assert registry.id_for_path(other) != doc_id
+    assert registry.path_for_id(doc_id) == doc
+
+
+def test_register_tree_lists_only_given_directories(registry, root):
+    assert registry.register_tree(lambda name: name.startswith(".")) == 3
+    (root / "Banque" / "Releves" / "fevrier.pdf").write_bytes(b"%PDF")
+    (root / "Banque" / "note.txt").write_text("x")
+    assert registry.register_tree(lambda name: name.startswith("."), [root / "Banque"]) == 1
+    assert registry.lookup(root / "Banque" / "note.txt") is not None
+    assert registry.lookup(root / "Banque" / "Releves" / "fevrier.pdf") is None
+
+
+def test_peek_never_writes_and_queues_unknown_paths(registry, root):
+    doc = root / "Banque" / "Releves" / "janvier.pdf"
+    (root / "Banque" / "Releves" / "fevrier.pdf").write_bytes(b"%PDF")
+    seq = registry.store.seq
+    assert registry.peek(doc) is None
+    assert registry.store.seq == seq
+    assert registry.wait_pending(0)
+
+    assert registry.register_pending(lambda name: False) == 2  # Contenu du dossier (ancêtres enregistrés au passage)
+    assert not registry.wait_pending(0)
+    assert registry.peek(doc) is not None
+    assert registry.lookup(root / "Banque" / "Releves" / "fevrier.pdf") is not None
+    assert registry.register_pending(lambda name: False) == 0
+
+
+def test_cached_paths_follow_renames_from_another_worker(registry, root):
+    doc = root / "Banque" / "Releves" / "janvier.pdf"
+    doc_id = registry.id_for_path(doc)
+    assert registry.path_for_id(doc_id) == doc  # Mis en cache
+
+    other = IdRegistry(MetadataStore(root / ".ged_store" / "metadata.json"), root)
+    os.rename(root / "Banque" / "Releves", root / "Banque" / "Releves2023")
+    other.rename(other.lookup(root / "Banque" / "Releves"), "Releves2023")
+    assert registry.path_for_id(doc_id) == root / "Banque" / "Releves2023" / "janvier.pdf"
@@ -0,0 +1,167 @@
+"""
+Tests des instantanés d'index : aller-retour, détection des fichiers abîmés, restauration groupée
+"""
+
+import threading
+
+import numpy as np
+import pytest
+
+from app.index_snapshot import SnapshotError, SnapshotManager, read_snapshot, write_snapshot
+
+
+@pytest.fixture
+def arrays():
+    return {
+        "counts": np.arange(1000, dtype=np.int32),
+        "weights": np.linspace(0, 1, 21).reshape(7, 3),
+        "empty": np.zeros(0, dtype=np.float64),
+    }
+
+
+def test_round_trip(tmp_path, arrays):
+    path = tmp_path / "text.idx"
+    write_snapshot(path, "text", "v1", arrays, {"names": ["a", "é"]})
+
+    restored, state = read_snapshot(path, "text", "v1", verify=True)
+    assert state == {"names": ["a", "é"]}
+    assert restored.keys() == arrays.keys()
+    for name, array in arrays.items():
+        assert restored[name].dtype == array.dtype
+        np.testing.assert_array_equal(restored[name], array)
+    assert not restored["counts"].flags.writeable  # Vue sur le fichier projeté
+
+
+def test_truncated_file_is_rejected(tmp_path, arrays):
+    path = tmp_path / "text.idx"
+    write_snapshot(path, "text", "v1", arrays, {})
+    path.write_bytes(path.read_bytes()[:-50])
+    with pytest.raises(SnapshotError, match="tronqué"):
+        read_snapshot(path, "text", "v1")
+
+
+def test_corrupted_table_of_contents_is_rejected(tmp_path, arrays):
+    path = tmp_path / "text.idx"
+    write_snapshot(path, "text", "v1", arrays, {"names": ["a"]})
+    raw = bytearray(path.read_bytes())
+    raw[30] ^= 0xFF
+    path.write_bytes(raw)
+    with pytest.raises(SnapshotError):
+        read_snapshot(path, "text", "v1")
+
+
+def test_corrupted_array_is_detected_on_verify(tmp_path, arrays):
+    path = tmp_path / "text.idx"
+    write_snapshot(path, "text", "v1", arrays, {})
+    raw = bytearray(path.read_bytes())
+    raw[raw.find(arrays["weights"].tobytes()) + 8] ^= 0xFF
+    path.write_bytes(raw)
+
+    read_snapshot(path, "text", "v1")  # Démarrage : pas de relecture complète
+    with pytest.raises(SnapshotError, match="weights"):
+        read_snapshot(path, "text", "v1", verify=True)
+
+
+def test_other_schema_is_rejected(tmp_path, arrays):
+    path = tmp_path / "text.idx"
+    write_snapshot(path, "text", "v1", arrays, {})
+    with pytest.raises(SnapshotError):
+        read_snapshot(path, "text", "v2")
+    with pytest.raises(SnapshotError):
+        read_snapshot(path, "similarity", "v1")
+
+
+class Component:
+    SNAPSHOT_SCHEMA = 1
+
+    def __init__(self, values=None, fail=False):
+        self.refresh_lock = threading.Lock()
+        self.values = values
+        self.fail = fail
+        self.was_reset = False
+
+    def snapshot_state(self):
+        return {"values": np.asarray(self.values)}, {"size": len(self.values)}
+
+    def restore_state(self, arrays, state):
+        if self.fail:
+            raise ValueError("état incohérent")
+        assert len(arrays["values"]) == state["size"]
+        self.values = arrays["values"].tolist()
+
+    def reset(self):
+        self.was_reset = True
+
+
+def test_manager_restores_all_components(tmp_path):
+    path = tmp_path / "text.idx"
+    SnapshotManager(path, "text", {"a": Component([1, 2]), "b": Component([3])}).save()
+
+    a, b = Component(), Component()
+    manager = SnapshotManager(path, "text", {"a": a, "b": b})
+    manager.hold()
+    assert a.refresh_lock.locked()
+    assert manager.load()
+    assert (a.values, b.values) == ([1, 2], [3])
+    assert manager.loaded is not None
+    assert not a.refresh_lock.locked() and not b.refresh_lock.locked()
+
+
+def test_manager_resets_components_when_restore_fails(tmp_path):
+    path = tmp_path / "text.idx"
+    SnapshotManager(path, "text", {"a": Component([1]), "b": Component([2])}).save()
+
+    a, b = Component(), Component(fail=True)
+    manager = SnapshotManager(path, "text", {"a": a, "b": b})
+    manager.hold()
+    assert not manager.load()
+    assert a.was_reset and b.was_reset
+    assert manager.last_error
+    assert not a.refresh_lock.locked()
+
+
+def test_manager_without_snapshot_starts_empty(tmp_path):
+    component = Component()
+    manager = SnapshotManager(tmp_path / "absent.idx", "text", {"a": component})
+    manager.hold()
+    assert not manager.load()
+    assert manager.last_error is None
+    assert not component.refresh_lock.locked()
+
+
+def test_manager_verifies_arrays_on_first_load_of_a_file(tmp_path):
+    path = tmp_path / "text.idx"
+    SnapshotManager(path, "text", {"a": Component(list(range(50)))}).save()
+    raw = bytearray(path.read_bytes())
+    raw[raw.find(np.arange(50).tobytes()) + 8] ^= 0xFF
+    path.write_bytes(raw)  # Nouvelle date de modification : le témoin ne correspond plus
+
+    component = Component()
+    manager = SnapshotManager(path, "text", {"a": component})
+    manager.hold()
+    assert not manager.load()
+    assert "corrompu" in manager.last_error
+    assert component.values is None  # Reconstruction complète au prochain rafraîchissement
+
+
+def test_manager_skips_full_verification_once_file_is_verified(tmp_path, monkeypatch):
+    path = tmp_path / "text.idx"
+    SnapshotManager(path, "text", {"a": Component([1, 2])}).save()
+
+    calls = []
+    original = read_snapshot
+
+    def spy(*args, verify=False):
+        calls.append(verify)
+        return original(*args, verify=verify)
+
+    monkeypatch.setattr("app.index_snapshot.read_snapshot", spy)
+    for _ in range(2):
+        manager = SnapshotManager(path, "text", {"a": Component()})
+        assert manager.load()
+    assert calls == [False, False]  # Écrit par save() : déjà vérifié
+
+    path.with_suffix(".verified").unlink()
+    for _ in range(2):
+        assert SnapshotManager(path, "text", {"a": Component()}).load()
+    assert calls[2:] == [True, False]
@@ -0,0 +1,103 @@
+"""
+Tests du cache des fiches : clé stat (inode, dates, taille) et invalidation après renommage
+"""
+
+import os
+
+import pytest
+
+from app.item_records import ItemRecordCache
+
+
+@pytest.fixture
+def root(tmp_path):
+    (tmp_path / "Banque").mkdir()
+    (tmp_path / "Banque" / "janvier.pdf").write_bytes(b"%PDF-1")
+    (tmp_path / "Banque" / "fevrier.pdf").write_bytes(b"%PDF-22")
+    return tmp_path
+
+
+class Ids:
+    """IDs par chemin ; les chemins absents du dictionnaire ne sont pas encore enregistrés"""
+
+    def __init__(self):
+        self.known = {}
+        self.lookups = 0
+
+    def lookup(self, path):
+        self.lookups += 1
+        return self.known.get(path)
+
+
+@pytest.fixture
+def ids(root):
+    ids = Ids()
+    for path in (root / "Banque", root / "Banque" / "janvier.pdf", root / "Banque" / "fevrier.pdf"):
+        ids.known[path] = f"id-{path.name}"
+    return ids
+
+
+@pytest.fixture
+def records(root, ids):
+    return ItemRecordCache(root, ids.lookup, lambda p: f"tmp-{p.name}",
+                           lambda p, depth: "document" if p.is_file() else "armoire",
+                           lambda name: name.startswith("."))
+
+
+def test_unchanged_path_is_served_from_cache(records, ids, root):
+    first = records.get(root / "Banque" / "janvier.pdf")
+    assert records.get(root / "Banque" / "janvier.pdf") is first
+    assert ids.lookups == 1
+    assert first.to_dict()["size"] == 6
+
+
+def test_record_refreshes_when_another_file_takes_the_name(records, ids, root):
+    folder = root / "Banque"
+    old = records.get(folder / "janvier.pdf")
+    os.rename(folder / "janvier.pdf", folder / "archive.pdf")
+    os.rename(folder / "fevrier.pdf", folder / "janvier.pdf")  # Autre inode, même chemin
+    ids.known[folder / "janvier.pdf"] = "id-fevrier.pdf"
+
+    new = records.get(folder / "janvier.pdf")
+    assert new is not old
+    assert (new.id, new.size) == ("id-fevrier.pdf", 7)
+
+
+def test_folder_record_refreshes_after_child_rename(records, root):
+    folder = root / "Banque"
+    before = records.get(folder)
+    (folder / ".cache").write_bytes(b"")  # Caché : compté nulle part
+    os.rename(folder / "janvier.pdf", folder / "janvier-2024.pdf")  # Change la mtime du dossier
+    after = records.get(folder)
+    assert after is not before
+    assert after.children_count == before.children_count == 2
+
+
+def test_in_place_rewrite_refreshes_size(records, root):
+    path = root / "Banque" / "janvier.pdf"
+    before = records.get(path)
+    stat = path.stat()
+    path.write_bytes(b"%PDF-1 plus long")
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns))  # mtime restaurée : taille et ctime suffisent
+    assert records.get(path).size == 16 and records.get(path) is not before
+
+
+def test_provisional_ids_are_not_cached(records, ids, root):
+    path = root / "Banque" / "mars.pdf"
+    path.write_bytes(b"%PDF")
+    assert records.get(path).id == "tmp-mars.pdf"
+    ids.known[path] = "id-mars"  # Enregistré en tâche de fond
+    assert records.get(path).id == "id-mars"
+
+
+def test_least_recently_served_records_are_evicted(root, ids):
+    records = ItemRecordCache(root, ids.lookup, str, lambda p, d: "document", lambda n: False, max_records=2)
+    paths = [root / "Banque" / "janvier.pdf", root / "Banque" / "fevrier.pdf", root / "Banque"]
+    first = records.get(paths[0])
+    records.get(paths[1])
+    records.get(paths[0])  # Redevient le plus récent
+    records.get(paths[2])  # Évince fevrier.pdf
+    assert records.get(paths[0]) is first
+    lookups = ids.lookups
+    records.get(paths[1])
+    assert ids.lookups == lookups + 1
@@ -0,0 +1,179 @@
+"""
+Tests du stockage des métadonnées : journal partagé, compaction, vues immuables
+"""
+
+import json
+import threading
+
+import pytest
+
+from app import metadata_store
+from app.metadata_store import MetadataStore
+
+
+@pytest.fixture
+def snapshot_path(tmp_path):
+    return tmp_path / "metadata.json"
+
+
+def test_transaction_is_replayed_by_another_worker(snapshot_path):
+    """Deux instances sur les mêmes fichiers se comportent comme deux workers"""
+    writer, reader = MetadataStore(snapshot_path), MetadataStore(snapshot_path)
+    assert reader.view().get("item_tags", {}) == {}
+
+    with writer.transaction() as txn:
+        txn.set("item_tags", "a", ["banque"])
+        txn.set("item_tags", "b", ["impots"])
+    with writer.transaction() as txn:
+        txn.delete("item_tags", "b")
+
+    assert reader.view()["item_tags"] == {"a": ["banque"]}
+    assert reader.seq == writer.seq == 2
+
+
+def test_listeners_receive_replayed_operations(snapshot_path):
+    writer, reader = MetadataStore(snapshot_path), MetadataStore(snapshot_path)
+    with writer.transaction() as txn:
+        txn.set("ocr_status", "z", "pending")
+    reader.view()
+    seen = []
+    reader.add_listener(seen.append)
+
+    with writer.transaction() as txn:
+        txn.set("ocr_status", "a", "done")
+    reader.view()
+
+    assert seen == [{"op": "set", "section": "ocr_status", "key": "a", "value": "done"}]
+
+
+def test_compaction_writes_snapshot_and_empties_journal(snapshot_path, monkeypatch):
+    monkeypatch.setattr(metadata_store, "COMPACT_EVERY", 3)
+    store = MetadataStore(snapshot_path)
+    for i in range(3):
+        with store.transaction() as txn:
+            txn.set("hashes", f"doc{i}", {"sha256": str(i)})
+
+    snapshot = json.loads(snapshot_path.read_text(encoding="utf-8"))
+    assert snapshot["journal_seq"] == 3
+    assert set(snapshot["hashes"]) == {"doc0", "doc1", "doc2"}
+    assert store.journal_path.read_text() == ""
+
+    # Un nouveau worker part de l'instantané puis rejoue la suite du journal
+    with store.transaction() as txn:
+        txn.delete("hashes", "doc0")
+    fresh = MetadataStore(snapshot_path)
+    assert set(fresh.view()["hashes"]) == {"doc1", "doc2"}
+    assert fresh.seq == 4
+
+
+def test_worker_reloads_after_compaction_by_another(snapshot_path):
+    writer, reader = MetadataStore(snapshot_path), MetadataStore(snapshot_path)
+    with writer.transaction() as txn:
+        txn.set("item_tags", "a", ["x"])
+    reader.view()
+
+    writer.compact()
+    with writer.transaction() as txn:
+        txn.set("item_tags", "b", ["y"])
+
+    assert reader.view()["item_tags"] == {"a": ["x"], "b": ["y"]}
+
+
+def test_incomplete_journal_line_is_ignored_until_complete(snapshot_path):
+    writer, reader = MetadataStore(snapshot_path), MetadataStore(snapshot_path)
+    with writer.transaction() as txn:
+        txn.set("item_tags", "a", ["x"])
+    reader.view()
+
+    line = json.dumps({"seq": 2, "ops": [{"op": "set", "section": "item_tags", "key": "b", "value": ["y"]}]})
+    with open(writer.journal_path, "a", encoding="utf-8") as f:
+        f.write(line[:10])
+    assert "b" not in reader.view()["item_tags"]
+
+    with open(writer.journal_path, "a", encoding="utf-8") as f:
+        f.write(line[10:] + "\n")
+    assert reader.view()["item_tags"]["b"] == ["y"]
+
+
+def test_published_views_are_not_modified(snapshot_path):
+    """Une vue déjà distribuée peut être parcourue pendant qu'une transaction s'applique"""
+    store = MetadataStore(snapshot_path)
+    with store.transaction() as txn:
+        txn.set("item_tags", "a", ["x"])
+    before = store.view()
+    tags_before = before["item_tags"]
+
+    with store.transaction() as txn:
+        txn.set("item_tags", "b", ["y"])
+        txn.delete("item_tags", "a")
+
+    assert tags_before == {"a": ["x"]}
+    assert store.view()["item_tags"] == {"b": ["y"]}
+
+
+def test_failed_transaction_is_discarded(snapshot_path):
+    store = MetadataStore(snapshot_path)
+    seen = []
+    store.add_listener(seen.append)
+    committed = []
+
+    with pytest.raises(RuntimeError):
+        with store.transaction() as txn:
+            txn.set("item_tags", "a", ["x"])
+            txn.after_commit(committed.append)
+            raise RuntimeError("abandon")
+
+    assert store.view().get("item_tags", {}) == {}
+    assert store.seq == 0
+    assert committed == []
+    assert seen[-1] is None  # Les index dérivés se reconstruisent
+    assert MetadataStore(snapshot_path).view().get("item_tags", {}) == {}
+
+
+def test_after_commit_sees_published_data(snapshot_path):
+    store = MetadataStore(snapshot_path)
+    committed = []
+    with store.transaction() as txn:
+        txn.set("item_tags", "a", ["x"])
+        txn.after_commit(lambda data: committed.append((store.seq, data["item_tags"])))
+        assert committed == []
+
+    assert committed == [(1, {"a": ["x"]})]
+
+
+def test_nested_transaction_joins_outer(snapshot_path):
+    store = MetadataStore(snapshot_path)
+    with store.transaction() as outer:
+        outer.set("item_tags", "a", ["x"])
+        with store.transaction() as inner:
+            assert inner is outer
+            assert store.view()["item_tags"] == {"a": ["x"]}
+            inner.set("item_tags", "b", ["y"])
+
+    assert store.seq == 1
+    assert MetadataStore(snapshot_path).view()["item_tags"] == {"a": ["x"], "b": ["y"]}
+
+
+def test_concurrent_read_modify_write_keeps_every_update(snapshot_path):
+    """
+    Deux workers ajoutent des favoris en même temps : la liste lue dans
+    `txn.data` (sous verrou) inclut toujours les ajouts de l'autre.
+    """
+    workers = [MetadataStore(snapshot_path), MetadataStore(snapshot_path)]
+
+    def add(store, prefix):
+        for i in range(50):
+            with store.transaction() as txn:
+                favorites = txn.data.get("favorites", [])
+                if f"{prefix}{i}" not in favorites:
+                    txn.replace("favorites", [*favorites, f"{prefix}{i}"])
+
+    threads = [threading.Thread(target=add, args=(store, prefix)) for store, prefix in zip(workers, "ab")]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    expected = {f"{p}{i}" for p in "ab" for i in range(50)}
+    for store in (*workers, MetadataStore(snapshot_path)):
+        assert set(store.view()["favorites"]) == expected
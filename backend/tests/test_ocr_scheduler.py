@@ -0,0 +1,119 @@
+"""
+Tests de l'ordonnanceur OCR : plages horaires, ordre de la file, conditions de départ
+"""
+
+from datetime import datetime, time as dtime
+
+import pytest
+
+from app import ocr_scheduler
+from app.ocr_scheduler import (
+    PRIORITY_BACKLOG, PRIORITY_MANUAL, PRIORITY_UPLOAD, OcrScheduler, in_windows, parse_windows,
+)
+
+
+class Traffic:
+    def __init__(self, rps=0.0):
+        self.rps = rps
+
+    def rate(self):
+        return self.rps
+
+
+@pytest.fixture
+def scheduler(tmp_path, monkeypatch):
+    """Ordonnanceur non démarré (pas de threads) : les tâches sont dépilées à la main"""
+    scheduler = OcrScheduler(tmp_path, lambda item_id: None, lambda limit: [], Traffic(), workers=1)
+    scheduler.windows = None
+    scheduler.max_load = 4.0
+    monkeypatch.setattr(scheduler, "_load", lambda: 0.0)
+    return scheduler
+
+
+def at(hour, minute=0):
+    return datetime(2024, 3, 1, hour, minute)
+
+
+def test_parse_windows():
+    assert parse_windows("") is None
+    assert parse_windows(" OFF ") == []
+    assert parse_windows("01:00-06:00, 22:30-23:15") == [
+        (dtime(1, 0), dtime(6, 0)), (dtime(22, 30), dtime(23, 15)),
+    ]
+
+
+def test_in_windows_bounds_and_midnight():
+    night = parse_windows("01:00-06:00")
+    assert in_windows(night, at(1)) and in_windows(night, at(5, 59))
+    assert not in_windows(night, at(6)) and not in_windows(night, at(0, 59))
+
+    overnight = parse_windows("22:00-02:00")
+    assert in_windows(overnight, at(23)) and in_windows(overnight, at(1, 30))
+    assert not in_windows(overnight, at(2)) and not in_windows(overnight, at(12))
+
+    assert in_windows(None, at(12))  # Toujours ouvert
+    assert not in_windows([], at(12))  # Désactivé
+
+
+def test_queue_order_by_priority_then_submission(scheduler):
+    scheduler.submit("b1", PRIORITY_BACKLOG)
+    scheduler.submit("m1", PRIORITY_MANUAL)
+    scheduler.submit("u1", PRIORITY_UPLOAD)
+    scheduler.submit("b2", PRIORITY_BACKLOG)
+    scheduler.submit("u2", PRIORITY_UPLOAD)
+
+    order = [scheduler._next_job().item_id for _ in range(5)]
+    assert order == ["u1", "u2", "m1", "b1", "b2"]
+
+
+def test_resubmission_promotes_without_duplicate(scheduler):
+    first = scheduler.submit("a", PRIORITY_BACKLOG)
+    scheduler.submit("b", PRIORITY_MANUAL)
+    assert scheduler.submit("a", PRIORITY_UPLOAD) is first  # Même Future
+    assert scheduler.submit("a", PRIORITY_BACKLOG) is first  # Pas de rétrogradation
+    assert scheduler.status()["queued"] == {"upload": 1, "manual": 1, "backlog": 0}
+
+    job = scheduler._next_job()
+    assert (job.item_id, job.priority) == ("a", PRIORITY_UPLOAD)
+    assert scheduler._next_job().item_id == "b"
+    assert [j.item_id for j in scheduler._heap] == ["a"]  # Ancienne entrée, ignorée au dépilage
+    scheduler._drop_stale()
+    assert scheduler._heap == []
+
+
+def test_executed_job_resolves_future(scheduler):
+    future = scheduler.submit("a")
+    scheduler._execute(scheduler._next_job())
+    assert future.result(0) is True
+    assert scheduler.done == 1 and scheduler.active == {} and "a" not in scheduler._jobs
+
+
+def test_backlog_waits_for_window_load_and_traffic(scheduler, monkeypatch):
+    scheduler.submit("b", PRIORITY_BACKLOG)
+    job = scheduler._heap[0]
+    assert scheduler._blocked(job) is None
+
+    scheduler.windows = []
+    assert scheduler._blocked(job) == "window"
+    scheduler.windows = None
+
+    scheduler.traffic.rps = ocr_scheduler.OCR_PAUSE_RPS + 1
+    assert scheduler._blocked(job) == "traffic"
+    scheduler.traffic.rps = 0.0
+
+    monkeypatch.setattr(scheduler, "_load", lambda: 6.0)
+    assert scheduler._blocked(job) == "load"
+    scheduler.active = {"x": "upload", "y": "upload", "z": "upload"}  # Charge due à l'OCR lui-même
+    assert scheduler._blocked(job) is None
+
+
+def test_interactive_job_waits_for_load_at_most_max_delay(scheduler, monkeypatch):
+    monkeypatch.setattr(scheduler, "_load", lambda: 6.0)
+    scheduler.windows = []  # Fermé : sans effet sur les uploads
+    scheduler.traffic.rps = 100.0
+    scheduler.submit("u", PRIORITY_UPLOAD)
+    job = scheduler._heap[0]
+    assert scheduler._blocked(job) == "load"
+
+    job.submitted -= ocr_scheduler.INTERACTIVE_MAX_DELAY
+    assert scheduler._blocked(job) is None
@@ -0,0 +1,154 @@
+"""
+Tests du service OCR (Tesseract simulé) : choix des langues, boîtes des mots, images multi-pages
+"""
+
+import fitz
+import pytest
+import pytesseract
+from PIL import Image
+
+from app import ocr_service
+
+FRENCH = "le la les des et est pour dans vous nous votre avec " * 3
+TSV_HEADER = "level\tpage_num\tblock_num\tpar_num\tline_num\tword_num\tleft\ttop\twidth\theight\tconf\ttext\n"
+
+
+class FakeTesseract:
+    """Enregistre les appels (langue, taille d'image) et renvoie un texte fixe"""
+
+    def __init__(self, probe_text=FRENCH):
+        self.probe_text = probe_text
+        self.probes = []
+        self.passes = []
+
+    def image_to_string(self, image, lang):
+        self.probes.append((lang, image.size))
+        return self.probe_text
+
+    def run_and_get_multiple_output(self, image, extensions, lang):
+        self.passes.append((lang, image.size))
+        return f"page {len(self.passes)}", TSV_HEADER
+
+
+@pytest.fixture
+def tesseract(monkeypatch):
+    fake = FakeTesseract()
+    monkeypatch.setattr(pytesseract, "get_languages", lambda: ["fra", "eng", "deu", "spa", "osd"])
+    monkeypatch.setattr(pytesseract, "image_to_string", fake.image_to_string)
+    monkeypatch.setattr(pytesseract, "run_and_get_multiple_output", fake.run_and_get_multiple_output)
+    ocr_service.candidate_languages.cache_clear()
+    yield fake
+    ocr_service.candidate_languages.cache_clear()
+
+
+def test_image_probed_at_low_resolution_then_ocr_with_detected_language(tesseract, tmp_path):
+    path = tmp_path / "scan.png"
+    Image.new("L", (3000, 2000), 255).save(path)
+
+    result = ocr_service.extract_text(path)
+
+    assert tesseract.probes == [("fra+eng+deu+spa", (1600, 1067))]
+    assert tesseract.passes == [("fra", (3000, 2000))]
+    assert result["languages"] == ["fra"] and result["language"] == "fra"
+
+
+def test_undecided_probe_falls_back_to_configured_languages(tesseract, tmp_path):
+    tesseract.probe_text = "1234 5678"
+    path = tmp_path / "scan.png"
+    Image.new("L", (100, 100), 255).save(path)
+
+    result = ocr_service.extract_text(path)
+
+    assert [lang for lang, _ in tesseract.passes] == [ocr_service.OCR_LANGUAGE]
+    assert result["language"] == ocr_service.OCR_LANGUAGE
+
+
+def test_scanned_pdf_uses_native_text_before_probing(tesseract, tmp_path, monkeypatch):
+    path = tmp_path / "scan.pdf"
+    with fitz.open() as doc:
+        for _ in range(2):
+            page = doc.new_page()
+        doc[0].insert_text((50, 50), "the and of to in is for on")  # En-tête court, en anglais
+        doc.save(path)
+    monkeypatch.setattr(ocr_service, "convert_from_path",
+                        lambda *args, **kwargs: [Image.new("L", (200, 300), 255) for _ in range(2)])
+
+    result = ocr_service.extract_text(path)
+
+    assert result["method"] == "tesseract" and result["page_count"] == 2
+    assert tesseract.probes == []
+    assert [lang for lang, _ in tesseract.passes] == ["eng", "eng"]
+
+
+def test_scanned_pdf_without_text_is_probed_once(tesseract, tmp_path, monkeypatch):
+    path = tmp_path / "scan.pdf"
+    with fitz.open() as doc:
+        for _ in range(3):
+            doc.new_page()
+        doc.save(path)
+    monkeypatch.setattr(ocr_service, "convert_from_path",
+                        lambda *args, **kwargs: [Image.new("L", (200, 300), 255) for _ in range(3)])
+
+    ocr_service.extract_text(path)
+
+    assert [lang for lang, _ in tesseract.probes] == ["fra+eng+deu+spa"]
+    assert [lang for lang, _ in tesseract.passes] == ["fra", "fra", "fra"]
+
+
+def test_tsv_words_are_scaled_to_page_size():
+    tsv = TSV_HEADER + "".join("\t".join(map(str, row)) + "\n" for row in [
+        (1, 1, 0, 0, 0, 0, 0, 0, 2000, 1000, -1, ""),  # Page
+        (4, 1, 1, 1, 1, 0, 100, 50, 900, 40, -1, ""),  # Ligne
+        (5, 1, 1, 1, 1, 1, 100, 50, 400, 40, 96.4, "Facture"),
+        (5, 1, 1, 1, 1, 2, 1000, 500, 1000, 500, 12.6, "n°42"),
+        (5, 1, 1, 1, 1, 3, 300, 60, 20, 30, 95, "  "),  # Mot vide
+        (5, 1, 1, 1, 1, 4, 1999, 999, 1, 1, -1, "x"),
+    ])
+
+    words = ocr_service.parse_tsv_words(tsv, 2000, 1000)
+
+    assert words["t"] == ["Facture", "n°42", "x"]
+    assert words["x"] == [500, 5000, 9995]  # 1/10000 de la largeur
+    assert words["y"] == [500, 5000, 9990]  # 1/10000 de la hauteur
+    assert words["w"] == [2000, 5000, 5]
+    assert words["h"] == [400, 5000, 10]
+    assert words["c"] == [96, 13, 0]  # Confiance arrondie, -1 ramené à 0
+
+
+def test_tsv_text_with_quotes_is_kept_verbatim():
+    tsv = TSV_HEADER + '5\t1\t1\t1\t1\t1\t0\t0\t10\t10\t90\t"Dupont"\n5\t1\t1\t1\t1\t2\t10\t0\t10\t10\t90\tl\'été\n'
+    assert ocr_service.parse_tsv_words(tsv, 100, 100)["t"] == ['"Dupont"', "l'été"]
+    assert ocr_service.parse_tsv_words(TSV_HEADER, 100, 100) == ocr_service.empty_page_words()
+
+
+def make_tiff(path, frames):
+    first, *others = frames
+    first.save(path, save_all=True, append_images=others, compression="raw")
+
+
+def test_multi_frame_tiff_is_ocr_page_by_page(tesseract, tmp_path, monkeypatch):
+    path = tmp_path / "fax.tif"
+    make_tiff(path, [Image.new("1", (200, 300), 1), Image.new("L", (210, 310), 255),
+                     Image.new("CMYK", (220, 320), (0, 0, 0, 0))])
+    modes = []
+    ocr_image = ocr_service.ocr_image
+    monkeypatch.setattr(ocr_service, "ocr_image", lambda image, lang: modes.append(image.mode) or ocr_image(image, lang))
+
+    result = ocr_service.extract_text(path)
+
+    assert tesseract.passes == [("fra", (200, 300)), ("fra", (210, 310)), ("fra", (220, 320))]
+    assert len(tesseract.probes) == 1  # Langue détectée sur la première page seulement
+    assert modes == ["1", "L", "RGB"]  # CMYK converti
+    assert result["page_count"] == 3
+    assert result["text"] == "--- Page 1 ---\npage 1\n--- Page 2 ---\npage 2\n--- Page 3 ---\npage 3"
+
+
+def test_multi_frame_tiff_stops_at_frame_limit(tesseract, tmp_path, monkeypatch):
+    monkeypatch.setattr(ocr_service, "MAX_IMAGE_FRAMES", 2)
+    path = tmp_path / "fax.tif"
+    make_tiff(path, [Image.new("L", (100 + i, 100), 255) for i in range(4)])
+
+    result = ocr_service.extract_text(path)
+
+    assert [size for _, size in tesseract.passes] == [(100, 100), (101, 100)]
+    assert result["page_count"] == 2
@@ -0,0 +1,118 @@
+"""
+Tests des prévisualisations : requêtes Range sur les documents et cache disque des pages
+"""
+
+import os
+import time
+
+import fitz
+import pytest
+from fastapi.testclient import TestClient
+
+from app.page_cache import PageCache, PageNotFound
+
+
+def make_pdf(path, pages):
+    doc = fitz.open()
+    for i in range(pages):
+        doc.new_page().insert_text((72, 72), f"Page {i + 1}")
+    doc.save(path)
+    doc.close()
+
+
+@pytest.fixture(scope="module")
+def document(main):
+    folder = main.GED_ROOT / "Previews"
+    folder.mkdir(exist_ok=True)
+    path = folder / "releve.pdf"
+    make_pdf(path, 5)
+    return main.encode_id(path), path.read_bytes()
+
+
+@pytest.fixture(scope="module")
+def client(main):
+    return TestClient(main.app)  # Sans contexte : les tâches de démarrage ne sont pas lancées
+
+
+@pytest.mark.parametrize("endpoint", ["download", "preview"])
+def test_full_file_advertises_ranges(client, document, endpoint):
+    item_id, content = document
+    response = client.get(f"/api/{endpoint}/{item_id}")
+    assert response.status_code == 200
+    assert response.headers["accept-ranges"] == "bytes"
+    assert response.content == content
+
+
+@pytest.mark.parametrize("header, start, end", [
+    ("bytes=0-99", 0, 100),
+    ("bytes=100-", 100, None),  # Ouvert
+    ("bytes=-50", -50, None),  # Suffixe : 50 derniers octets
+    ("bytes=10-999999", 10, None),  # Fin bornée à la taille du fichier
+])
+def test_byte_ranges(client, document, header, start, end):
+    item_id, content = document
+    response = client.get(f"/api/preview/{item_id}", headers={"Range": header})
+    expected = content[start:end]
+    first = start if start >= 0 else len(content) + start
+    assert response.status_code == 206
+    assert response.content == expected
+    assert response.headers["content-range"] == f"bytes {first}-{first + len(expected) - 1}/{len(content)}"
+
+
+def test_unsatisfiable_range(client, document):
+    item_id, content = document
+    response = client.get(f"/api/download/{item_id}", headers={"Range": f"bytes={len(content) + 10}-"})
+    assert response.status_code == 416
+    assert response.headers["content-range"].endswith(f"*/{len(content)}")
+
+
+def test_single_page_endpoint(client, document):
+    item_id, _ = document
+    response = client.get(f"/api/preview/{item_id}/page/3")
+    assert response.status_code == 200 and response.headers["x-page-count"] == "5"
+    with fitz.open("pdf", response.content) as page:
+        assert page.page_count == 1 and "Page 3" in page[0].get_text()
+    assert client.get(f"/api/preview/{item_id}/page/6").status_code == 404
+
+
+@pytest.fixture
+def source(tmp_path):
+    path = tmp_path / "scan.pdf"
+    make_pdf(path, 3)
+    return path
+
+
+def test_page_cache_reuses_extracted_pages(tmp_path, source, monkeypatch):
+    cache = PageCache(tmp_path / "pages")
+    extracted = []
+    extract = PageCache._extract
+    monkeypatch.setattr(PageCache, "_extract", lambda self, *a: extracted.append(a[1:]) or extract(self, *a))
+
+    first, count = cache.get(source, 2)
+    assert count == 3 and cache.get(source, 2) == (first, 3)
+    cache.get(source, 2, "png", 50)
+    assert extracted == [(1, "pdf", 110), (1, "png", 50)]
+
+    make_pdf(source, 4)  # Document modifié : nouvelle clé
+    assert cache.get(source, 2)[0] != first
+    with pytest.raises(PageNotFound):
+        cache.get(source, 5)
+
+
+def test_page_cache_evicts_least_recently_served(tmp_path, source):
+    probe = PageCache(tmp_path / "probe")
+    sizes = [probe.get(source, page)[0].stat().st_size for page in (1, 2, 3)]
+    # Trois pages dépassent le budget ; la première et la troisième tiennent dans ses 80 %
+    cache = PageCache(tmp_path / "pages", max_bytes=max(sum(sizes) - 1, int((sizes[0] + sizes[2]) / 0.8) + 1))
+    assert cache.max_bytes < sum(sizes)
+
+    first, _ = cache.get(source, 1)
+    second, _ = cache.get(source, 2)
+    old = time.time() - 60
+    os.utime(second, (old, old))
+    os.utime(first, (old - 60, old - 60))
+    cache.get(source, 1)  # Resservie : redevient la plus récente
+    cache.get(source, 3)  # Dépasse le budget : purge jusqu'à 80 %
+
+    assert first.exists()
+    assert not second.exists()
@@ -0,0 +1,79 @@
+"""
+Tests de l'index de similarité : la fusion du delta donne le même index qu'une reconstruction complète
+"""
+
+import random
+
+import numpy as np
+import pytest
+
+from app.metadata_store import MetadataStore
+from app.similarity_service import SimilarityIndex
+from app.text_features import Vocabulary
+
+WORDS = ("facture electricite releve compte banque impots revenu assurance habitation contrat "
+         "loyer quittance salaire bulletin mutuelle remboursement garantie echeance").split()
+
+
+@pytest.fixture
+def store(tmp_path):
+    return MetadataStore(tmp_path / "metadata.json")
+
+
+def text(rng):
+    return " ".join(rng.choice(WORDS) for _ in range(rng.randint(5, 40)))
+
+
+def put(store, texts):
+    with store.transaction() as txn:
+        for doc_id, value in texts.items():
+            txn.set("ocr_text", doc_id, {"text": value, "text_ref": str(hash(value))})
+
+
+def by_document(index):
+    """Poids et norme de chaque document, indépendamment des ordinaux"""
+    index._merge()
+    rows = {}
+    terms = np.repeat(np.arange(len(index._ptr) - 1), np.diff(index._ptr))
+    for term, doc, weight in zip(terms.tolist(), index._docs.tolist(), index._weights.tolist()):
+        rows.setdefault(index._ids[doc], {})[term] = weight
+    norms = {doc_id: float(index._norms[i]) for i, doc_id in enumerate(index._ids)}
+    return rows, norms
+
+
+def test_delta_merge_equals_full_rebuild(store):
+    rng = random.Random(7)
+    vocabulary = Vocabulary()
+    put(store, {f"d{i}": text(rng) for i in range(40)})
+    incremental = SimilarityIndex(store, vocabulary, lambda entry: entry["text"])
+    incremental.refresh()
+
+    put(store, {f"d{i}": text(rng) for i in range(40, 50)})  # Nouveaux documents
+    put(store, {f"d{i}": text(rng) for i in (3, 8, 21)})  # Textes modifiés
+    with store.transaction() as txn:
+        for i in (5, 12, 30):
+            txn.delete("ocr_text", f"d{i}")
+    incremental.refresh()
+    assert incremental.stats()["pending_merge"] > 0  # Encore dans le delta
+
+    rebuilt = SimilarityIndex(store, vocabulary, lambda entry: entry["text"])
+    rebuilt.refresh()
+
+    rows, norms = by_document(incremental)
+    expected_rows, expected_norms = by_document(rebuilt)
+    assert rows == expected_rows
+    assert norms == pytest.approx(expected_norms)
+    size = len(vocabulary)
+    assert np.array_equal(incremental._df[:size], rebuilt._df[:size])
+    for doc_id in expected_norms:
+        assert incremental.similar(doc_id) == rebuilt.similar(doc_id)
+
+
+def test_query_sees_documents_still_in_delta(store):
+    put(store, {"a": "facture electricite releve", "b": "contrat assurance habitation"})
+    index = SimilarityIndex(store, Vocabulary(), lambda entry: entry["text"])
+    index.refresh()
+    put(store, {"c": "facture electricite echeance"})
+    index.refresh()
+    assert index.stats()["pending_merge"] > 0
+    assert [doc_id for doc_id, _ in index.similar("a")] == ["c"]
@@ -0,0 +1,66 @@
+"""
+Tests du magasin de textes : aller-retour, partage des blobs identiques, suppression après validation
+"""
+
+import pytest
+
+from app.metadata_store import MetadataStore
+from app.text_store import TextStore
+
+
+@pytest.fixture
+def text_store(tmp_path):
+    return TextStore(tmp_path / "text")
+
+
+@pytest.fixture
+def api(main, monkeypatch, text_store):
+    monkeypatch.setattr(main, "text_store", text_store)
+    return main
+
+
+def test_round_trip(text_store):
+    text = "Relevé de compte — échéance 12/03 : 1 234,56 €\n" * 200
+    ref = text_store.put(text)
+    assert text_store.get(ref) == text
+    assert text_store.blob_path(ref).stat().st_size < len(text.encode("utf-8")) // 10
+
+
+def test_identical_texts_share_one_blob(text_store, tmp_path):
+    first = text_store.put("Facture EDF")
+    assert text_store.put("Facture EDF") == first
+    assert text_store.put("Facture GDF") != first
+    assert len(list((tmp_path / "text").rglob("*.gz"))) == 2
+
+
+def test_missing_or_damaged_blob_reads_as_none(text_store):
+    ref = text_store.put("contenu")
+    text_store.blob_path(ref).write_bytes(b"pas du gzip")
+    text_store._get_cached.cache_clear()
+    assert text_store.get(ref) is None
+    assert text_store.get("0" * 64) is None
+
+
+def test_blobs_are_deleted_only_after_commit_and_when_unused(api, text_store, tmp_path):
+    store = MetadataStore(tmp_path / "metadata.json")
+    own, shared = text_store.put("propre"), text_store.put("partagé")
+    with store.transaction() as txn:
+        for item_id, ref in (("a", own), ("b", shared), ("c", shared)):
+            txn.set("ocr_text", item_id, {"text_ref": ref})
+
+    with pytest.raises(RuntimeError):
+        with store.transaction() as txn:
+            entry = txn.data["ocr_text"]["a"]
+            txn.delete("ocr_text", "a")
+            api.release_ocr_blobs(txn, [entry])
+            raise RuntimeError("écriture interrompue")
+    assert text_store.exists(own)  # Transaction abandonnée : blob conservé
+
+    with store.transaction() as txn:
+        entries = [txn.data["ocr_text"][k] for k in ("a", "b")]
+        txn.delete("ocr_text", "a")
+        txn.delete("ocr_text", "b")
+        api.release_ocr_blobs(txn, entries)
+        assert text_store.exists(own)  # Pas avant la journalisation
+    assert not text_store.exists(own)
+    assert text_store.exists(shared)  # Encore référencé par "c"
@@ -144,6 +144,9 @@ export interface ApiItem {
   extension?: string;
   mime_type?: string;
   children_count?: number;
+  total_size?: number;  // Pour les dossiers: taille cumulée du sous-arbre (octets)
+  documents_count?: number;  // Pour les dossiers: nombre de documents du sous-arbre
+  last_modified?: string;  // Pour les dossiers: modification la plus récente du sous-arbre
   tags?: string[];  // Étiquettes du fichier
   has_intercalaires?: boolean;  // Pour les dossiers: indique si contient des intercalaires
   match_type?: ('filename' | 'content')[];  // Type de correspondance lors d'une recherche
@@ -316,16 +319,16 @@ export async function renameItem(itemId: string, newName: string): Promise<ApiIt
 /**
  * Supprime un élément
  */
-export async function deleteItem(itemId: string): Promise<{ message: string; path: string }> {
+export async function deleteItem(itemId: string): Promise<{ message: string; path: string; job: FsJob | null }> {
   return fetchApi(`/api/delete/${encodeURIComponent(itemId)}`, {
     method: 'DELETE',
   });
 }
 
 /**
- * Déplace un élément
+ * Déplace un élément (vers un autre volume : tâche de fond, suivie via getJob)
  */
-export async function moveItem(itemId: string, destinationId: string): Promise<ApiItem> {
+export async function moveItem(itemId: string, destinationId: string): Promise<ApiItem | MoveStarted> {
   return fetchApi(`/api/move/${encodeURIComponent(itemId)}`, {
     method: 'PUT',
     body: JSON.stringify({ destination_id: destinationId }),
@@ -431,6 +434,13 @@ export async function getItemsByTag(tagName: string): Promise<ApiItem[]> {
 
 // ============== FAVORIS ==============
 
+export interface FavoriteChange {
+  message: string;
+  id: string;
+  favorite: boolean;
+  seq: number; // Jeton du journal des changements après l'opération
+}
+
 /**
  * Récupère la liste des favoris
  */
@@ -441,7 +451,7 @@ export async function getFavorites(): Promise<ApiItem[]> {
 /**
  * Ajoute un document aux favoris
  */
-export async function addFavorite(itemId: string): Promise<{ message: string; favorites: ApiItem[] }> {
+export async function addFavorite(itemId: string): Promise<FavoriteChange> {
   return fetchApi(`/api/favorites/${encodeURIComponent(itemId)}`, {
     method: 'POST',
   });
@@ -450,7 +460,7 @@ export async function addFavorite(itemId: string): Promise<{ message: string; fa
 /**
  * Retire un document des favoris
  */
-export async function removeFavorite(itemId: string): Promise<{ message: string; favorites: ApiItem[] }> {
+export async function removeFavorite(itemId: string): Promise<FavoriteChange> {
   return fetchApi(`/api/favorites/${encodeURIComponent(itemId)}`, {
     method: 'DELETE',
   });
@@ -490,6 +500,91 @@ export async function runOcrBatch(limit: number = 25): Promise<OcrBatchResult> {
   });
 }
 
+// ============== CHANGEMENTS ==============
+
+export type ChangeKind =
+  | 'create' | 'rename' | 'move' | 'delete'
+  | 'tag' | 'untag' | 'tags'
+  | 'favorite' | 'unfavorite' | 'ocr';
+
+export interface ChangeEvent {
+  seq: number;
+  at: string;
+  kind: ChangeKind;
+  id: string | null;
+  path?: string;
+  parent?: string | null;
+  name?: string;
+  type?: string;
+  tag?: string;
+  tags?: string[];
+  items?: string[];
+  status?: string;
+  descendants?: number;
+}
+
+export interface ChangesPage {
+  events: ChangeEvent[];
+  next: number;
+  reset: boolean; // Jeton trop ancien : tout recharger
+}
+
+/**
+ * Récupère les changements depuis un jeton (sans jeton : jeton courant seulement)
+ */
+export async function getChanges(since?: number): Promise<ChangesPage> {
+  return fetchApi(since === undefined ? '/api/changes' : `/api/changes?since=${since}`);
+}
+
+// ============== TÂCHES DE FOND ==============
+
+export type FsJobState = 'queued' | 'running' | 'completed' | 'failed' | 'cancelled' | 'interrupted';
+
+export interface FsJob {
+  id: string;
+  kind: 'delete' | 'move';
+  item_id: string;
+  path: string;
+  destination: string | null;
+  state: FsJobState;
+  phase: string;
+  cancellable: boolean;
+  files_done: number;
+  files_total: number;  // Estimation
+  bytes_done: number;
+  bytes_total: number;  // Estimation
+  error: string | null;
+  created_at: string;
+  started_at: string | null;
+  finished_at: string | null;
+}
+
+export interface MoveStarted {
+  message: string;
+  job: FsJob;
+}
+
+/**
+ * Liste les suppressions et déplacements en cours ou récents
+ */
+export async function getJobs(): Promise<FsJob[]> {
+  return fetchApi('/api/jobs');
+}
+
+/**
+ * Récupère l'avancement d'une tâche
+ */
+export async function getJob(jobId: string): Promise<FsJob> {
+  return fetchApi(`/api/jobs/${encodeURIComponent(jobId)}`);
+}
+
+/**
+ * Annule un déplacement en cours
+ */
+export async function cancelJob(jobId: string): Promise<{ message: string; job: FsJob }> {
+  return fetchApi(`/api/jobs/${encodeURIComponent(jobId)}/cancel`, { method: 'POST' });
+}
+
 // ============== EXPORT CONFIG ==============
 
 export const apiConfig = {